@@ -0,0 +1,159 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import datetime
+import math
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from traitlets import Bool, Float, Integer
+from traitlets.config import SingletonConfigurable
+
+from grader_service.autograding.celery.app import CeleryApp
+from grader_service.autograding.dedup import AUTOGRADE
+from grader_service.orm import Assignment, Submission
+from grader_service.orm.task_lock import TaskLock
+
+
+class AdmissionController(SingletonConfigurable):
+    """
+    Decides whether the grading of new student submissions of automatically
+    graded assignments is dispatched right away or throttled. Submissions are
+    always recorded, only the grading of throttled submissions is delayed by
+    throttle_delay and queued without the submission priority.
+    The pending grading jobs are the submissions with the auto status
+    "pending", so the state is shared by all processes of the service.
+    """
+
+    user_rate_limit = Integer(default_value=None, allow_none=True,
+                              help="Maximum number of submissions of a student to an assignment "
+                                   "within rate_limit_window. No limit if None.").tag(config=True)
+
+    lecture_rate_limit = Integer(default_value=None, allow_none=True,
+                                 help="Maximum number of student submissions to a lecture "
+                                      "within rate_limit_window. No limit if None.").tag(config=True)
+
+    rate_limit_window = Float(default_value=60.0, allow_none=False,
+                              help="Time window of the rate limits in seconds.").tag(config=True)
+
+    max_queue_depth = Integer(default_value=None, allow_none=True,
+                              help="Maximum number of pending grading jobs. New student submissions "
+                                   "are throttled if the queue is full. No limit if None.").tag(config=True)
+
+    throttle_delay = Float(default_value=60.0, allow_none=False,
+                           help="Time in seconds by which the grading of a submission that exceeds a "
+                                "rate limit or the queue depth is delayed.").tag(config=True)
+
+    supersede_pending = Bool(default_value=False, allow_none=False,
+                             help="Whether pending grading jobs of older submissions of a student to "
+                                  "an assignment are dropped when a new submission is queued. "
+                                  "Jobs that are already running are not dropped.").tag(config=True)
+
+    expected_job_duration = Float(default_value=60.0, allow_none=False,
+                                  help="Expected time in seconds to grade one submission, "
+                                       "used to estimate the wait time in the queue.").tag(config=True)
+
+    grading_concurrency = Integer(default_value=1, allow_none=False,
+                                  help="Number of submissions that are graded at the same time "
+                                       "by all workers, used to estimate the wait time in the queue."
+                                  ).tag(config=True)
+
+    def admit(self, session: Session, assignment: Assignment, username: str) -> Optional[str]:
+        """
+        Checks the rate limits and the queue depth for a new submission
+        before it is recorded.
+        :param session: The database session.
+        :param assignment: The assignment of the submission.
+        :param username: The user who submits.
+        :return: The reason why the grading of the submission is throttled or None if it is admitted.
+        """
+        since = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.rate_limit_window)
+        if self.user_rate_limit is not None:
+            count = (session.query(func.count(Submission.id))
+                     .filter(Submission.assignid == assignment.id,
+                             Submission.username == username,
+                             Submission.date >= since)
+                     .scalar())
+            if count >= self.user_rate_limit:
+                return "Too many submissions, please wait before submitting again!"
+        if self.lecture_rate_limit is not None:
+            count = (session.query(func.count(Submission.id))
+                     .join(Assignment, Submission.assignid == Assignment.id)
+                     .filter(Assignment.lectid == assignment.lectid,
+                             Submission.date >= since)
+                     .scalar())
+            if count >= self.lecture_rate_limit:
+                return "Too many submissions to this lecture, please try again later!"
+        if self.max_queue_depth is not None and self.queue_depth(session) >= self.max_queue_depth:
+            return "Too many submissions are waiting to be graded, please try again later!"
+        return None
+
+    def queue_depth(self, session: Session) -> int:
+        return (session.query(func.count(Submission.id))
+                .filter(Submission.auto_status == "pending")
+                .scalar())
+
+    def supersede(self, session: Session, submission: Submission) -> List[Submission]:
+        """
+        Drops the pending grading jobs of older submissions of the same user to the
+        same assignment if supersede_pending is enabled. The grading tasks of the
+        dropped submissions exit without grading them. Jobs whose task has already
+        started, according to the lock of :class:`TaskDeduplicator`, keep running.
+        The caller has to commit.
+        :param session: The database session.
+        :param submission: The new submission.
+        :return: The superseded submissions.
+        """
+        if not self.supersede_pending:
+            return []
+        started = (session.query(TaskLock.sub_id)
+                   .filter(TaskLock.task_type == AUTOGRADE,
+                           TaskLock.started_at.isnot(None)))
+        superseded = (session.query(Submission)
+                      .filter(Submission.assignid == submission.assignid,
+                              Submission.username == submission.username,
+                              Submission.id < submission.id,
+                              Submission.auto_status == "pending",
+                              Submission.id.notin_(started))
+                      .all())
+        for s in superseded:
+            self.log.info(f"Submission {s.id} is superseded by submission {submission.id}")
+            s.auto_status = "not_graded"
+            if s.feedback_status == "generating":
+                s.feedback_status = "not_generated"
+        return superseded
+
+    def queue_position(self, session: Session,
+                       submission: Submission) -> Tuple[Optional[int], Optional[float]]:
+        """
+        Estimates the position of a pending submission in the queue of its grading task,
+        i.e. the number of pending submissions in the same queue that were queued before it,
+        and the expected time in seconds until it is graded.
+        :return: The position and the expected wait time or (None, None)
+            if the submission is not pending.
+        """
+        if submission.auto_status != "pending":
+            return None, None
+        celery = CeleryApp.instance()
+        queues = {}
+
+        def queue(lecture_id: int) -> Optional[str]:
+            if lecture_id not in queues:
+                queues[lecture_id] = celery.queue("autograde_task", lecture_id)
+            return queues[lecture_id]
+
+        own_queue = queue(submission.assignment.lectid)
+        pending = (session.query(Assignment.lectid, func.count(Submission.id))
+                   .join(Assignment, Submission.assignid == Assignment.id)
+                   .filter(Submission.auto_status == "pending",
+                           Submission.id < submission.id)
+                   .group_by(Assignment.lectid)
+                   .all())
+        position = sum(count for lecture_id, count in pending if queue(lecture_id) == own_queue)
+        concurrency = max(1, self.grading_concurrency)
+        expected_wait = (math.floor(position / concurrency) + 1) * self.expected_job_duration
+        return position, expected_wait
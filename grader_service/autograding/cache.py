@@ -0,0 +1,139 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+from traitlets import Integer, Unicode
+from traitlets.config import LoggingConfigurable
+
+LOGS_FILE = "autograde.log"
+OUTPUT_DIR = "output"
+
+
+class AutogradeResultCache(LoggingConfigurable):
+    """
+    A content-addressed store of autograding results on the file system.
+    Every entry contains the output directory of an autograding job
+    (including the resulting gradebook.json) and the grading logs.
+    Entries are evicted in least recently used order once the total size
+    exceeds :attr:`max_size`.
+    """
+
+    cache_dir = Unicode(None, allow_none=True,
+                        help="Directory of the cache. Defaults to 'autograde_cache' "
+                             "in the grader service directory.").tag(config=True)
+
+    max_size = Integer(2 * 1024 ** 3, allow_none=False,
+                       help="Maximum size of all cache entries in bytes.").tag(config=True)
+
+    def __init__(self, grader_service_dir: str, **kwargs):
+        super().__init__(**kwargs)
+        if self.cache_dir is None:
+            self.cache_dir = os.path.join(grader_service_dir, "autograde_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        Combines the parts that determine an autograding result into a cache key.
+        :param parts: E.g. the tree hash of the submission, the gradebook and the image.
+        :return: The hex digest of the parts.
+        """
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(str(part).encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str, output_path: str) -> Optional[str]:
+        """
+        Restores the output directory of a cached result into output_path.
+        :param key: The cache key.
+        :param output_path: The directory the output is copied to. It is replaced if it exists.
+        :return: The logs of the cached result or None if there is no entry for the key.
+        """
+        entry = self._entry_path(key)
+        try:
+            with open(os.path.join(entry, LOGS_FILE), "r") as f:
+                logs = f.read()
+            if os.path.exists(output_path):
+                shutil.rmtree(output_path)
+            shutil.copytree(os.path.join(entry, OUTPUT_DIR), output_path)
+        except FileNotFoundError:
+            # missing or concurrently evicted entry
+            return None
+        now = time.time()
+        os.utime(entry, (now, now))
+        self.log.info(f"Restored autograding result {key} from cache")
+        return logs
+
+    def put(self, key: str, output_path: str, logs: Optional[str], replace: bool = False) -> None:
+        """
+        Stores the output directory and logs of an autograding job.
+        The entry is copied to a temporary directory first and renamed,
+        so readers never see partially written entries.
+        :param key: The cache key.
+        :param output_path: The output directory of the autograding job.
+        :param logs: The grading logs.
+        :param replace: Whether an existing entry for the key is replaced.
+        :return: None
+        """
+        entry = self._entry_path(key)
+        if os.path.exists(entry):
+            if not replace:
+                return
+            shutil.rmtree(entry, ignore_errors=True)
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            shutil.copytree(output_path, os.path.join(tmp, OUTPUT_DIR))
+            with open(os.path.join(tmp, LOGS_FILE), "w") as f:
+                f.write(logs or "")
+            os.rename(tmp, entry)
+        except OSError:
+            # another worker stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(entry):
+                raise
+        self.log.info(f"Stored autograding result {key} in cache")
+        self.evict()
+
+    def evict(self) -> None:
+        """Deletes the least recently used entries until the cache fits into max_size."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("."):
+                continue
+            path = self._entry_path(name)
+            try:
+                entries.append((os.stat(path).st_mtime, _dir_size(path), path))
+            except FileNotFoundError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self.log.info(f"Evicting autograding result {os.path.basename(path)} from cache")
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def _dir_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.lstat(os.path.join(root, file)).st_size
+            except FileNotFoundError:
+                pass
+    return size
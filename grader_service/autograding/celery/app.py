@@ -1,6 +1,6 @@
-from typing import Union
+from typing import Optional, Union
 from tornado_sqlalchemy import SQLAlchemy
-from traitlets import Dict
+from traitlets import Bool, Callable, Dict, Integer, Unicode
 from traitlets.config import SingletonConfigurable, MultipleInstanceError
 from celery import Celery, current_app
 
@@ -17,6 +17,33 @@ class CeleryApp(SingletonConfigurable):
 
     worker_kwargs = Dict(default_value={}, help="Keyword arguments to pass to celery Worker instance.").tag(config=True)
 
+    task_queues = Dict(default_value={}, key_trait=Unicode(), value_trait=Unicode(),
+                       help="Queues of the grading tasks by task name (autograde_task, generate_feedback_task "
+                            "and lti_sync_task). Tasks without a queue are sent to the default queue. "
+                            "Workers have to consume the queues with the --queues option.").tag(config=True)
+
+    lecture_queue_func = Callable(default_value=None, allow_none=True,
+                                  help="Function that takes a lecture id and a task name and returns the "
+                                       "queue of the task or None. Takes precedence over task_queues, "
+                                       "e.g. to grade large lectures by dedicated workers.").tag(config=True)
+
+    default_priority = Integer(default_value=None, allow_none=True,
+                               help="Priority of grading tasks that are started by instructors, "
+                                    "e.g. regrades and feedback generation.").tag(config=True)
+
+    submission_priority = Integer(default_value=None, allow_none=True,
+                                  help="Priority of the grading tasks of new student submissions. "
+                                       "The priorities are passed to the broker as is: RabbitMQ consumes "
+                                       "higher priorities first and requires queues with a maximum priority "
+                                       "(task_queue_max_priority), Redis consumes lower priorities first."
+                                  ).tag(config=True)
+
+    fuse_feedback = Bool(default_value=False, allow_none=False,
+                         help="Whether the feedback of fully automatically graded submissions is generated "
+                              "by autograde_task from its output directory instead of a separate "
+                              "generate_feedback_task that pulls the result from the autograde repository. "
+                              "The feedback is then generated on the queue of autograde_task.").tag(config=True)
+
     app: Celery
     _db: Union[SQLAlchemy, None] = None
 
@@ -38,6 +65,52 @@ class CeleryApp(SingletonConfigurable):
         from grader_service.autograding.celery.tasks import app
         self.app = app  # update module level celery app from tasks.py
         self.app.conf.update(self.conf)
+        routes = self.app.conf.task_routes
+        if routes is None:
+            routes = []
+        elif isinstance(routes, (dict, str)) or callable(routes):
+            routes = [routes]
+        if route_task not in routes:
+            # explicitly configured routes take precedence
+            self.app.conf.task_routes = list(routes) + [route_task]
+
+    def route(self, name: str, args: tuple, kwargs: dict) -> Optional[dict]:
+        """
+        Returns the queue and default priority of a grading task.
+        :param name: The name of the task.
+        :param args: The positional arguments of the task.
+        :param kwargs: The keyword arguments of the task.
+        :return: The routing options or None if the task is not routed.
+        """
+        task_name = name.rsplit(".", 1)[-1]
+        queue = self.queue(task_name, args[0] if args else kwargs.get("lecture_id"))
+        options = {}
+        if queue is not None:
+            options["queue"] = queue
+        if self.default_priority is not None:
+            options["priority"] = self.default_priority
+        return options or None
+
+    def queue(self, task_name: str, lecture_id: Optional[int] = None) -> Optional[str]:
+        """
+        Returns the queue of a grading task.
+        :param task_name: The name of the task without its module, e.g. autograde_task.
+        :param lecture_id: The lecture of the task.
+        :return: The queue or None if the task is sent to the default queue.
+        """
+        queue = None
+        if self.lecture_queue_func is not None and lecture_id is not None:
+            queue = self.lecture_queue_func(lecture_id, task_name)
+        if queue is None:
+            queue = self.task_queues.get(task_name)
+        return queue
+
+    @property
+    def submission_options(self) -> dict:
+        """Options of the signatures of the grading tasks of new student submissions."""
+        if self.submission_priority is None:
+            return {}
+        return {"priority": self.submission_priority}
 
     @property
     def db(self) -> SQLAlchemy:
@@ -46,3 +119,8 @@ class CeleryApp(SingletonConfigurable):
             from grader_service.main import GraderService, db
             self._db = db(GraderService.instance().db_url)
         return self._db
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Celery router that routes the tasks with :meth:`CeleryApp.route`."""
+    return CeleryApp.instance().route(name, args, kwargs)
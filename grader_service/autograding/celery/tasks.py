@@ -1,15 +1,21 @@
 import asyncio
-from typing import Union
+import time
+from datetime import datetime
+from typing import Optional, Type, Union
 
-from celery import Task, Celery
+from celery import Task, Celery, chain
+from celery.signals import worker_process_init
 from sqlalchemy import func
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from tornado.web import HTTPError
 
 from grader_service.autograding.celery.app import CeleryApp
+from grader_service.autograding.dedup import AUTOGRADE, FEEDBACK, TaskDeduplicator
 from grader_service.autograding.local_feedback import GenerateFeedbackExecutor
+from grader_service.autograding.local_grader import LocalAutogradeExecutor
+from grader_service.convert.kernelpool import KernelPool
 from grader_service.handlers.base_handler import RequestHandlerConfig
-from grader_service.orm import Submission, Assignment, Lecture
+from grader_service.orm import GradingJob, Submission, Assignment, Lecture
 from grader_service.orm.base import DeleteState
 from grader_service.plugins.lti import LTISyncGrades
 
@@ -17,15 +23,69 @@ from grader_service.plugins.lti import LTISyncGrades
 app = Celery(set_as_current=True)
 
 
+class WorkerBootstrap:
+    """
+    State that is built once per worker process and shared by all grading tasks:
+    the service directory, the session factory of the database engine and the
+    executor classes. The kernels of KernelPool.prestart_keys are started in the
+    background, so they are ready for the first submissions.
+    """
+
+    def __init__(self, celery: CeleryApp) -> None:
+        start = time.perf_counter()
+        from grader_service.main import GraderService
+        self.grader_service_dir: str = GraderService(config=celery.config).grader_service_dir
+        self.Session = sessionmaker(bind=celery.db.engine)
+        self.autograde_executor_class: Type[LocalAutogradeExecutor] = \
+            RequestHandlerConfig.instance().autograde_executor_class
+        self.feedback_executor_class: Type[GenerateFeedbackExecutor] = GenerateFeedbackExecutor
+        if celery.config.KernelPool.get("prestart_keys"):
+            KernelPool.instance(config=celery.config).prestart_configured()
+        self.duration = time.perf_counter() - start
+
+
+_bootstrap: Optional[WorkerBootstrap] = None
+
+
+def worker_bootstrap() -> WorkerBootstrap:
+    """Returns the bootstrap state of the current process and builds it on first use."""
+    global _bootstrap
+    if _bootstrap is None:
+        _bootstrap = WorkerBootstrap(CeleryApp.instance())
+        CeleryApp.instance().log.info(f"Bootstrapped grading worker in {_bootstrap.duration * 1000:.1f} ms")
+    return _bootstrap
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs) -> None:
+    """
+    Bootstraps a child process of a prefork worker. Database connections that
+    were inherited from the parent process must not be used by the child, so
+    the pool of the engine is replaced without closing them.
+    """
+    global _bootstrap
+    celery = CeleryApp.instance()
+    if celery._db is not None:
+        celery._db.engine.dispose(close=False)
+    _bootstrap = None
+    worker_bootstrap()
+
+
 class GraderTask(Task):
     def __init__(self) -> None:
         self.celery = CeleryApp.instance()
         self.log = self.celery.log
-        self.Session = sessionmaker(bind=self.celery.db.engine)
         self._sessions = {}
 
+    @property
+    def bootstrap(self) -> WorkerBootstrap:
+        return worker_bootstrap()
+
     def before_start(self, task_id, args, kwargs):
-        self._sessions[task_id] = self.Session()
+        start = time.perf_counter()
+        self._sessions[task_id] = self.bootstrap.Session()
+        self.log.debug(f"Startup of task {self.name}[{task_id}] took "
+                       f"{(time.perf_counter() - start) * 1000:.2f} ms")
         super().before_start(task_id, args, kwargs)
 
     def after_return(self, status, retval, task_id, args, kwargs, einfo):
@@ -40,46 +100,162 @@ class GraderTask(Task):
 
 @app.task(bind=True, base=GraderTask)
 def add(self: GraderTask, x, y):
-    print(type(self.session))
-    print("Adding {} and {}".format(x, y))
     return x + y
 
 
-@app.task(bind=True, base=GraderTask)
-def autograde_task(self: GraderTask, lecture_id: int, assignment_id: int, sub_id: int):
-    from grader_service.main import GraderService
-    grader_service_dir = GraderService.instance().grader_service_dir
+def _update_job(session: Session, job_id: int, **deltas: int) -> None:
+    """Atomically changes the progress counters of a grading job."""
+    (session.query(GradingJob)
+     .filter(GradingJob.id == job_id)
+     .update({getattr(GradingJob, k): getattr(GradingJob, k) + v for k, v in deltas.items()},
+             synchronize_session=False))
+    session.commit()
 
-    submission = self.session.query(Submission).get(sub_id)
+
+def _finish_job_task(session: Session, job_id: int, success: bool) -> bool:
+    """
+    Counts a finished task of a grading job.
+    :return: Whether the job is complete and this task was the last one to finish.
+    """
+    _update_job(session, job_id, running=-1, **{"succeeded" if success else "failed": 1})
+    # only one task can set finished_at
+    finished = (session.query(GradingJob)
+                .filter(GradingJob.id == job_id,
+                        GradingJob.finished_at.is_(None),
+                        GradingJob.succeeded + GradingJob.failed >= GradingJob.total)
+                .update({GradingJob.finished_at: datetime.utcnow()}, synchronize_session=False))
+    session.commit()
+    return finished == 1
+
+
+def _autograde(task: GraderTask, lecture_id: int, assignment_id: int, sub_id: int,
+               bypass_cache: bool, generate_feedback: bool = False) -> Optional[bool]:
+    """
+    Autogrades the submission.
+    :param generate_feedback: Whether the feedback is generated from the autograding
+    output in the same job instead of a following generate_feedback_task.
+    :return: Whether the submission was graded successfully or None if it was skipped.
+    """
+    submission = task.session.query(Submission).get(sub_id)
     if submission is None or submission.assignment.id != assignment_id or submission.assignment.lecture.id != lecture_id:
         raise ValueError("incorrect submission")
+    if submission.auto_status != "pending":
+        # superseded by a newer submission, see AdmissionController.supersede
+        task.log.info(f"Skipping autograding task of submission {submission.id} "
+                      f"with status {submission.auto_status}")
+        return None
 
-    executor = RequestHandlerConfig.instance().autograde_executor_class(
-        grader_service_dir, submission,
-        config=self.celery.config
+    executor = task.bootstrap.autograde_executor_class(
+        task.bootstrap.grader_service_dir, submission,
+        config=task.celery.config,
+        bypass_cache=bypass_cache,
+        feedback_executor_class=task.bootstrap.feedback_executor_class if generate_feedback else None
     )
-    self.log.info(f"Running autograding task for submission {submission.id}")
+    task.log.info(f"Running autograding task for submission {submission.id}")
     executor.start()
-    self.log.info(f"Autograding task of submission {submission.id} exited!")
+    task.log.info(f"Autograding task of submission {submission.id} exited!")
+    return submission.auto_status == "automatically_graded"
 
 
 @app.task(bind=True, base=GraderTask)
-def generate_feedback_task(self: GraderTask, lecture_id: int, assignment_id: int, sub_id: int):
-    from grader_service.main import GraderService
-    grader_service_dir = GraderService(config=self.celery.config).grader_service_dir
+def autograde_task(self: GraderTask, lecture_id: int, assignment_id: int, sub_id: int,
+                   bypass_cache: bool = False, job_id: Optional[int] = None,
+                   generate_feedback: bool = False):
+    if job_id is None:
+        dedup = TaskDeduplicator.instance()
+        dedup.start(self.session, AUTOGRADE, sub_id)
+        if generate_feedback:
+            dedup.start(self.session, FEEDBACK, sub_id)
+        try:
+            graded = _autograde(self, lecture_id, assignment_id, sub_id, bypass_cache,
+                                generate_feedback=generate_feedback)
+        except Exception:
+            self.session.rollback()
+            raise
+        finally:
+            if dedup.release(self.session, AUTOGRADE, sub_id):
+                _rerun_autograde(self, lecture_id, assignment_id, sub_id)
+            if generate_feedback and dedup.release(self.session, FEEDBACK, sub_id):
+                _rerun_feedback(self, lecture_id, assignment_id, sub_id)
+        if graded is None:
+            # do not run the rest of the chain, e.g. feedback generation
+            self.request.chain = None
+        return
 
+    # tasks of a bulk regrade must not fail, otherwise the following submissions
+    # in the chain are not graded
+    _update_job(self.session, job_id, running=1)
+    success = False
+    dedup = TaskDeduplicator.instance()
+    submission = self.session.query(Submission).get(sub_id)
+    if submission is not None and not dedup.acquire(self.session, AUTOGRADE, submission):
+        # the autograding task in flight (or its follow-up run) grades the submission
+        self.log.info(f"Submission {sub_id} of grading job {job_id} is already being autograded")
+        success = True
+    else:
+        dedup.start(self.session, AUTOGRADE, sub_id)
+        try:
+            success = bool(_autograde(self, lecture_id, assignment_id, sub_id, bypass_cache))
+        except Exception:
+            self.session.rollback()
+            self.log.error(f"Autograding task of submission {sub_id} in grading job {job_id} failed",
+                           exc_info=True)
+        finally:
+            if dedup.release(self.session, AUTOGRADE, sub_id):
+                _rerun_autograde(self, lecture_id, assignment_id, sub_id)
+    if _finish_job_task(self.session, job_id, success):
+        self.log.info(f"Grading job {job_id} is complete")
+        job = self.session.query(GradingJob).get(job_id)
+        if job.sync_lti:
+            lti_sync_task.delay(lecture_id, assignment_id, None, False)
+
+
+def _rerun_autograde(task: GraderTask, lecture_id: int, assignment_id: int, sub_id: int) -> None:
+    """Starts the follow-up run of duplicate autograding requests, see TaskDeduplicator."""
+    submission = task.session.query(Submission).get(sub_id)
+    submission.auto_status = "pending"
+    if submission.feedback_status == "generated":
+        submission.feedback_status = "feedback_outdated"
+    task.session.commit()
+    task.log.info(f"Rerunning autograding task of submission {sub_id}")
+    autograde_task.delay(lecture_id, assignment_id, sub_id)
+
+
+@app.task(bind=True, base=GraderTask)
+def generate_feedback_task(self: GraderTask, lecture_id: int, assignment_id: int, sub_id: int):
     submission = self.session.query(Submission).get(sub_id)
     if submission is None or submission.assignment.id != assignment_id or submission.assignment.lecture.id != lecture_id:
         raise ValueError("incorrect submission")
 
-    executor = GenerateFeedbackExecutor(
-        grader_service_dir, submission,
-        config=self.celery.config
-    )
-    executor.start()
+    dedup = TaskDeduplicator.instance()
+    dedup.start(self.session, FEEDBACK, sub_id)
+    try:
+        executor = self.bootstrap.feedback_executor_class(
+            self.bootstrap.grader_service_dir, submission,
+            config=self.celery.config
+        )
+        executor.start()
+    except Exception:
+        self.session.rollback()
+        raise
+    finally:
+        if dedup.release(self.session, FEEDBACK, sub_id):
+            _rerun_feedback(self, lecture_id, assignment_id, sub_id)
     self.log.info(f"Successfully generated feedback for submission {submission.id}!")
 
 
+def _rerun_feedback(task: GraderTask, lecture_id: int, assignment_id: int, sub_id: int) -> None:
+    """Starts the follow-up run of duplicate feedback requests, see TaskDeduplicator."""
+    submission = task.session.query(Submission).get(sub_id)
+    submission.feedback_status = "generating"
+    task.session.commit()
+    task.log.info(f"Rerunning feedback task of submission {sub_id}")
+    chain(
+        generate_feedback_task.si(lecture_id, assignment_id, sub_id),
+        lti_sync_task.si(lecture_id, assignment_id, sub_id, sync_on_feedback=True)
+    )()
+
+
 @app.task(bind=True, base=GraderTask)
 def lti_sync_task(self: GraderTask, lecture_id: int, assignment_id: int, sub_id: Union[int, None],
                   sync_on_feedback: bool) -> Union[dict, None]:
@@ -6,13 +6,23 @@ from grader_service.autograding.celery.app import CeleryApp
 def main():
     parser = argparse.ArgumentParser(prog='Grader Worker', description='Starts celery worker for grader service.')
     parser.add_argument('-f', '--config', help='config file path', required=True)
+    parser.add_argument('-Q', '--queues', default=None,
+                        help='comma separated list of queues the worker consumes '
+                             '(see CeleryApp.task_queues), defaults to the default queue')
+    parser.add_argument('-c', '--concurrency', type=int, default=None,
+                        help='number of tasks the worker runs concurrently')
 
     args = parser.parse_args()
 
     celery = CeleryApp.instance(config_file=os.path.abspath(args.config))
     app = celery.app
 
-    worker = app.Worker(**celery.worker_kwargs)
+    worker_kwargs = dict(celery.worker_kwargs)
+    if args.queues is not None:
+        worker_kwargs["queues"] = [q.strip() for q in args.queues.split(",") if q.strip()]
+    if args.concurrency is not None:
+        worker_kwargs["concurrency"] = args.concurrency
+    worker = app.Worker(**worker_kwargs)
     worker.start()
 
 
@@ -0,0 +1,125 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import datetime
+import hashlib
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from traitlets import Bool, Float
+from traitlets.config import SingletonConfigurable
+
+from grader_service.orm import Submission
+from grader_service.orm.task_lock import TaskLock
+
+AUTOGRADE = "autograde"
+FEEDBACK = "feedback"
+
+
+def properties_version(submission: Submission) -> str:
+    """Returns a hash of the assignment properties the grading of the submission depends on."""
+    properties = submission.assignment.properties or ""
+    return hashlib.sha1(properties.encode("utf-8")).hexdigest()
+
+
+class TaskDeduplicator(SingletonConfigurable):
+    """
+    Coalesces grading tasks of a submission that are requested while a task of
+    the same type is in flight. The in-flight tasks are stored in a lock table keyed
+    by the task type and the submission id, so the state is shared by all processes
+    of the service. A duplicate request attaches to a queued task. If the task is
+    already running or the assignment properties changed since the task was queued,
+    a single follow-up run is scheduled for all duplicates when the task finishes.
+    """
+
+    enabled = Bool(default_value=True, allow_none=False,
+                   help="Whether grading tasks that are started by instructors "
+                        "are deduplicated per submission.").tag(config=True)
+
+    lock_timeout = Float(default_value=3600.0, allow_none=False,
+                         help="Time in seconds after which the lock of a task is considered stale, "
+                              "e.g. because the worker crashed, and a new task can be started."
+                         ).tag(config=True)
+
+    def acquire(self, session: Session, task_type: str, submission: Submission) -> bool:
+        """
+        Registers a requested task of the submission and commits the session.
+        :param session: The database session.
+        :param task_type: The type of the task.
+        :param submission: The submission.
+        :return: Whether a new task has to be started or False if the request
+            was coalesced with the task in flight.
+        """
+        if not self.enabled:
+            return True
+        version = properties_version(submission)
+        stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.lock_timeout)
+        (self._lock(session, task_type, submission.id)
+         .filter(TaskLock.created_at < stale)
+         .delete(synchronize_session=False))
+        if self._attach(session, task_type, submission.id, version):
+            return False
+        try:
+            with session.begin_nested():
+                session.add(TaskLock(task_type=task_type, sub_id=submission.id, version=version))
+            session.commit()
+            return True
+        except IntegrityError:
+            # another request inserted the lock concurrently
+            session.rollback()
+            return not self._attach(session, task_type, submission.id, version)
+
+    def register(self, session: Session, task_type: str, submission: Submission) -> None:
+        """
+        Registers the task of a new submission, which cannot have a task in flight yet.
+        The lock is added even if deduplication is disabled, so it is known whether the
+        task has started, see :meth:`AdmissionController.supersede`. The caller has to commit.
+        :param session: The database session.
+        :param task_type: The type of the task.
+        :param submission: The new submission.
+        """
+        session.add(TaskLock(task_type=task_type, sub_id=submission.id,
+                             version=properties_version(submission)))
+
+    def start(self, session: Session, task_type: str, sub_id: int) -> None:
+        """Marks the task in flight as running, a no-op for tasks without a lock."""
+        (self._lock(session, task_type, sub_id)
+         .update({TaskLock.started_at: datetime.datetime.utcnow()}, synchronize_session=False))
+        session.commit()
+
+    def release(self, session: Session, task_type: str, sub_id: int) -> bool:
+        """
+        Releases the lock of a finished task unless a follow-up run was requested.
+        :return: Whether the caller has to start the follow-up run, which keeps the lock.
+        """
+        deleted = (self._lock(session, task_type, sub_id)
+                   .filter(TaskLock.rerun.is_(False))
+                   .delete(synchronize_session=False))
+        session.commit()
+        if deleted:
+            return False
+        rerun = (self._lock(session, task_type, sub_id)
+                 .update({TaskLock.rerun: False, TaskLock.started_at: None,
+                          TaskLock.created_at: datetime.datetime.utcnow()},
+                         synchronize_session=False))
+        session.commit()
+        return rerun == 1
+
+    def _attach(self, session: Session, task_type: str, sub_id: int, version: str) -> bool:
+        # a follow-up run is required if the task already read the submission or properties
+        attached = (self._lock(session, task_type, sub_id)
+                    .update({TaskLock.rerun: or_(TaskLock.rerun,
+                                                 TaskLock.started_at.isnot(None),
+                                                 TaskLock.version != version),
+                             TaskLock.version: version},
+                            synchronize_session=False))
+        session.commit()
+        return attached == 1
+
+    @staticmethod
+    def _lock(session: Session, task_type: str, sub_id: int):
+        return session.query(TaskLock).filter(TaskLock.task_type == task_type, TaskLock.sub_id == sub_id)
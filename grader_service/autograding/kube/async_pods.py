@@ -0,0 +1,221 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+import codecs
+import os
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from traitlets import Float, Integer
+from traitlets.config import SingletonConfigurable
+
+try:
+    from kubernetes_asyncio import client as async_client
+    from kubernetes_asyncio import config as async_config
+except ImportError:
+    async_client = None
+    async_config = None
+
+if TYPE_CHECKING:
+    from grader_service.autograding.kube.watch import PodWatcher
+    from grader_service.autograding.log_buffer import LogBuffer
+
+
+class AsyncPodRunner(SingletonConfigurable):
+    """
+    Runs grader pods with the asynchronous kubernetes client on an event loop
+    in a background thread that is shared by all executors of the process.
+    Creating, waiting for, following the logs of and deleting pods does not
+    block, so a single worker process can drive many pods at once while the
+    calling threads only wait for their result. If a
+    :class:`~grader_service.autograding.kube.watch.PodWatcher` is given, the
+    pods wait for its events on the loop and are only polled while the watch
+    is disconnected. At most max_in_flight pods are running at the same time,
+    further pods wait until a slot is free.
+
+    The loop is recreated in forked processes, e.g. the children of the
+    prefork pool, but each of them only grades one submission at a time.
+    Requires the kubernetes_asyncio package.
+    """
+
+    max_in_flight = Integer(32, allow_none=False,
+                            help="Maximum number of grader pods that are running "
+                                 "at the same time in this process.").tag(config=True)
+
+    poll_interval = Float(1.0, allow_none=False,
+                          help="Time in seconds to wait before the pod status "
+                               "is polled again.").tag(config=True)
+
+    watch_resync_interval = Float(60.0, allow_none=False,
+                                  help="Time in seconds after which the status is polled "
+                                       "if no watch event arrived.").tag(config=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._api_lock: Optional[asyncio.Lock] = None
+        self._api = None
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._pid != os.getpid():
+                # the thread of the loop does not exist in a forked process
+                self._reset()
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True,
+                                 name="kube-async").start()
+            return self._loop
+
+    def stop(self) -> None:
+        """Stops the event loop of the runner."""
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def run(self, pod: dict, namespace: str, kube_context: Optional[str] = None,
+            watcher: Optional["PodWatcher"] = None,
+            log_buffer: Optional["LogBuffer"] = None) -> Tuple[str, str, int]:
+        """
+        Runs the pod on the event loop of the runner and blocks
+        the calling thread until it finished and was deleted.
+        :param pod: The serialized pod manifest.
+        :param namespace: The namespace of the pod.
+        :param kube_context: The kubernetes context to load the config from
+            or None for the in-cluster config.
+        :param watcher: The pod watcher to wait for the pod with, the pod is polled if None.
+        :param log_buffer: If given, the logs are followed into the buffer while the pod runs.
+        :return: The terminal phase, the logs of the pod and the number
+            of characters dropped from the beginning of the logs.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.run_pod(pod, namespace, kube_context, watcher, log_buffer), self._get_loop())
+        return future.result()
+
+    async def _get_api(self, kube_context: Optional[str]):
+        # all coroutines run on the same loop, so the check does not need a thread lock
+        if self._api_lock is None:
+            self._api_lock = asyncio.Lock()
+        async with self._api_lock:
+            if self._api is None:
+                if async_client is None:
+                    raise RuntimeError("The kubernetes_asyncio package is required "
+                                       "to run grader pods asynchronously!")
+                if kube_context is None:
+                    async_config.load_incluster_config()
+                else:
+                    await async_config.load_kube_config(context=kube_context)
+                self._api = async_client.CoreV1Api(async_client.ApiClient())
+        return self._api
+
+    async def run_pod(self, pod: dict, namespace: str, kube_context: Optional[str] = None,
+                      watcher: Optional["PodWatcher"] = None,
+                      log_buffer: Optional["LogBuffer"] = None) -> Tuple[str, str, int]:
+        """
+        Creates the pod, waits until it reached a terminal phase,
+        reads its logs and deletes it.
+        :return: The terminal phase, the logs of the pod and the number
+            of characters dropped from the beginning of the logs.
+        """
+        api = await self._get_api(kube_context)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        name = pod["metadata"]["name"]
+        async with self._semaphore:
+            self.log.info(f"Starting pod {name} in namespace {namespace}")
+            await api.create_namespaced_pod(namespace=namespace, body=pod)
+            stopped = asyncio.Event()
+            follower = None
+            if log_buffer is not None:
+                follower = asyncio.ensure_future(
+                    self._follow_logs(api, name, namespace, log_buffer, stopped))
+            try:
+                phase = await self._wait(api, name, namespace, watcher)
+                stopped.set()
+                if follower is not None and await self._finish(follower):
+                    return phase, log_buffer.getvalue().strip(), log_buffer.offset
+                logs = await api.read_namespaced_pod_log(name=name, namespace=namespace)
+                return phase, logs.strip(), 0
+            finally:
+                stopped.set()
+                if follower is not None:
+                    follower.cancel()
+                self.log.info(f"Deleting pod '{name}' in namespace '{namespace}'")
+                try:
+                    await api.delete_namespaced_pod(name=name, namespace=namespace)
+                except Exception:
+                    self.log.warning(f"Could not delete pod {name}", exc_info=True)
+
+    # https://kubernetes.io/docs/concepts/workloads/pods/pod-lifecycle/#pod-phase
+    async def _wait(self, api, name: str, namespace: str,
+                    watcher: Optional["PodWatcher"] = None) -> str:
+        try:
+            while True:
+                if watcher is not None and watcher.connected:
+                    phase = await watcher.wait_async(name, self.watch_resync_interval)
+                    if phase is not None:
+                        return phase
+                pod = await api.read_namespaced_pod_status(name=name, namespace=namespace)
+                if pod.status.phase in ("Succeeded", "Failed"):
+                    return pod.status.phase
+                # continue for Running, Unknown and Pending
+                if watcher is None or not watcher.connected:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            if watcher is not None:
+                watcher.forget(name)
+
+    @staticmethod
+    async def _finish(follower: asyncio.Future, timeout: float = 10.0) -> bool:
+        """
+        Waits until the log stream ended after the pod finished.
+        :return: Whether the complete logs were read.
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(follower), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    async def _follow_logs(self, api, name: str, namespace: str,
+                           log_buffer: "LogBuffer", stopped: asyncio.Event) -> bool:
+        """
+        Follows the logs of the pod into the buffer until the log stream ends.
+        :return: Whether the complete logs were read.
+        """
+        loop = asyncio.get_running_loop()
+        while not stopped.is_set():
+            try:
+                response = await api.read_namespaced_pod_log(
+                    name=name, namespace=namespace, follow=True, _preload_content=False)
+            except Exception:
+                # the container has not started yet
+                try:
+                    await asyncio.wait_for(stopped.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # chunks may end within a multi-byte character
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            try:
+                async for chunk in response.content.iter_any():
+                    # the buffer may flush the logs to the database
+                    await loop.run_in_executor(None, log_buffer.write, decoder.decode(chunk))
+                log_buffer.write(decoder.decode(b"", final=True))
+                return True
+            except Exception:
+                self.log.warning(f"Following the logs of pod {name} failed", exc_info=True)
+                return False
+            finally:
+                response.release()
+        return False
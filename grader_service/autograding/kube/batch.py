@@ -0,0 +1,105 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict as TDict, Hashable, List as TList, Optional
+
+from traitlets import Float, Integer
+from traitlets.config import SingletonConfigurable
+
+
+@dataclass
+class BatchJob:
+    """A single grader-convert invocation that is run in its own container of a batch pod."""
+    output_path: str
+    command: TList[str]
+    #: Volume mounts of the submission directories of the job
+    volume_mounts: TList[dict] = field(default_factory=list)
+    done: threading.Event = field(default_factory=threading.Event)
+    #: Exit code of the command or None if it did not run to completion
+    returncode: Optional[int] = None
+    logs: str = ""
+
+
+@dataclass
+class _Batch:
+    run: Callable[[TList[BatchJob]], None]
+    jobs: TList[BatchJob] = field(default_factory=list)
+    timer: Optional[threading.Timer] = None
+    dispatched: bool = False
+
+
+class PodBatcher(SingletonConfigurable):
+    """
+    Groups the jobs of concurrently running executors in one process by a key
+    (e.g. namespace and image), so a single pod grades several submissions.
+    Only the scheduling and startup of the pod is shared: every job runs in
+    its own container that mounts only the directories of its submission.
+    A batch is dispatched as soon as it holds max_batch_size jobs or
+    max_wait seconds after its first job was submitted.
+
+    Batches can only form if the worker runs several tasks in one
+    process, e.g. with the threads pool of celery.
+    """
+
+    max_batch_size = Integer(8, allow_none=False,
+                             help="Maximum number of submissions graded by one pod.").tag(config=True)
+
+    max_wait = Float(5.0, allow_none=False,
+                     help="Maximum time in seconds a submission waits for "
+                          "other submissions before its batch is dispatched.").tag(config=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._pending: TDict[Hashable, _Batch] = {}
+
+    def submit(self, key: Hashable, job: BatchJob, run: Callable[[TList[BatchJob]], None]) -> None:
+        """
+        Adds a job to the pending batch of the key. The run function of the
+        first job of a batch is called with all jobs of the batch in a
+        background thread and has to set the returncode and logs of the jobs.
+        The done event of every job is set after the batch finished.
+        :param key: Jobs with the same key can be run in the same pod.
+        :param job: The job to add.
+        :param run: Function that runs a batch of jobs.
+        """
+        with self._lock:
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = _Batch(run=run)
+                batch.timer = threading.Timer(self.max_wait, self._dispatch, args=(key, batch))
+                batch.timer.daemon = True
+                batch.timer.start()
+            batch.jobs.append(job)
+            full = len(batch.jobs) >= self.max_batch_size
+        if full:
+            self._dispatch(key, batch)
+
+    def _dispatch(self, key: Hashable, batch: _Batch) -> None:
+        with self._lock:
+            if batch.dispatched:
+                return
+            batch.dispatched = True
+            batch.timer.cancel()
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+        self.log.info(f"Dispatching batch of {len(batch.jobs)} submissions for {key}")
+        threading.Thread(target=self._run, args=(batch,), daemon=True,
+                         name="pod-batch").start()
+
+    def _run(self, batch: _Batch) -> None:
+        try:
+            batch.run(batch.jobs)
+        except Exception as e:
+            self.log.error("Batch pod failed", exc_info=True)
+            for job in batch.jobs:
+                if job.returncode is None:
+                    job.logs = job.logs or f"Batch pod failed: {e}"
+        finally:
+            for job in batch.jobs:
+                job.done.set()
@@ -5,22 +5,34 @@
 # LICENSE file in the root directory of this source tree.
 
 import asyncio
+import codecs
+import copy
+import functools
 import json
 import os
 import shutil
 import inspect
+import threading
+import uuid
 from asyncio import Task, run
 
 from kubernetes.client import (V1Pod, CoreV1Api, V1ObjectMeta,
-                               V1PodStatus, ApiException)
-from traitlets import Callable, Unicode, Integer, List, Dict
+                               V1PodStatus, V1VolumeMount, ApiException)
+from typing import List as TList, Optional, Tuple
+
+from traitlets import Bool, Callable, Unicode, Integer, List, Dict, Float
 from traitlets.config import LoggingConfigurable
 from urllib3.exceptions import MaxRetryError
 
-from grader_service.autograding.kube.util import (make_pod,
+from grader_service.autograding.kube.async_pods import AsyncPodRunner
+from grader_service.autograding.kube.batch import BatchJob, PodBatcher
+from grader_service.autograding.kube.standby import StandbyPool
+from grader_service.autograding.kube.util import (make_pod, get_k8s_model,
                                                   get_current_namespace)
+from grader_service.autograding.kube.watch import PodWatcher, get_pod_watcher
 from grader_service.autograding.local_grader import (LocalAutogradeExecutor,
                                                      rm_error)
+from grader_service.autograding.log_buffer import LogBuffer
 from kubernetes import config
 
 from grader_service.orm import Lecture, Submission
@@ -30,16 +42,26 @@ from grader_service.orm import Assignment
 class GraderPod(LoggingConfigurable):
     """
     Wrapper for a kubernetes pod that supports polling of the pod's status.
+    If a :class:`~grader_service.autograding.kube.watch.PodWatcher` is given,
+    the pod waits for the watch events and only polls the status if the watch
+    is disconnected or no event arrived within watch_resync_interval.
     """
     poll_interval = Integer(default_value=1000,
                             allow_none=False,
                             help="Time in ms to wait before "
                                  "status is polled again.").tag(config=True)
 
-    def __init__(self, pod: V1Pod, api: CoreV1Api, **kwargs):
+    watch_resync_interval = Float(default_value=60.0,
+                                  allow_none=False,
+                                  help="Time in seconds after which the status is polled "
+                                       "if no watch event arrived.").tag(config=True)
+
+    def __init__(self, pod: V1Pod, api: CoreV1Api,
+                 watcher: Optional[PodWatcher] = None, **kwargs):
         super().__init__(**kwargs)
         self.pod = pod
         self._client = api
+        self._watcher = watcher
         self.loop = asyncio.get_event_loop()
         self._polling_task = self.loop.create_task(self._poll_status())
 
@@ -61,19 +83,86 @@ class GraderPod(LoggingConfigurable):
     def namespace(self) -> str:
         return self.pod.metadata.namespace
 
+    def _watching(self) -> bool:
+        return self._watcher is not None and self._watcher.connected
+
     # https://kubernetes.io/docs/concepts/workloads/pods/pod-lifecycle/#pod-phase
     async def _poll_status(self) -> str:
         meta: V1ObjectMeta = self.pod.metadata
-        while True:
-            status: V1PodStatus = \
-                self._client.read_namespaced_pod_status(
-                    name=meta.name,
-                    namespace=meta.namespace).status
+        try:
+            while True:
+                if self._watching():
+                    phase = await self.loop.run_in_executor(
+                        None, self._watcher.wait, meta.name, self.watch_resync_interval)
+                    if phase is not None:
+                        return phase
+
+                status: V1PodStatus = \
+                    self._client.read_namespaced_pod_status(
+                        name=meta.name,
+                        namespace=meta.namespace).status
+
+                if status.phase == "Succeeded" or status.phase == "Failed":
+                    return status.phase
+                # continue for Running, Unknown and Pending
+                if not self._watching():
+                    await asyncio.sleep(self.poll_interval / 1000)
+        finally:
+            if self._watcher is not None:
+                self._watcher.forget(meta.name)
+
+
+class _PodLogFollower:
+    """
+    Follows the logs of a grader pod in a background thread
+    and writes them to the log buffer of the executor.
+    """
 
-            if status.phase == "Succeeded" or status.phase == "Failed":
-                return status.phase
-            # continue for Running, Unknown and Pending
-            await asyncio.sleep(self.poll_interval / 1000)
+    def __init__(self, executor: "KubeAutogradeExecutor", pod: GraderPod):
+        self.executor = executor
+        self.pod = pod
+        self.buffer: LogBuffer = executor._make_log_buffer()
+        self.complete = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"pod-logs-{pod.name}")
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def finish(self, timeout: float = 10.0) -> bool:
+        """
+        Waits until the log stream ended after the pod finished.
+        :return: Whether the complete logs were read.
+        """
+        self._stopped.set()
+        self._thread.join(timeout)
+        return self.complete and not self._thread.is_alive()
+
+    def _run(self) -> None:
+        client = self.executor.client
+        while not self._stopped.is_set():
+            try:
+                response = client.read_namespaced_pod_log(
+                    name=self.pod.name, namespace=self.pod.namespace,
+                    follow=True, _preload_content=False)
+            except ApiException:
+                # the container has not started yet
+                self._stopped.wait(1)
+                continue
+            # chunks may end within a multi-byte character
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            try:
+                for chunk in response.stream():
+                    self.buffer.write(decoder.decode(chunk))
+                self.buffer.write(decoder.decode(b"", final=True))
+                self.complete = True
+            except Exception:
+                self.executor.log.warning(f"Following the logs of pod {self.pod.name} failed",
+                                          exc_info=True)
+            finally:
+                response.release_conn()
+            return
 
 
 def _get_image_name(lecture: Lecture, assignment: Assignment = None) -> str:
@@ -89,6 +178,10 @@ def _get_image_name(lecture: Lecture, assignment: Assignment = None) -> str:
     return f"{lecture.code}_image"
 
 
+def default_standby_pool_size_func(lecture: Lecture) -> Tuple[int, int]:
+    return 1, 4
+
+
 class KubeAutogradeExecutor(LocalAutogradeExecutor):
     """
     Runs an autograde job in a kubernetes cluster as a pod.
@@ -135,6 +228,47 @@ class KubeAutogradeExecutor(LocalAutogradeExecutor):
     uid = Integer(default_value=1000, allow_none=False,
                   help="The User ID for the grader container").tag(config=True)
 
+    pod_labels = Dict(default_value={"app.kubernetes.io/managed-by": "grader-service",
+                                     "app.kubernetes.io/component": "autograde"},
+                      allow_none=False,
+                      help="Labels of the grader pods. They are also used as the label selector "
+                           "of the pod watch.").tag(config=True)
+
+    use_standby_pool = Bool(default_value=False, allow_none=False,
+                            help="Whether submissions are graded by pre-started standby pods of "
+                                 "the StandbyPool of the image instead of a new pod per submission. "
+                                 "Every standby pod only mounts the files of a single submission "
+                                 "and does not use the file cache."
+                            ).tag(config=True)
+
+    standby_pool_size_func = Callable(default_value=default_standby_pool_size_func, allow_none=False,
+                                      help="Function that takes a lecture as an argument and returns "
+                                           "the minimum and maximum number of standby pods of the "
+                                           "lecture image.").tag(config=True)
+
+    batch_pods = Bool(default_value=False, allow_none=False,
+                      help="Whether submissions with the same image that are graded concurrently "
+                           "in this process are grouped into one pod by the PodBatcher. Every "
+                           "submission runs in its own container of the pod, which only mounts "
+                           "its own directories.").tag(config=True)
+
+    use_pod_watch = Bool(default_value=False, allow_none=False,
+                         help="Whether the completion of grader pods is detected by a single pod watch "
+                              "per namespace that is shared by all executors of the process. The pod "
+                              "status is only polled while the watch is disconnected.").tag(config=True)
+
+    use_async_client = Bool(default_value=False, allow_none=False,
+                            help="Whether grader pods are run by the AsyncPodRunner, which drives the "
+                                 "pods of all executors of the process on one event loop with the "
+                                 "asynchronous kubernetes client (requires kubernetes_asyncio). "
+                                 "It works with every celery pool, but only the threads pool lets "
+                                 "one worker process grade many submissions at once.").tag(config=True)
+
+    follow_pod_logs = Bool(default_value=False, allow_none=False,
+                           help="Whether the logs of the grader pod are followed while it runs, so the "
+                                "intermediate logs are stored periodically. Otherwise the logs are "
+                                "read after the pod finished.").tag(config=True)
+
     def __init__(self, grader_service_dir: str,
                  submission: Submission, **kwargs):
         super().__init__(grader_service_dir, submission, **kwargs)
@@ -186,51 +320,242 @@ class KubeAutogradeExecutor(LocalAutogradeExecutor):
             else:
                 return self.resolve_image_name(self.lecture, self.assignment)
 
-    def start_pod(self) -> GraderPod:
+    def _get_environment_key(self) -> str:
+        return self.get_image()
+
+    def _get_convert_command(self, input_path: Optional[str] = None, output_path: Optional[str] = None,
+                             previous_output_path: Optional[str] = None,
+                             file_cache: bool = True) -> TList[str]:
         """
-        Starts a pod in the default namespace
-        with the commit hash as the name of the pod.
-        The image is determined by the get_image method.
-        :return:
+        Returns the grader-convert command that autogrades the submission.
+        :param input_path: The input directory as seen by the pod, defaults to input_path.
+        :param output_path: The output directory as seen by the pod, defaults to output_path.
+        :param previous_output_path: The output directory of the previous result as seen
+            by the pod, defaults to previous_output_path.
+        :param file_cache: Whether the pod uses the file cache, which requires that it mounts the cache.
+        :return: The command as a list of arguments.
         """
-        # The output path will not exist in the pod
         command = [self.convert_executable, "autograde", "-i",
-                   self.input_path, "-o", self.output_path,
+                   input_path or self.input_path, "-o", output_path or self.output_path,
                    "-p", "**/*.ipynb",
                    f"--copy_files={self.assignment.allow_files}",
                    "--log-level=INFO",
-                   f"--ExecutePreprocessor.timeout={self.timeout_func(self.assignment.lecture)}"]
-
-        volumes = [self.volume] + self.extra_volumes
-
-        volume_mounts = [{"name": "data", "mountPath": self.input_path,
-                          "subPath": self.relative_input_path +
-                                     "/submission_" + str(self.submission.id)},
-                         {"name": "data", "mountPath": self.output_path,
-                          "subPath": self.relative_output_path +
-                                     "/submission_" + str(self.submission.id)}]
-        volume_mounts = volume_mounts + self.extra_volume_mounts
-
-        pod = make_pod(
-            name=self.submission.commit_hash,
+                   f"--ExecutePreprocessor.timeout={self.timeout_func(self.assignment.lecture)}",
+                   f"--Autograde.notebook_workers={self.notebook_workers_func(self.assignment.lecture)}",
+                   f"--Execute.record_kernel_memory={self.record_kernel_memory}",
+                   f"--Autograde.skip_unchanged_solutions={self.skip_unchanged_solutions}",
+                   f"--Autograde.record_content_hashes={self.incremental_regrade}",
+                   *self._get_cell_timeouts_args()]
+        if file_cache:
+            command.extend(self._get_file_cache_args())
+        if self.has_previous_result:
+            command.append(
+                f"--Autograde.previous_output_dir={previous_output_path or self.previous_output_path}")
+        return command
+
+    def _make_pod(self, name: str, command: TList[str], volume_mounts: TList[dict],
+                  image: str, node_selector: Optional[dict],
+                  labels: Optional[dict] = None) -> V1Pod:
+        """
+        Builds the manifest of a grader pod.
+        :param name: The name of the pod.
+        :param command: The command of the grader container.
+        :param volume_mounts: The volume mounts in addition to extra_volume_mounts.
+        :param image: The image of the grader container.
+        :param node_selector: The node selector of the pod.
+        :param labels: The labels of the pod, defaults to pod_labels.
+        :return: The pod manifest.
+        """
+        return make_pod(
+            name=name,
             cmd=command,
-            image=self.get_image(),
+            image=image,
             image_pull_policy=None,
             working_dir="/",
-            volumes=volumes,
-            volume_mounts=volume_mounts,
-            labels=None,
+            volumes=[self.volume] + self.extra_volumes,
+            volume_mounts=volume_mounts + self.extra_volume_mounts,
+            labels=self.pod_labels if labels is None else labels,
             annotations=None,
-            node_selector=self.resolve_node_selector(self.lecture),
+            node_selector=node_selector,
             tolerations=None,
             run_as_user=self.uid,
         )
 
+    def _create_pod(self, name: str, command: TList[str], volume_mounts: TList[dict],
+                    image: str, node_selector: Optional[dict],
+                    labels: Optional[dict] = None) -> V1Pod:
+        """
+        Creates a grader pod in the namespace of the executor.
+        The parameters are the same as of :meth:`_make_pod`.
+        :return: The created pod.
+        """
+        pod = self._make_pod(name, command, volume_mounts, image, node_selector, labels)
         self.log.info(f"Starting pod {pod.metadata.name}"
                       f" with command: {command}")
-        pod = self.client.create_namespaced_pod(namespace=self.namespace,
-                                                body=pod)
-        return GraderPod(pod, self.client, config=self.config)
+        return self.client.create_namespaced_pod(namespace=self.namespace,
+                                                 body=pod)
+
+    def _grader_pod(self, pod: V1Pod) -> GraderPod:
+        """
+        Wraps a created pod to wait for its completion,
+        using the shared pod watch if it is enabled.
+        """
+        return GraderPod(pod, self.client, watcher=self._get_pod_watcher(), config=self.config)
+
+    def _get_pod_watcher(self) -> Optional[PodWatcher]:
+        """Returns the shared pod watch of the namespace or None if it is disabled."""
+        if not self.use_pod_watch:
+            return None
+        label_selector = ",".join(f"{k}={v}" for k, v in self.pod_labels.items())
+        return get_pod_watcher(self.client, self.namespace, label_selector, config=self.config)
+
+    def _get_volume_mounts(self) -> TList[dict]:
+        """
+        Returns the volume mounts of the input and output
+        directories of the submission in the grader pod.
+        """
+        # The output path will not exist in the pod
+        volume_mounts = [{"name": "data", "mountPath": self.input_path,
+                          "subPath": self.relative_input_path +
+                                     "/submission_" + str(self.submission.id)},
+                         {"name": "data", "mountPath": self.output_path,
+                          "subPath": self.relative_output_path +
+                                     "/submission_" + str(self.submission.id)}]
+        if self.has_previous_result:
+            volume_mounts.append({"name": "data", "mountPath": self.previous_output_path,
+                                  "subPath": self.relative_input_path +
+                                             "/previous_" + str(self.submission.id)})
+        return volume_mounts
+
+    def start_pod(self) -> GraderPod:
+        """
+        Starts a pod in the default namespace
+        with the commit hash as the name of the pod.
+        The image is determined by the get_image method.
+        :return:
+        """
+        return self._grader_pod(self._create_pod(
+            self.submission.commit_hash, self._get_convert_command(),
+            self._get_volume_mounts(), self.get_image(), self.resolve_node_selector(self.lecture)))
+
+    def _run_async(self):
+        """
+        Runs the grader pod of the submission on the event loop of the
+        :class:`AsyncPodRunner` and waits until it finished. The runner
+        waits for the events of the pod watch if it is enabled and
+        follows the logs if follow_pod_logs is enabled.
+        :return: None
+        """
+        pod = self._make_pod(self.submission.commit_hash, self._get_convert_command(),
+                             self._get_volume_mounts(), self.get_image(),
+                             self.resolve_node_selector(self.lecture))
+        body = self.client.api_client.sanitize_for_serialization(pod)
+        log_buffer = self._make_log_buffer() if self.follow_pod_logs else None
+        try:
+            status, self.grading_logs, self.grading_logs_offset = \
+                AsyncPodRunner.instance(config=self.config).run(
+                    body, self.namespace, self.kube_context,
+                    watcher=self._get_pod_watcher(), log_buffer=log_buffer)
+        except Exception as e:
+            self.log.error(f"Pod {self.submission.commit_hash} could not be run: {e}")
+            raise RuntimeError("Pod has failed execution!")
+        self.log.info("Pod logs:\n" + self.grading_logs)
+        if status != "Succeeded":
+            self.log.info("Pod has failed execution:")
+            raise RuntimeError("Pod has failed execution!")
+        self.log.info("Pod has successfully completed execution!")
+
+    def _run_standby(self):
+        """
+        Queues the submission for the :class:`StandbyPool` of the image
+        and waits until a standby pod graded it.
+        :return: None
+        """
+        min_pods, max_pods = self.standby_pool_size_func(self.lecture)
+        returncode, logs = StandbyPool.instance(config=self.config).run(
+            self, self.get_image(), self.resolve_node_selector(self.lecture), min_pods, max_pods)
+        self.grading_logs = logs.strip()
+        self.log.info("Grading logs:\n" + self.grading_logs)
+        if returncode != 0:
+            raise RuntimeError("Pod has failed execution!")
+        self.log.info("Submission was successfully graded in standby pod!")
+
+    def _run_batched(self):
+        """
+        Adds the submission to a batch of the :class:`PodBatcher` and
+        waits until the batch pod graded it.
+        :return: None
+        """
+        image = self.get_image()
+        node_selector = self.resolve_node_selector(self.lecture)
+        job = BatchJob(output_path=self.output_path, command=self._get_convert_command(),
+                       volume_mounts=self._get_volume_mounts())
+        key = (self.namespace, image, json.dumps(node_selector, sort_keys=True))
+        PodBatcher.instance(config=self.config).submit(
+            key, job, functools.partial(self._run_batch_pod, image=image,
+                                        node_selector=node_selector))
+        job.done.wait()
+        self.grading_logs = job.logs.strip()
+        self.log.info("Grading logs:\n" + self.grading_logs)
+        if job.returncode != 0:
+            raise RuntimeError("Pod has failed execution!")
+        self.log.info("Submission was successfully graded in batch pod!")
+
+    def _run_batch_pod(self, jobs: TList[BatchJob], image: str, node_selector: Optional[dict]):
+        """
+        Runs all jobs in one pod. Every job runs in its own container, which only
+        mounts the directories of its submission, so the jobs share the scheduling
+        and startup of the pod but neither their files nor their processes.
+        The exit code and logs of every job are read from its container after the pod finished.
+        Runs in a thread of the :class:`PodBatcher`.
+        :param jobs: The jobs of the batch.
+        :param image: The image of the batch.
+        :param node_selector: The node selector of the batch.
+        :return: None
+        """
+        pod = self._make_pod(f"batch-{uuid.uuid4().hex[:16]}", jobs[0].command,
+                             jobs[0].volume_mounts, image, node_selector)
+        template = pod.spec.containers.pop()
+        containers = {}
+        for i, job in enumerate(jobs):
+            container = copy.deepcopy(template)
+            container.name = f"job-{i}"
+            container.args = job.command
+            container.volume_mounts = [get_k8s_model(V1VolumeMount, obj) for obj in
+                                       job.volume_mounts + self.extra_volume_mounts]
+            containers[container.name] = job
+            pod.spec.containers.append(container)
+
+        # the batch runs in a thread without an event loop
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self.log.info(f"Starting batch pod {pod.metadata.name} for {len(jobs)} submissions")
+            grader_pod = self._grader_pod(
+                self.client.create_namespaced_pod(namespace=self.namespace, body=pod))
+            try:
+                status = grader_pod.poll()
+                self.log.info(f"Batch pod {grader_pod.name} finished with status {status}")
+                container_statuses = self.client.read_namespaced_pod(
+                    name=grader_pod.name, namespace=grader_pod.namespace).status.container_statuses
+                for container_status in container_statuses or []:
+                    job = containers.get(container_status.name)
+                    terminated = container_status.state.terminated if container_status.state else None
+                    if job is None or terminated is None:
+                        continue
+                    job.returncode = terminated.exit_code
+                    job.logs = self.client.read_namespaced_pod_log(
+                        name=grader_pod.name, namespace=grader_pod.namespace,
+                        container=container_status.name)
+            finally:
+                self._delete_pod(grader_pod)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        for job in jobs:
+            if job.returncode is None:
+                job.logs = job.logs or f"Batch pod finished with status {status} before grading the submission"
 
     def _run(self):
         """
@@ -246,13 +571,31 @@ class KubeAutogradeExecutor(LocalAutogradeExecutor):
 
         self._write_gradebook(self._put_grades_in_assignment_properties())
 
+        if self.use_standby_pool:
+            self._run_standby()
+            return
+        if self.batch_pods:
+            self._run_batched()
+            return
+        if self.use_async_client:
+            self._run_async()
+            return
+
         grader_pod = None
         try:
             grader_pod = self.start_pod()
             self.log.info(f"Started pod {grader_pod.name} in namespace "
                           f"{grader_pod.namespace}")
+            follower = None
+            if self.follow_pod_logs:
+                follower = _PodLogFollower(self, grader_pod)
+                follower.start()
             status = grader_pod.poll()
-            self.grading_logs = self._get_pod_logs(grader_pod)
+            if follower is not None and follower.finish():
+                self.grading_logs = follower.buffer.getvalue().strip()
+                self.grading_logs_offset = follower.buffer.offset
+            else:
+                self.grading_logs = self._get_pod_logs(grader_pod)
             self.log.info("Pod logs:\n" + self.grading_logs)
             if status == "Succeeded":
                 self.log.info("Pod has successfully completed execution!")
@@ -0,0 +1,250 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from traitlets import Float, Unicode
+from traitlets.config import SingletonConfigurable
+
+from grader_service.autograding.kube.standby_worker import (DONE_FILE, JOB_FILE, LOG_FILE,
+                                                            READY_FILE, write_atomic)
+
+if TYPE_CHECKING:
+    from grader_service.autograding.kube.kube_grader import KubeAutogradeExecutor
+
+POOL_LABEL = "grader-service/standby-pool"
+
+
+def pool_id(image: str) -> str:
+    """Identifies the pool of an image in labels and directory names."""
+    return hashlib.sha256(image.encode("utf-8")).hexdigest()[:16]
+
+
+class StandbyPool(SingletonConfigurable):
+    """
+    Pools of idle grader pods per image that run the
+    :mod:`~grader_service.autograding.kube.standby_worker` and wait for a job.
+
+    Every standby pod only mounts its own slot directory and grades a single
+    submission, whose directories the service moves into the slot and back after
+    the pod finished. A job claims an idle pod by atomically creating its claim
+    directory, which is not visible to any pod. The pool of an image is scaled
+    between the minimum and maximum size of the lecture according to the number
+    of waiting jobs, idle pods above the minimum are removed after idle_timeout.
+    """
+
+    python_executable = Unicode("python3", allow_none=False,
+                                help="Python interpreter of the grader images that "
+                                     "runs the standby worker.").tag(config=True)
+
+    idle_timeout = Float(300.0, allow_none=False,
+                         help="Time in seconds after which an idle standby pod is removed "
+                              "if the pool is larger than its minimum size.").tag(config=True)
+
+    poll_interval = Float(0.5, allow_none=False,
+                          help="Time in seconds between checks of the slot directories.").tag(config=True)
+
+    scale_interval = Float(5.0, allow_none=False,
+                           help="Time in seconds between checks of the pool size "
+                                "while a job is waiting.").tag(config=True)
+
+    pod_start_grace = Float(60.0, allow_none=False,
+                            help="Time in seconds after the creation of a slot during which a "
+                                 "missing pod is assumed to be still created.").tag(config=True)
+
+    job_timeout = Float(3600.0, allow_none=False,
+                        help="Maximum time in seconds a job may take from being "
+                             "queued until it is done.").tag(config=True)
+
+    def queue_dir(self, executor: "KubeAutogradeExecutor", image: str) -> str:
+        return os.path.join(executor.grader_service_dir, "standby", pool_id(image))
+
+    def run(self, executor: "KubeAutogradeExecutor", image: str, node_selector: Optional[dict],
+            min_pods: int, max_pods: int) -> Tuple[int, str]:
+        """
+        Runs the grader-convert command of the executor in a standby pod of
+        the image and waits until it finished.
+        :return: The exit code and the logs of the command.
+        """
+        queue_dir = self.queue_dir(executor, image)
+        for d in ("slots", "claims", "waiting"):
+            os.makedirs(os.path.join(queue_dir, d), exist_ok=True)
+        job = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        waiting = os.path.join(queue_dir, "waiting", job)
+        deadline = time.monotonic() + self.job_timeout
+
+        with open(waiting, "w"):
+            pass
+        try:
+            slot = None
+            last_scale = None
+            while slot is None:
+                now = time.monotonic()
+                if now > deadline:
+                    raise RuntimeError(f"Standby pool did not start job {job} in time!")
+                slot = self._claim_idle_slot(queue_dir)
+                if slot is None:
+                    if last_scale is None or now - last_scale >= self.scale_interval:
+                        self._scale(executor, image, node_selector, min_pods, max_pods)
+                        last_scale = now
+                    time.sleep(self.poll_interval)
+        finally:
+            os.remove(waiting)
+
+        self.log.info(f"Running job {job} in standby pod {slot} of pool {pool_id(image)}")
+        try:
+            return self._run_in_slot(executor, queue_dir, slot, deadline)
+        finally:
+            self._remove_slot(executor, queue_dir, slot)
+            # replaces the used pod if the pool is below its minimum
+            self._scale(executor, image, node_selector, min_pods, max_pods)
+
+    def _slot_paths(self, executor: "KubeAutogradeExecutor", slot_dir: str) -> Dict[str, Tuple[str, str]]:
+        """Maps the directories of the submission to their paths in the slot."""
+        paths = {"input_path": (executor.input_path, os.path.join(slot_dir, "in")),
+                 "output_path": (executor.output_path, os.path.join(slot_dir, "out"))}
+        if executor.has_previous_result:
+            paths["previous_output_path"] = (executor.previous_output_path,
+                                             os.path.join(slot_dir, "previous"))
+        return paths
+
+    def _run_in_slot(self, executor: "KubeAutogradeExecutor", queue_dir: str, slot: str,
+                     deadline: float) -> Tuple[int, str]:
+        slot_dir = os.path.join(queue_dir, "slots", slot)
+        paths = self._slot_paths(executor, slot_dir)
+        moved = []
+        try:
+            # the directories only belong to this job, so they are moved into the slot
+            # instead of copied and the pod only sees the files of this submission
+            for path, slot_path in paths.values():
+                shutil.move(path, slot_path)
+                moved.append((path, slot_path))
+            # the pod does not mount the file cache
+            command = executor._get_convert_command(
+                **{name: slot_path for name, (_, slot_path) in paths.items()}, file_cache=False)
+            write_atomic(os.path.join(slot_dir, JOB_FILE), {"command": command})
+
+            done_path = os.path.join(slot_dir, DONE_FILE)
+            while not os.path.exists(done_path):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Standby pod {slot} did not finish in time!")
+                time.sleep(self.poll_interval)
+
+            with open(done_path) as f:
+                returncode = json.load(f)["returncode"]
+            logs = ""
+            log_path = os.path.join(slot_dir, LOG_FILE)
+            if os.path.exists(log_path):
+                with open(log_path) as f:
+                    logs = f.read()
+            return returncode, logs
+        finally:
+            for path, slot_path in moved:
+                shutil.move(slot_path, path)
+
+    def _claim_idle_slot(self, queue_dir: str) -> Optional[str]:
+        """Claims a slot whose pod is ready and returns its name or None."""
+        for slot in sorted(os.listdir(os.path.join(queue_dir, "slots"))):
+            if not os.path.exists(os.path.join(queue_dir, "slots", slot, READY_FILE)):
+                continue
+            if self._claim(queue_dir, slot):
+                return slot
+        return None
+
+    @staticmethod
+    def _claim(queue_dir: str, slot: str) -> bool:
+        try:
+            # atomic, only one job can claim a slot
+            os.mkdir(os.path.join(queue_dir, "claims", slot))
+            return True
+        except FileExistsError:
+            return False
+
+    def _remove_slot(self, executor: "KubeAutogradeExecutor", queue_dir: str, slot: str) -> None:
+        """Deletes the pod of a claimed slot and removes the slot."""
+        try:
+            executor.client.delete_namespaced_pod(name=slot, namespace=executor.namespace)
+        except Exception as e:
+            self.log.debug(f"Could not delete standby pod {slot}: {e}")
+        shutil.rmtree(os.path.join(queue_dir, "slots", slot), ignore_errors=True)
+        try:
+            os.rmdir(os.path.join(queue_dir, "claims", slot))
+        except FileNotFoundError:
+            pass
+
+    def _scale(self, executor: "KubeAutogradeExecutor", image: str,
+               node_selector: Optional[dict], min_pods: int, max_pods: int) -> None:
+        queue_dir = self.queue_dir(executor, image)
+        slots_dir = os.path.join(queue_dir, "slots")
+        claims = set(os.listdir(os.path.join(queue_dir, "claims")))
+        waiting = len(os.listdir(os.path.join(queue_dir, "waiting")))
+
+        labels = dict(executor.pod_labels)
+        labels[POOL_LABEL] = pool_id(image)
+        selector = ",".join(f"{k}={v}" for k, v in labels.items())
+        live = set()
+        for pod in executor.client.list_namespaced_pod(namespace=executor.namespace,
+                                                       label_selector=selector).items:
+            if pod.status.phase in ("Pending", "Running") and pod.metadata.deletion_timestamp is None:
+                live.add(pod.metadata.name)
+            elif pod.metadata.deletion_timestamp is None:
+                executor.client.delete_namespaced_pod(name=pod.metadata.name,
+                                                      namespace=executor.namespace)
+
+        slots = sorted(os.listdir(slots_dir))
+        for name in live.difference(slots):
+            # a pod without a slot would wait forever
+            executor.client.delete_namespaced_pod(name=name, namespace=executor.namespace)
+        idle = []
+        for slot in slots:
+            if slot in claims:
+                continue
+            if slot not in live:
+                try:
+                    created = os.stat(os.path.join(slots_dir, slot)).st_mtime
+                except FileNotFoundError:
+                    continue
+                # the pod of the slot is gone, unless it is just being created
+                if time.time() - created >= self.pod_start_grace and self._claim(queue_dir, slot):
+                    self._remove_slot(executor, queue_dir, slot)
+                continue
+            idle.append(slot)
+        busy = len(claims.intersection(live))
+
+        # idle pods above the minimum that were not used for a while are removed
+        desired = min(max(min_pods, waiting), max(max_pods - busy, 0))
+        now = time.time()
+        for slot in idle[desired:]:
+            ready = os.path.join(slots_dir, slot, READY_FILE)
+            try:
+                idle_since = os.stat(ready).st_mtime
+            except FileNotFoundError:
+                # still starting
+                continue
+            if now - idle_since >= self.idle_timeout and self._claim(queue_dir, slot):
+                self.log.info(f"Removing idle standby pod {slot}")
+                self._remove_slot(executor, queue_dir, slot)
+
+        if desired > len(idle):
+            self.log.info(f"Scaling standby pool {pool_id(image)} from {len(idle)} to {desired} idle pods")
+        for _ in range(desired - len(idle)):
+            slot = f"standby-{pool_id(image)}-{uuid.uuid4().hex[:8]}"
+            slot_dir = os.path.join(slots_dir, slot)
+            os.makedirs(slot_dir)
+            command = [self.python_executable, "-m",
+                       "grader_service.autograding.kube.standby_worker",
+                       "--slot-dir", slot_dir,
+                       "--poll-interval", str(self.poll_interval)]
+            # the pod only sees the slot, not the directories of other submissions
+            volume_mounts = [{"name": "data", "mountPath": slot_dir,
+                              "subPath": os.path.relpath(slot_dir, executor.grader_service_dir)}]
+            executor._create_pod(slot, command, volume_mounts, image, node_selector, labels=labels)
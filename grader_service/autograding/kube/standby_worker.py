@@ -0,0 +1,81 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Worker of the standby grader pods of :class:`~grader_service.autograding.kube.standby.StandbyPool`.
+
+Every standby pod only mounts its own slot directory on the shared volume and
+grades exactly one submission, so no state of a student's job is left in a
+container that grades another submission. The worker creates the file
+``ready`` in the slot and waits for ``job.json``, which the service writes
+after it copied the submission into the slot. It runs the command of the job,
+writes the logs to ``log`` and the exit code to ``done.json`` and exits.
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import time
+import uuid
+from typing import List, Optional
+
+log = logging.getLogger("grader_service.standby_worker")
+
+READY_FILE = "ready"
+JOB_FILE = "job.json"
+DONE_FILE = "done.json"
+LOG_FILE = "log"
+
+
+def write_atomic(path: str, data: dict) -> None:
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class StandbyWorker:
+    def __init__(self, slot_dir: str, poll_interval: float):
+        self.slot_dir = slot_dir
+        self.poll_interval = poll_interval
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.slot_dir, *parts)
+
+    def wait_for_job(self) -> dict:
+        """Announces that the worker is ready and waits for the job of the slot."""
+        with open(self._path(READY_FILE), "w"):
+            pass
+        while not os.path.exists(self._path(JOB_FILE)):
+            time.sleep(self.poll_interval)
+        with open(self._path(JOB_FILE)) as f:
+            return json.load(f)
+
+    def run_job(self, spec: dict) -> int:
+        log.info(f"Running job in slot {self.slot_dir}")
+        with open(self._path(LOG_FILE), "w") as log_file:
+            returncode = subprocess.call(spec["command"], stdout=log_file,
+                                         stderr=subprocess.STDOUT)
+        write_atomic(self._path(DONE_FILE), {"returncode": returncode})
+        return returncode
+
+    def start(self) -> int:
+        return self.run_job(self.wait_for_job())
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Standby grader pod worker")
+    parser.add_argument("--slot-dir", required=True)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    StandbyWorker(args.slot_dir, args.poll_interval).start()
+
+
+if __name__ == "__main__":
+    main()
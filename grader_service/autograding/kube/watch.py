@@ -0,0 +1,193 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+import threading
+from typing import Callable, Dict as TDict, List as TList, Optional, Set, Tuple
+
+from kubernetes import watch
+from kubernetes.client import CoreV1Api, V1Pod
+from traitlets import Float, Integer
+from traitlets.config import LoggingConfigurable
+
+TERMINAL_PHASES = ("Succeeded", "Failed")
+
+
+class PodWatcher(LoggingConfigurable):
+    """
+    Watches all pods matching a label selector in a namespace with a single
+    watch connection and dispatches terminal pod phases to waiting executors.
+    While the watch is disconnected, :meth:`wait` and :meth:`wait_async`
+    return early so callers can fall back to polling the pod status.
+    """
+
+    watch_timeout = Integer(300, allow_none=False,
+                            help="Server side timeout in seconds of a single watch request, "
+                                 "after which the watch is restarted.").tag(config=True)
+
+    reconnect_interval = Float(1.0, allow_none=False,
+                               help="Time in seconds to wait before the watch "
+                                    "is restarted after an error.").tag(config=True)
+
+    def __init__(self, api: CoreV1Api, namespace: str, label_selector: str, **kwargs):
+        super().__init__(**kwargs)
+        self._client = api
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self._cond = threading.Condition()
+        self._phases: TDict[str, str] = {}
+        self._waiting: Set[str] = set()
+        # called with the terminal phase or None when the watch disconnects, see wait_async
+        self._callbacks: TDict[str, TList[Callable[[Optional[str]], None]]] = {}
+        self._connected = False
+        self._stopped = False
+        self._watch: Optional[watch.Watch] = None
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"pod-watch-{namespace}")
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def start(self) -> "PodWatcher":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._connected = False
+            self._notify_all()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def wait(self, name: str, timeout: float) -> Optional[str]:
+        """
+        Blocks until the pod reached a terminal phase, the timeout expired
+        or the watch is disconnected.
+        :param name: The name of the pod.
+        :param timeout: The maximum time to wait in seconds.
+        :return: The terminal phase or None if it is not (yet) known.
+        """
+        with self._cond:
+            self._waiting.add(name)
+            self._cond.wait_for(
+                lambda: self._phases.get(name) in TERMINAL_PHASES or not self._connected,
+                timeout=timeout,
+            )
+            phase = self._phases.get(name)
+        return phase if phase in TERMINAL_PHASES else None
+
+    async def wait_async(self, name: str, timeout: float) -> Optional[str]:
+        """
+        Like :meth:`wait`, but waits on the running event loop without blocking a thread.
+        :param name: The name of the pod.
+        :param timeout: The maximum time to wait in seconds.
+        :return: The terminal phase or None if it is not (yet) known.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(phase: Optional[str]) -> None:
+            # called by the watch thread with the lock held
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(phase))
+
+        with self._cond:
+            self._waiting.add(name)
+            phase = self._phases.get(name)
+            if phase in TERMINAL_PHASES or not self._connected:
+                return phase if phase in TERMINAL_PHASES else None
+            self._callbacks.setdefault(name, []).append(resolve)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._cond:
+                callbacks = self._callbacks.get(name, [])
+                if resolve in callbacks:
+                    callbacks.remove(resolve)
+                if not callbacks:
+                    self._callbacks.pop(name, None)
+
+    def _notify_all(self) -> None:
+        """Wakes up the waiters of pods that finished or of all pods if the watch disconnected."""
+        self._cond.notify_all()
+        for name in list(self._callbacks):
+            phase = self._phases.get(name)
+            if phase in TERMINAL_PHASES or not self._connected:
+                for callback in self._callbacks.pop(name):
+                    callback(phase if phase in TERMINAL_PHASES else None)
+
+    def forget(self, name: str) -> None:
+        """Removes the state of a pod that is no longer waited for."""
+        with self._cond:
+            self._waiting.discard(name)
+            self._phases.pop(name, None)
+
+    def _update(self, event_type: str, pod: V1Pod) -> None:
+        name = pod.metadata.name
+        with self._cond:
+            if event_type == "DELETED":
+                # keep the phase until the waiter saw it
+                if name not in self._waiting:
+                    self._phases.pop(name, None)
+            elif pod.status is not None and pod.status.phase is not None:
+                self._phases[name] = pod.status.phase
+            self._notify_all()
+
+    def _list(self) -> str:
+        pods = self._client.list_namespaced_pod(namespace=self.namespace,
+                                                label_selector=self.label_selector)
+        with self._cond:
+            # drop pods that were deleted while the watch was disconnected
+            phases = {name: self._phases[name] for name in self._waiting if name in self._phases}
+            for pod in pods.items:
+                if pod.status is not None and pod.status.phase is not None:
+                    phases[pod.metadata.name] = pod.status.phase
+            self._phases = phases
+            self._connected = True
+            self._notify_all()
+        return pods.metadata.resource_version
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                resource_version = self._list()
+                self._watch = watch.Watch()
+                for event in self._watch.stream(self._client.list_namespaced_pod,
+                                                namespace=self.namespace,
+                                                label_selector=self.label_selector,
+                                                resource_version=resource_version,
+                                                timeout_seconds=self.watch_timeout):
+                    if event["type"] == "ERROR":
+                        # e.g. 410 Gone if the resource version is too old, re-list
+                        break
+                    self._update(event["type"], event["object"])
+            except Exception:
+                self.log.warning(f"Pod watch in namespace {self.namespace} failed, "
+                                 f"falling back to polling", exc_info=True)
+                with self._cond:
+                    self._connected = False
+                    self._notify_all()
+                    self._cond.wait_for(lambda: self._stopped, timeout=self.reconnect_interval)
+
+
+_watchers: TDict[Tuple[str, str], PodWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def get_pod_watcher(api: CoreV1Api, namespace: str, label_selector: str, **kwargs) -> PodWatcher:
+    """
+    Returns the watcher shared by all executors of the process
+    for the namespace and label selector and starts it if necessary.
+    """
+    key = (namespace, label_selector)
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None:
+            watcher = _watchers[key] = PodWatcher(api, namespace, label_selector, **kwargs).start()
+        return watcher
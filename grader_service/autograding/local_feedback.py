@@ -7,23 +7,30 @@
 import io
 import logging
 import os
+import shlex
 import shutil
 from subprocess import CalledProcessError
+from typing import Optional, Tuple
 
 from traitlets import Unicode
 
+from grader_service.autograding.log_buffer import LogBuffer
 from grader_service.autograding.local_grader import (LocalAutogradeExecutor,
                                                      rm_error)
-from grader_service.orm.assignment import Assignment
-from grader_service.orm.group import Group
-from grader_service.orm.lecture import Lecture
 from grader_service.orm.submission import Submission
 from grader_service.convert.converters.generate_feedback import GenerateFeedback
 
 
 class GenerateFeedbackExecutor(LocalAutogradeExecutor):
     def __init__(self, grader_service_dir: str,
-                 submission: Submission, **kwargs):
+                 submission: Submission, source_path: Optional[str] = None, **kwargs):
+        """
+        Creates the feedback executor.
+        :param source_path: The output directory of the autograding job of the
+        submission, see LocalAutogradeExecutor._generate_feedback. The autograding
+        result is pulled from the autograde repository if None.
+        """
+        self.source_path = source_path
         super().__init__(grader_service_dir, submission, **kwargs)
 
     @property
@@ -36,54 +43,42 @@ class GenerateFeedbackExecutor(LocalAutogradeExecutor):
         return os.path.join(self.grader_service_dir, self.relative_output_path,
                             f"feedback_{self.submission.id}")
 
-    def _pull_submission(self):
-        if not os.path.exists(self.input_path):
-            os.mkdir(self.input_path)
+    def _get_submission_source(self) -> Tuple[str, str, Optional[str]]:
+        git_repo_path = self._get_result_repo_path("autograde")
+        return git_repo_path, f"submission_{self.submission.commit_hash}", None
 
-        assignment: Assignment = self.submission.assignment
-        lecture: Lecture = assignment.lecture
+    def _pull_previous_result(self):
+        # feedback is always generated for all notebooks
+        pass
 
-        if assignment.type == "user":
-            repo_name = self.submission.username
-        else:
-            group = self.session.query(Group).get(
-                (self.submission.username, lecture.id)
-            )
-            if group is None:
-                raise ValueError()
-            repo_name = group.name
-
-        git_repo_path = os.path.join(
-            self.grader_service_dir,
-            "git",
-            lecture.code,
-            str(assignment.id),
-            "autograde",
-            assignment.type,
-            repo_name,
-        )
+    def _pull_submission(self):
+        if self.source_path is not None:
+            self._link_source()
+            return
+        super()._pull_submission()
 
+    def _link_source(self):
+        """
+        Fills the input directory with hardlinks to the published autograding
+        output, without the repository a result publisher may have created in it.
+        :return: None
+        """
+        self.log.info(f"Generating feedback from autograding output {self.source_path}")
         if os.path.exists(self.input_path):
             shutil.rmtree(self.input_path, onerror=rm_error)
-        os.mkdir(self.input_path)
 
-        self.log.info(f"Pulling repo {git_repo_path} into input directory")
+        def link(src, dst, *, follow_symlinks=True):
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
 
-        command = f"{self.git_executable} init"
-        self.log.info(f"Running {command}")
-        try:
-            self._run_subprocess(command, self.input_path)
-        except CalledProcessError:
-            pass
+        shutil.copytree(self.source_path, self.input_path, copy_function=link,
+                        ignore=shutil.ignore_patterns(".git"))
 
-        command = f'{self.git_executable} pull "{git_repo_path}" ' \
-                  f'submission_{self.submission.commit_hash}'
-        self.log.info(f"Running {command}")
-        try:
-            self._run_subprocess(command, self.input_path)
-        except CalledProcessError:
-            pass
-        self.log.info("Successfully cloned repo")
+    def _get_result_cache_key(self) -> Optional[str]:
+        # feedback is generated from the autograding results, which are not cached
+        return None
 
     def _run(self):
         if os.path.exists(self.output_path):
@@ -93,7 +88,7 @@ class GenerateFeedbackExecutor(LocalAutogradeExecutor):
         self._write_gradebook(self.submission.properties.properties)
 
         autograder = GenerateFeedback(self.input_path, self.output_path,
-                                      "**/*.ipynb", copy_files=False)
+                                      "**/*.ipynb", copy_files=False, config=self._get_file_cache_config())
         autograder.force = True
 
         log_stream = io.StringIO()
@@ -105,31 +100,14 @@ class GenerateFeedbackExecutor(LocalAutogradeExecutor):
         self.grading_logs = log_stream.getvalue()
         autograder.log.removeHandler(log_handler)
 
+    def _make_log_buffer(self) -> LogBuffer:
+        # the logs of the submission are the autograding logs
+        return LogBuffer(config=self.config)
+
     def _push_results(self):
         os.unlink(os.path.join(self.output_path, "gradebook.json"))
 
-        assignment: Assignment = self.submission.assignment
-        lecture: Lecture = assignment.lecture
-
-        if assignment.type == "user":
-            repo_name = self.submission.username
-        else:
-            group = self.session.query(Group).get(
-                (self.submission.username, lecture.id)
-            )
-            if group is None:
-                raise ValueError()
-            repo_name = group.name
-
-        git_repo_path = os.path.join(
-            self.grader_service_dir,
-            "git",
-            lecture.code,
-            str(assignment.id),
-            "feedback",
-            assignment.type,
-            repo_name,
-        )
+        git_repo_path = self._get_result_repo_path("feedback")
 
         if not os.path.exists(git_repo_path):
             os.makedirs(git_repo_path, exist_ok=True)
@@ -140,47 +118,16 @@ class GenerateFeedbackExecutor(LocalAutogradeExecutor):
             except CalledProcessError:
                 raise
 
-        command = f"{self.git_executable} init"
-        self.log.info(f"Running {command} at {self.output_path}")
-        try:
-            self._run_subprocess(command, self.output_path)
-        except CalledProcessError:
-            pass
-
-        self.log.info(f"Creating new branch "
-                      f"feedback_{self.submission.commit_hash}")
-        command = (
-            f"{self.git_executable} switch -c "
-            f"feedback_{self.submission.commit_hash}"
-        )
-        try:
-            self._run_subprocess(command, self.output_path)
-        except CalledProcessError:
-            pass
-        self.log.info(f"Now at branch "
-                      f"feedback_{self.submission.commit_hash}")
-
-        self.log.info(f"Commiting all files in {self.output_path}")
-        self._run_subprocess(
-            f"{self.git_executable} add -A", self.output_path
-        )
-        self._run_subprocess(
-            f'{self.git_executable} commit -m "{self.submission.commit_hash}"',
-            self.output_path,
-        )
-        self.log.info(
-            f"Pushing to {git_repo_path} at branch "
-            f"feedback_{self.submission.commit_hash}"
-        )
-        command = f'{self.git_executable} push -uf "{git_repo_path}" ' \
-                  f'feedback_{self.submission.commit_hash}'
-        self._run_subprocess(command, self.output_path)
-        self.log.info("Pushing complete")
+        self._publish(git_repo_path, f"feedback_{self.submission.commit_hash}")
 
     def _set_properties(self):
         # No need to set properties
         pass
 
+    def _store_metrics(self, total_time: float):
+        # the metrics of the submission are the autograding metrics
+        pass
+
     def _set_db_state(self, success=True):
         """"
         Sets the submission feedback status based on the success of the generation.
@@ -207,9 +154,10 @@ class GenerateFeedbackProcessExecutor(GenerateFeedbackExecutor):
 
         command = f'{self.convert_executable} generate_feedback -i ' \
                   f'"{self.input_path}" -o "{self.output_path}" -p "**/*.ipynb"'
+        for arg in self._get_file_cache_args():
+            command += f' {shlex.quote(arg)}'
         self.log.info(f"Running {command}")
-        process = self._run_subprocess(command, None)
-        self.grading_logs = process.stderr.read().decode("utf-8")
+        process = self._run_logged_subprocess(command)
         self.log.info(self.grading_logs)
         if process.returncode == 0:
             self.log.info("Process has successfully completed execution!")
@@ -4,22 +4,32 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
-import io
 import json
-import logging
 import os
 import shlex
 import shutil
 import stat
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from subprocess import Popen, PIPE, CalledProcessError
-from typing import Optional
+from subprocess import Popen, PIPE, STDOUT, CalledProcessError
+from typing import Callable as TCallable, Dict, List, Optional, Tuple, Type as TType
 
 from traitlets.config import Config
 
+from grader_service.autograding.cache import AutogradeResultCache
+from grader_service.autograding.log_buffer import LogBuffer
+from grader_service.autograding.materialize import (GitPullMaterializer,
+                                                    SubmissionMaterializer)
+from grader_service.autograding.publish import GitPushPublisher, ResultPublisher
+from grader_service.autograding.timeouts import AdaptiveTimeoutPolicy
 from grader_service.convert.converters.autograde import Autograde
+from grader_service.convert.filecache import FileCache
+from grader_service.convert.kernelpool import KernelPool
 from grader_service.convert.gradebook.models import GradeBookModel
 from grader_service.orm.assignment import Assignment
 from grader_service.orm.group import Group
@@ -28,11 +38,15 @@ from grader_service.orm.submission import Submission
 from sqlalchemy.orm import Session
 from traitlets.config.configurable import LoggingConfigurable
 
-from traitlets.traitlets import TraitError, Unicode, validate, Callable
+from traitlets.traitlets import TraitError, Unicode, validate, Callable, Bool, Type
 
 from grader_service.orm.submission_logs import SubmissionLogs
+from grader_service.orm.submission_metrics import PHASES, SubmissionMetrics
 from grader_service.orm.submission_properties import SubmissionProperties
 
+# ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
 
 def rm_error(func, path, exc_info):
     if not os.access(path, os.W_OK):
@@ -54,6 +68,10 @@ def default_timeout_func(l: Lecture) -> int:
     return 360
 
 
+def default_notebook_workers_func(l: Lecture) -> int:
+    return 1
+
+
 class LocalAutogradeExecutor(LoggingConfigurable):
     """
     Runs an autograde job on the local machine
@@ -71,8 +89,61 @@ class LocalAutogradeExecutor(LoggingConfigurable):
                             help="Function that takes a lecture as an argument and returns the cell timeout in seconds."
                             ).tag(config=True)
 
+    notebook_workers_func = Callable(default_notebook_workers_func, allow_none=False,
+                                     help="Function that takes a lecture as an argument and returns the number of "
+                                          "notebooks of a submission that are autograded concurrently."
+                                     ).tag(config=True)
+
+    use_kernel_pool = Bool(False, allow_none=False,
+                           help="Whether notebooks are executed in kernels leased from a per-worker "
+                                "KernelPool that is keyed by the lecture code instead of cold-starting "
+                                "a kernel for every notebook. Kernels of the lectures in "
+                                "KernelPool.prestart_keys are started when the worker starts."
+                           ).tag(config=True)
+
+    submission_materializer_class = Type(GitPullMaterializer, klass=SubmissionMaterializer,
+                                         help="The strategy that places the files of a submission "
+                                              "into the input directory. GitArchiveMaterializer only "
+                                              "extracts the tree of the submitted commit without "
+                                              "copying the history of the repository.").tag(config=True)
+
+    result_publisher_class = Type(GitPushPublisher, klass=ResultPublisher,
+                                  help="The strategy that publishes the output directory as a branch "
+                                       "of the autograde or feedback repository. GitPlumbingPublisher "
+                                       "writes the objects directly into the bare repository and "
+                                       "updates the branch atomically.").tag(config=True)
+
+    use_result_cache = Bool(False, allow_none=False,
+                            help="Whether results are stored in and restored from the AutogradeResultCache. "
+                                 "Submissions with the same tree, gradebook, environment and timeout "
+                                 "are then only executed once.").tag(config=True)
+
+    incremental_regrade = Bool(False, allow_none=False,
+                               help="Whether notebooks that did not change since the previous automatically "
+                                    "graded submission of the student are copied forward from its results "
+                                    "instead of being executed again.").tag(config=True)
+
+    use_adaptive_timeouts = Bool(False, allow_none=False,
+                                 help="Whether the timeouts of grade cells are derived from their execution "
+                                      "times in previous autograding runs of the assignment by the "
+                                      "AdaptiveTimeoutPolicy instead of using timeout_func for all cells."
+                                 ).tag(config=True)
+
+    record_kernel_memory = Bool(False, allow_none=False,
+                                help="Whether the peak memory of the kernel is stored in the gradebook "
+                                     "for every grade cell in addition to its execution time.").tag(config=True)
+
+    skip_unchanged_solutions = Bool(False, allow_none=False,
+                                    help="Whether notebooks in which no solution cell was changed are graded "
+                                         "without executing them, see Autograde.skip_unchanged_solutions."
+                                    ).tag(config=True)
+
+    bypass_cache = Bool(False, allow_none=False,
+                        help="Ignore cached results for this job and replace them with the new result.")
+
     def __init__(self, grader_service_dir: str,
-                 submission: Submission, close_session=True, **kwargs):
+                 submission: Submission, close_session=True,
+                 feedback_executor_class: Optional[TType["LocalAutogradeExecutor"]] = None, **kwargs):
         """
         Creates the executor in the input
         and output directories that are specified
@@ -89,6 +160,8 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         :param submission: The submission object
         which should be graded by the executor.
         :type submission: Submission
+        :param feedback_executor_class: If given, the feedback is generated
+        from the output directory after autograding in the same job.
         """
         super(LocalAutogradeExecutor, self).__init__(**kwargs)
         self.grader_service_dir = grader_service_dir
@@ -102,6 +175,21 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         self.autograding_finished: Optional[datetime] = None
         self.autograding_status: Optional[str] = None
         self.grading_logs: Optional[str] = None
+        # number of characters dropped from the beginning of the grading logs
+        self.grading_logs_offset = 0
+        self._result_cache_key: Optional[str] = None
+        self.has_previous_result = False
+        # durations of the phases of the job in seconds, see SubmissionMetrics
+        self.phase_times: Dict[str, float] = {}
+        self._phase_stack: List[float] = []
+        self.cpu_time: Optional[float] = None
+        self.peak_rss: Optional[int] = None
+        # why the job failed, e.g. "memory_limit_exceeded", None if it succeeded
+        self.failure_reason: Optional[str] = None
+        self._cell_timeouts: Optional[Dict[str, float]] = None
+        # git blob ids of the large files of the submission by their path in the input directory
+        self._content_ids: Dict[str, str] = {}
+        self.feedback_executor_class = feedback_executor_class
 
     def start(self):
         """
@@ -111,29 +199,145 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         """
         self.log.info(f"Starting autograding job for submission "
                       f"{self.submission.id} in {self.__class__.__name__}")
+        start = time.perf_counter()
         try:
-            self._pull_submission()
-            self.autograding_start = datetime.now()
-            self._run()
-            self.autograding_finished = datetime.now()
-            self._set_properties()
-            self._push_results()
-            self._set_db_state()
+            if not self._restore_cached_result():
+                with self._timed("pull"):
+                    self._pull_submission()
+                self.autograding_start = datetime.now()
+                with self._timed("execute"):
+                    self._run_measured()
+                self.autograding_finished = datetime.now()
+                self._store_result()
+            with self._timed("set_properties"):
+                self._set_properties()
+            with self._timed("push"):
+                self._push_results()
+            with self._timed("db"):
+                self._set_db_state()
             ts = round((self.autograding_finished - self.autograding_start)
                        .total_seconds())
             self.log.info(
                 f"Successfully completed autograding job for submission "
                 f"{self.submission.id} in {self.__class__.__name__};"
                 + f" took {ts // 60}min {ts % 60}s")
-        except Exception:
+        except Exception as e:
             self.log.error(
                 f"Failed autograding job for submission "
                 f"{self.submission.id} in {self.__class__.__name__}",
                 exc_info=True)
-            self._set_db_state(success=False)
+            self.failure_reason = getattr(e, "failure_reason", "grading_error")
+            with self._timed("db"):
+                self._set_db_state(success=False)
         finally:
+            self._store_metrics(time.perf_counter() - start)
+            if self.feedback_executor_class is not None:
+                self._generate_feedback()
             self._cleanup()
 
+    def _generate_feedback(self):
+        """
+        Generates the feedback of the submission from the output directory, which
+        still contains the published autograding result, instead of pulling the
+        result from the autograde repository in a separate feedback task.
+        The feedback is published after the autograding result, in the same task.
+        :return: None
+        """
+        try:
+            if self.submission.auto_status != "automatically_graded":
+                self.log.info(f"Not generating feedback for submission {self.submission.id} "
+                              f"with status {self.submission.auto_status}")
+                self.submission.feedback_status = "generation_failed"
+                self.session.commit()
+                return
+            executor = self.feedback_executor_class(
+                self.grader_service_dir, self.submission, close_session=False,
+                source_path=self.output_path, config=self.config)
+            executor.start()
+        except Exception:
+            self.log.error(f"Failed to generate feedback for submission {self.submission.id}",
+                           exc_info=True)
+
+    @contextmanager
+    def _timed(self, phase: str):
+        """Adds the duration of the block to the phase, excluding the nested phases."""
+        self._phase_stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._phase_stack.pop()
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + elapsed - nested
+            if self._phase_stack:
+                self._phase_stack[-1] += elapsed
+
+    def _run_measured(self):
+        """
+        Runs the grading. Executors that run the job in a process of its own record
+        its CPU time and peak resident set size while it runs, see :meth:`_wait_measured`.
+        Jobs that run in the worker process, e.g. with pooled kernels, share their
+        resource usage with other jobs, so cpu_time and peak_rss stay None.
+        """
+        self.cpu_time = None
+        self.peak_rss = None
+        self._run()
+
+    def _wait_measured(self, process: Popen) -> None:
+        """
+        Waits for a grading subprocess and records its resource usage, which includes
+        the descendants it waited for (e.g. its kernels), but no other job of the worker.
+        :param process: The grading subprocess.
+        :return: None
+        """
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # already reaped, the usage of the job is unknown
+            process.wait()
+            return
+        process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        self.cpu_time = usage.ru_utime + usage.ru_stime
+        self.peak_rss = usage.ru_maxrss * _RSS_UNIT
+
+    def _get_output_bytes(self) -> Optional[int]:
+        if not os.path.isdir(self.output_path):
+            return None
+        size = 0
+        for root, _, files in os.walk(self.output_path):
+            for file in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass
+        return size
+
+    def _store_metrics(self, total_time: float):
+        """
+        Stores the durations of the phases and the resource usage of the job
+        as the metrics of the submission. Failures are only logged.
+        :param total_time: The duration of the whole job in seconds.
+        :return: None
+        """
+        self.log.info(f"Phases of autograding job for submission {self.submission.id}: "
+                      + ", ".join(f"{phase} {t:.2f}s" for phase, t in self.phase_times.items()))
+        try:
+            metrics = SubmissionMetrics(
+                sub_id=self.submission.id,
+                total_time=total_time,
+                cpu_time=self.cpu_time,
+                peak_rss=self.peak_rss,
+                output_bytes=self._get_output_bytes(),
+                failure_reason=self.failure_reason,
+                recorded_at=datetime.utcnow(),
+                **{f"{phase}_time": self.phase_times.get(phase) for phase in PHASES}
+            )
+            self.session.merge(metrics)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            self.log.warning(f"Could not store metrics of submission {self.submission.id}", exc_info=True)
+
     @property
     def input_path(self):
         return os.path.join(self.grader_service_dir, self.relative_input_path,
@@ -144,6 +348,123 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         return os.path.join(self.grader_service_dir, self.relative_output_path,
                             f"submission_{self.submission.id}")
 
+    def _get_result_cache_key(self) -> Optional[str]:
+        """
+        Computes the key of the autograding result in the
+        :class:`~grader_service.autograding.cache.AutogradeResultCache`
+        from the tree of the submitted commit, the gradebook passed to the
+        autograder, the execution environment and the grading parameters.
+        :return: The cache key or None if the result should not be cached.
+        """
+        if not self.use_result_cache:
+            return None
+        git_repo_path, ref, commit = self._get_submission_source()
+        try:
+            tree = subprocess.run(
+                [self.git_executable, "rev-parse", f"{commit or ref}^{{tree}}"],
+                cwd=git_repo_path, stdout=PIPE, stderr=PIPE, text=True, check=True
+            ).stdout.strip()
+        except CalledProcessError as e:
+            self.log.warning(f"Could not resolve tree of submission {self.submission.id}, "
+                             f"not using the result cache: {e.stderr}")
+            return None
+        return AutogradeResultCache.make_key(
+            tree,
+            self._put_grades_in_assignment_properties(),
+            self.__class__.__name__,
+            self._get_environment_key(),
+            self.timeout_func(self.assignment.lecture),
+            self.assignment.allow_files,
+            self.skip_unchanged_solutions,
+            self.record_kernel_memory,
+            json.dumps(self._get_cell_timeouts(), sort_keys=True),
+        )
+
+    def _get_cell_timeouts(self) -> Dict[str, float]:
+        """
+        Returns the adaptive timeouts of the grade cells by "<notebook id>/<grade id>"
+        if use_adaptive_timeouts is enabled, see Execute.cell_timeouts.
+        """
+        if not self.use_adaptive_timeouts:
+            return {}
+        if self._cell_timeouts is None:
+            policy = AdaptiveTimeoutPolicy(config=self.config)
+            self._cell_timeouts = policy.cell_timeouts(self.session, self.assignment.id,
+                                                       self.timeout_func(self.assignment.lecture))
+            self.log.info(f"Using adaptive timeouts for {len(self._cell_timeouts)} cells")
+        return self._cell_timeouts
+
+    def _get_cell_timeouts_args(self) -> List[str]:
+        """Returns the command line arguments of grader-convert that set the adaptive timeouts."""
+        return [f"--Execute.cell_timeouts={key}={timeout}" for key, timeout in self._get_cell_timeouts().items()]
+
+    def _get_file_cache_config(self) -> Config:
+        """
+        Returns the FileCache section of the service configuration, which
+        configures the data file cache of the converters on this worker.
+        """
+        c = Config()
+        c.FileCache = Config(self.config.get("FileCache", {}))
+        if self._content_ids:
+            c.FileCache.content_ids = dict(self._content_ids)
+        return c
+
+    def _get_file_cache_args(self) -> List[str]:
+        """Returns the command line arguments of grader-convert that configure the file cache."""
+        args = []
+        for name, value in self._get_file_cache_config().FileCache.items():
+            if isinstance(value, dict):
+                # paths with '=' cannot be passed and are hashed instead
+                args.extend(f"--FileCache.{name}={k}={v}" for k, v in value.items() if "=" not in k)
+            else:
+                args.append(f"--FileCache.{name}={value}")
+        return args
+
+    def _get_environment_key(self) -> str:
+        """
+        Identifies the environment the notebooks are executed in
+        as part of the result cache key.
+        :return: The path of the current Python interpreter.
+        """
+        return sys.executable
+
+    def _restore_cached_result(self) -> bool:
+        """
+        Restores the output directory and logs of a previous
+        autograding job with the same cache key, unless the
+        cache is disabled or bypassed for this job.
+        :return: Whether a cached result was restored.
+        """
+        self._result_cache_key = self._get_result_cache_key()
+        if self._result_cache_key is None or self.bypass_cache:
+            return False
+        cache = AutogradeResultCache(self.grader_service_dir, parent=self)
+        self.autograding_start = datetime.now()
+        logs = cache.get(self._result_cache_key, self.output_path)
+        if logs is None:
+            return False
+        self.grading_logs = logs
+        self.autograding_finished = datetime.now()
+        self.log.info(f"Using cached autograding result for submission {self.submission.id}")
+        return True
+
+    def _store_result(self):
+        """
+        Stores the output directory and logs in the result cache.
+        A bypassed cache entry is replaced by the new result.
+        :return: None
+        """
+        if self._result_cache_key is None:
+            return
+        cache = AutogradeResultCache(self.grader_service_dir, parent=self)
+        cache.put(self._result_cache_key, self.output_path, self.grading_logs,
+                  replace=self.bypass_cache)
+
+    @property
+    def previous_output_path(self):
+        return os.path.join(self.grader_service_dir, self.relative_input_path,
+                            f"previous_{self.submission.id}")
+
     def _write_gradebook(self, gradebook_str: str):
         """
         Writes the gradebook to the output directory where it will be used by
@@ -152,36 +473,58 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         :param gradebook_str: The content of the gradebook.
         :return: None
         """
-        if not os.path.exists(self.output_path):
-            os.mkdir(self.output_path)
-        path = os.path.join(self.output_path, "gradebook.json")
-        self.log.info(f"Writing gradebook to {path}")
-        with open(path, "w") as f:
-            f.write(gradebook_str)
+        with self._timed("gradebook"):
+            if not os.path.exists(self.output_path):
+                os.mkdir(self.output_path)
+            path = os.path.join(self.output_path, "gradebook.json")
+            self.log.info(f"Writing gradebook to {path}")
+            with open(path, "w") as f:
+                f.write(gradebook_str)
+
+    def _get_repo_name(self) -> str:
+        """
+        Returns the name of the repository of the student
+        or group that created the submission.
+        :return: str
+        """
+        assignment: Assignment = self.submission.assignment
+        if assignment.type == "user":
+            return self.submission.username
+        # TODO: fix query to work with group.name
+        group = self.session.query(Group).get(
+            (self.submission.username, assignment.lecture.id)
+        )
+        if group is None:
+            raise ValueError()
+        return group.name
 
-    def _pull_submission(self):
+    def _get_result_repo_path(self, repo_type: str) -> str:
         """
-        Pulls the submission repository into the input path
-        based on the assignment type.
-        :return: Coroutine
+        Returns the path of the bare repository the results are published to.
+        :param repo_type: Either "autograde" or "feedback".
+        :return: str
         """
-        if not os.path.exists(self.input_path):
-            Path(self.input_path).mkdir(parents=True, exist_ok=True)
+        assignment: Assignment = self.submission.assignment
+        return os.path.join(
+            self.grader_service_dir,
+            "git",
+            assignment.lecture.code,
+            str(assignment.id),
+            repo_type,
+            assignment.type,
+            self._get_repo_name(),
+        )
 
+    def _get_submission_source(self) -> Tuple[str, str, Optional[str]]:
+        """
+        Determines the bare repository and revision of the submission
+        based on the assignment type.
+        :return: The path of the repository, the branch and the commit
+        or None if the head of the branch should be used.
+        """
         assignment: Assignment = self.submission.assignment
         lecture: Lecture = assignment.lecture
 
-        if assignment.type == "user":
-            repo_name = self.submission.username
-        else:
-            # TODO: fix query to work with group.name
-            group = self.session.query(Group).get(
-                (self.submission.username, lecture.id)
-            )
-            if group is None:
-                raise ValueError()
-            repo_name = group.name
-
         if self.submission.edited:
             git_repo_path = os.path.join(
                 self.grader_service_dir,
@@ -198,31 +541,107 @@ class LocalAutogradeExecutor(LoggingConfigurable):
                 lecture.code,
                 str(assignment.id),
                 assignment.type,
-                repo_name,
+                self._get_repo_name(),
             )
+        # Use the commit of the submission except when it was manually edited
+        commit = None if self.submission.edited else self.submission.commit_hash
+        return git_repo_path, "main", commit
+
+    def _pull_submission(self):
+        """
+        Pulls the submission repository into the input path
+        based on the assignment type.
+        :return: Coroutine
+        """
+        git_repo_path, ref, commit = self._get_submission_source()
 
         if os.path.exists(self.input_path):
             shutil.rmtree(self.input_path, onerror=rm_error)
-        os.mkdir(self.input_path)
-
-        self.log.info(f"Pulling repo {git_repo_path} into input directory")
+        Path(self.input_path).mkdir(parents=True, exist_ok=True)
 
-        command = f"{self.git_executable} init"
-        self.log.info(f"Running {command}")
-        self._run_subprocess(command, self.input_path)
+        self._materialize(git_repo_path, ref, commit)
+        if self.incremental_regrade:
+            self._pull_previous_result()
 
-        command = f'{self.git_executable} pull "{git_repo_path}" main'
-        self.log.info(f"Running {command}")
-        self._run_subprocess(command, self.input_path)
-        self.log.info("Successfully cloned repo")
+    def _pull_previous_result(self):
+        """
+        Places the autograded files and the properties of the previous
+        automatically graded submission of the student into the previous output path,
+        so unchanged notebooks can be copied forward by :class:`Autograde`.
+        :return: None
+        """
+        self.has_previous_result = False
+        if os.path.exists(self.previous_output_path):
+            shutil.rmtree(self.previous_output_path, onerror=rm_error)
+
+        previous: Optional[Submission] = (
+            self.session.query(Submission)
+            .filter(Submission.assignid == self.assignment.id,
+                    Submission.username == self.submission.username,
+                    Submission.id != self.submission.id,
+                    Submission.edited == False,  # noqa: E712
+                    Submission.auto_status == "automatically_graded",
+                    Submission.date <= self.submission.date)
+            .order_by(Submission.date.desc())
+            .first()
+        )
+        if previous is None or previous.properties is None:
+            self.log.info("No previous result found, grading all notebooks")
+            return
 
-        # Checkout to commit of submission except when it was manually edited
-        if not self.submission.edited:
-            command = f"{self.git_executable} checkout " \
-                      f"{self.submission.commit_hash}"
-            self.log.info(f"Running {command}")
-            self._run_subprocess(command, self.input_path)
-            self.log.info(f"Now at commit {self.submission.commit_hash}")
+        os.mkdir(self.previous_output_path)
+        materializer = self.submission_materializer_class(
+            git_executable=self.git_executable, parent=self)
+        try:
+            materializer.materialize(self._get_result_repo_path("autograde"),
+                                     f"submission_{previous.commit_hash}", None,
+                                     self.previous_output_path)
+        except CalledProcessError:
+            self.log.warning(f"Could not materialize the result of submission {previous.id}, "
+                             f"grading all notebooks", exc_info=True)
+            return
+        with open(os.path.join(self.previous_output_path, "gradebook.json"), "w") as f:
+            f.write(previous.properties.properties)
+        self.has_previous_result = True
+        self.log.info(f"Using result of submission {previous.id} for incremental regrade")
+
+    def _materialize(self, git_repo_path: str, ref: str, commit: Optional[str]):
+        """
+        Places the files of the commit (or of the head of ``ref``)
+        into the input path with the configured submission materializer.
+        :param git_repo_path: Path of the bare repository.
+        :param ref: The branch containing the commit.
+        :param commit: The commit hash or None.
+        :return: None
+        """
+        materializer = self.submission_materializer_class(
+            git_executable=self.git_executable, parent=self)
+        self.log.info(f"Materializing repo {git_repo_path} into input directory "
+                      f"with {materializer.__class__.__name__}")
+        try:
+            materializer.materialize(git_repo_path, ref, commit, self.input_path)
+        except CalledProcessError as e:
+            self.grading_logs = e.stderr
+            raise
+        self.log.info("Successfully materialized repo")
+        self._content_ids = self._get_content_ids(materializer, git_repo_path, ref, commit)
+
+    def _get_content_ids(self, materializer: SubmissionMaterializer, git_repo_path: str,
+                         ref: str, commit: Optional[str]) -> Dict[str, str]:
+        """
+        Returns the git blob ids of the files the file cache would store, so the
+        cache only hashes the content of a data file the first time it is seen.
+        :return: The blob ids by the absolute paths of the files in the input path.
+        """
+        file_cache = FileCache(config=self._get_file_cache_config())
+        if not file_cache.enabled:
+            return {}
+        try:
+            blob_ids = materializer.blob_ids(git_repo_path, ref, commit, file_cache.min_file_size)
+        except CalledProcessError as e:
+            self.log.warning(f"Could not list the blob ids of the submission: {e.stderr}")
+            return {}
+        return {os.path.join(self.input_path, path): blob_id for path, blob_id in blob_ids.items()}
 
     def _run(self):
         """
@@ -238,21 +657,59 @@ class LocalAutogradeExecutor(LoggingConfigurable):
 
         c = Config()
         c.ExecutePreprocessor.timeout = self.timeout_func(self.assignment.lecture)
+        c.Autograde.notebook_workers = self.notebook_workers_func(self.assignment.lecture)
+        c.Execute.record_kernel_memory = self.record_kernel_memory
+        c.Autograde.skip_unchanged_solutions = self.skip_unchanged_solutions
+        c.Autograde.record_content_hashes = self.incremental_regrade
+        c.Execute.cell_timeouts = self._get_cell_timeouts()
+        c.merge(self._get_file_cache_config())
+        if self.has_previous_result:
+            c.Autograde.previous_output_dir = self.previous_output_path
+        if self.use_kernel_pool:
+            # the pool lives as long as the worker process, so the first call configures it
+            KernelPool.instance(config=self.config)
+            c.Execute.use_kernel_pool = True
+            c.Execute.kernel_pool_key = self.assignment.lecture.code
 
         autograder = Autograde(self.input_path, self.output_path, "**/*.ipynb",
                                copy_files=self.assignment.allow_files, config=c)
         autograder.force = True
 
-        log_stream = io.StringIO()
-        log_handler = logging.StreamHandler(log_stream)
+        log_buffer = self._make_log_buffer()
+        log_handler = log_buffer.handler()
         autograder.log.addHandler(log_handler)
 
         try:
             autograder.start()
         finally:
-            self.grading_logs = log_stream.getvalue()
+            self.grading_logs = log_buffer.getvalue()
+            self.grading_logs_offset = log_buffer.offset
             autograder.log.removeHandler(log_handler)
 
+    def _make_log_buffer(self) -> LogBuffer:
+        """
+        Returns a buffer for the grading logs that periodically
+        stores the intermediate logs of the submission.
+        """
+        return LogBuffer(on_flush=self._flush_logs, config=self.config)
+
+    def _flush_logs(self, logs: str, offset: int):
+        """
+        Stores intermediate grading logs while the submission is graded.
+        Uses a separate session because the logs may be flushed from
+        another thread than the one of the executor.
+        :param logs: The buffered logs.
+        :param offset: The number of characters dropped before the logs.
+        :return: None
+        """
+        session = Session(bind=self.session.get_bind())
+        try:
+            session.merge(SubmissionLogs(logs=logs.replace("\x00", ""), offset=offset,
+                                         sub_id=self.submission.id))
+            session.commit()
+        finally:
+            session.close()
+
     def _put_grades_in_assignment_properties(self) -> str:
         """
         Checks if assignment was already graded and returns updated properties.
@@ -288,30 +745,8 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         :return: Coroutine
         """
         os.unlink(os.path.join(self.output_path, "gradebook.json"))
-        self.log.info(f"Pushing files: {os.listdir(self.output_path)}")
-
-        assignment: Assignment = self.submission.assignment
-        lecture: Lecture = assignment.lecture
-
-        if assignment.type == "user":
-            repo_name = self.submission.username
-        else:
-            group = self.session.query(Group).get(
-                (self.submission.username, lecture.id)
-            )
-            if group is None:
-                raise ValueError()
-            repo_name = group.name
 
-        git_repo_path = os.path.join(
-            self.grader_service_dir,
-            "git",
-            lecture.code,
-            str(assignment.id),
-            "autograde",
-            assignment.type,
-            repo_name,
-        )
+        git_repo_path = self._get_result_repo_path("autograde")
 
         if not os.path.exists(git_repo_path):
             os.makedirs(git_repo_path, exist_ok=True)
@@ -322,50 +757,28 @@ class LocalAutogradeExecutor(LoggingConfigurable):
             except CalledProcessError:
                 raise
 
-        command = f"{self.git_executable} init"
-        self.log.info(f"Running {command} at {self.output_path}")
-        try:
-            self._run_subprocess(command, self.output_path)
-        except CalledProcessError:
-            pass
+        self._publish(git_repo_path, f"submission_{self.submission.commit_hash}")
 
-        self.log.info(f"Creating new branch "
-                      f"submission_{self.submission.commit_hash}")
-        command = (
-            f"{self.git_executable} switch -c "
-            f"submission_{self.submission.commit_hash}"
-        )
-        try:
-            self._run_subprocess(command, self.output_path)
-        except CalledProcessError:
-            pass
-        self.log.info(f"Now at branch "
-                      f"submission_{self.submission.commit_hash}")
-
-        self.log.info(f"Commiting all files in {self.output_path}")
-        try:
-            self._run_subprocess(
-                f"{self.git_executable} add -A", self.output_path
-            )
-            self._run_subprocess(
-                f'{self.git_executable} commit -m '
-                f'"{self.submission.commit_hash}"',
-                self.output_path,
-            )
-        except CalledProcessError:
-            raise RuntimeError("Failed to commit changes")
-
-        self.log.info(
-            f"Pushing to {git_repo_path} at branch "
-            f"submission_{self.submission.commit_hash}"
-        )
-        command = f'{self.git_executable} push -uf ' \
-                  f'"{git_repo_path}" submission_{self.submission.commit_hash}'
+    def _publish(self, git_repo_path: str, branch: str):
+        """
+        Publishes the contents of the output path as the given branch
+        of the bare repository with the configured result publisher.
+        :param git_repo_path: Path of the bare repository.
+        :param branch: The name of the branch.
+        :return: None
+        """
+        publisher = self.result_publisher_class(
+            git_executable=self.git_executable, parent=self)
+        self.log.info(f"Publishing files: {os.listdir(self.output_path)} "
+                      f"with {publisher.__class__.__name__}")
         try:
-            self._run_subprocess(command, self.output_path)
-        except CalledProcessError:
-            raise RuntimeError(f"Failed to push to {git_repo_path}")
-        self.log.info("Pushing complete")
+            publisher.publish(self.output_path, git_repo_path, branch,
+                              self.submission.commit_hash)
+        except CalledProcessError as e:
+            self.grading_logs = e.stderr
+            self.grading_logs_offset = 0
+            raise RuntimeError(f"Failed to publish to {git_repo_path}")
+        self.log.info("Publishing complete")
 
     def _set_properties(self):
         """
@@ -407,6 +820,7 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         if self.grading_logs is not None:
             self.grading_logs = self.grading_logs.replace("\x00", "")
         logs = SubmissionLogs(logs=self.grading_logs,
+                              offset=self.grading_logs_offset,
                               sub_id=self.submission.id)
         self.session.merge(logs)
         self.session.commit()
@@ -417,11 +831,12 @@ class LocalAutogradeExecutor(LoggingConfigurable):
         and closes the session if specified by self.close_session.
         :return: None
         """
-        try:
-            shutil.rmtree(self.input_path)
-            shutil.rmtree(self.output_path)
-        except FileNotFoundError:
-            pass
+        # the input path does not exist if the result was restored from the cache
+        for path in (self.input_path, self.output_path, self.previous_output_path):
+            try:
+                shutil.rmtree(path)
+            except FileNotFoundError:
+                pass
         if self.close_session:
             self.session.close()
 
@@ -445,6 +860,31 @@ class LocalAutogradeExecutor(LoggingConfigurable):
             raise e
         return process
 
+    def _run_logged_subprocess(self, command: str,
+                               preexec_fn: Optional[TCallable[[], None]] = None) -> Popen[bytes]:
+        """
+        Executes the command as a subprocess and captures its combined output
+        as the grading logs. The output is read while the process runs,
+        so it cannot block on a full pipe.
+        :param command: The command to execute as a string.
+        :param preexec_fn: Called in the child process before the command is executed.
+        :return: The finished process.
+        """
+        log_buffer = self._make_log_buffer()
+        try:
+            process = Popen(shlex.split(command), stdout=PIPE, stderr=STDOUT, preexec_fn=preexec_fn)
+        except FileNotFoundError as e:
+            self.grading_logs = str(e)
+            self.log.error(self.grading_logs)
+            raise e
+        try:
+            log_buffer.consume(process.stdout)
+        finally:
+            self._wait_measured(process)
+            self.grading_logs = log_buffer.getvalue()
+            self.grading_logs_offset = log_buffer.offset
+        return process
+
     @validate("relative_input_path", "relative_output_path")
     def _validate_service_dir(self, proposal):
         path: str = proposal["value"]
@@ -491,12 +931,19 @@ class LocalProcessAutogradeExecutor(LocalAutogradeExecutor):
                   f'-o "{self.output_path}" ' \
                   f'-p "**/*.ipynb" ' \
                   f'--copy_files={self.assignment.allow_files} ' \
-                  f'--ExecutePreprocessor.timeout={self.timeout_func(self.assignment.lecture)}'
+                  f'--ExecutePreprocessor.timeout={self.timeout_func(self.assignment.lecture)} ' \
+                  f'--Autograde.notebook_workers={self.notebook_workers_func(self.assignment.lecture)} ' \
+                  f'--Execute.record_kernel_memory={self.record_kernel_memory} ' \
+                  f'--Autograde.skip_unchanged_solutions={self.skip_unchanged_solutions} ' \
+                  f'--Autograde.record_content_hashes={self.incremental_regrade}'
+        for arg in self._get_cell_timeouts_args() + self._get_file_cache_args():
+            command += f' {shlex.quote(arg)}'
+        if self.has_previous_result:
+            command += f' --Autograde.previous_output_dir="{self.previous_output_path}"'
         self.log.info(f"Running {command}")
-        process = self._run_subprocess(command, None)
+        process = self._run_logged_subprocess(command)
+        self.log.info(self.grading_logs)
         if process.returncode == 0:
-            self.grading_logs = process.stderr.read().decode("utf-8")
-            self.log.info(self.grading_logs)
             self.log.info("Process has successfully completed execution!")
         else:
             raise RuntimeError("Process has failed execution!")
@@ -0,0 +1,261 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import resource
+import signal
+from subprocess import Popen
+from typing import Callable as TCallable, Dict, Optional
+
+from traitlets import Bool, Callable, Float, Integer, Unicode
+
+from grader_service.autograding.local_grader import LocalProcessAutogradeExecutor
+from grader_service.orm.lecture import Lecture
+
+# errors of a process that hit the address space limit
+_OUT_OF_MEMORY_ERRORS = ("MemoryError", "Cannot allocate memory")
+
+
+class ResourceLimitExceeded(RuntimeError):
+    """Raised if a grading job was stopped because it exceeded a limit of the sandbox."""
+
+    def __init__(self, limit: str):
+        super().__init__(f"Grading exceeded the {limit} limit of the sandbox")
+        self.limit = limit
+        # stored in the metrics of the submission, see LocalAutogradeExecutor.failure_reason
+        self.failure_reason = f"{limit}_limit_exceeded"
+
+
+def default_resource_limits_func(l: Lecture) -> Dict[str, Optional[float]]:
+    return {}
+
+
+class LocalSandboxAutogradeExecutor(LocalProcessAutogradeExecutor):
+    """
+    Runs an autograde job in a separate process like
+    :class:`LocalProcessAutogradeExecutor`, but the process and its kernels
+    run under per-job resource limits. The CPU time of every process is limited
+    with rlimits. If use_cgroup is enabled, the job runs in its own cgroup under
+    cgroup_parent that limits the memory, the number of processes and the
+    CPU bandwidth of all its processes together, otherwise the address space
+    of every process is limited instead of the memory.
+    """
+
+    memory_limit = Integer(default_value=None, allow_none=True,
+                           help="Maximum memory of a grading job in bytes. Limits the memory of the "
+                                "cgroup or, without a cgroup, the address space of every process. "
+                                "Without a cgroup, a failed job is reported as exceeding the limit "
+                                "if its logs contain a memory allocation error. "
+                                "No limit if None.").tag(config=True)
+
+    cpu_time_limit = Integer(default_value=None, allow_none=True,
+                             help="Maximum CPU time in seconds of every process of a grading job. "
+                                  "No limit if None.").tag(config=True)
+
+    process_limit = Integer(default_value=None, allow_none=True,
+                            help="Maximum number of processes of a grading job. Without a cgroup, the "
+                                 "limit applies to all processes of the user the service runs as. "
+                                 "No limit if None.").tag(config=True)
+
+    cpu_quota = Float(default_value=None, allow_none=True,
+                      help="Maximum number of CPUs a grading job can use, only enforced in a cgroup. "
+                           "No limit if None.").tag(config=True)
+
+    resource_limits_func = Callable(default_resource_limits_func, allow_none=False,
+                                    help="Function that takes a lecture as an argument and returns a dict "
+                                         "that overrides the limits of its grading jobs, with the keys "
+                                         "memory, cpu_time, processes and cpu_quota.").tag(config=True)
+
+    use_cgroup = Bool(False, allow_none=False,
+                      help="Whether grading jobs run in their own cgroup v2 under cgroup_parent. "
+                           "Jobs fail if the cgroup cannot be created.").tag(config=True)
+
+    cgroup_root = Unicode("/sys/fs/cgroup", allow_none=False,
+                          help="Mount point of the cgroup v2 hierarchy.").tag(config=True)
+
+    cgroup_parent = Unicode(default_value=None, allow_none=True,
+                            help="Cgroup relative to cgroup_root the job cgroups are created in, "
+                                 "required if use_cgroup is enabled. It has to be delegated to the "
+                                 "user of the service (e.g. a systemd slice with Delegate=yes) and must "
+                                 "not contain processes itself, so it cannot be the cgroup of the service."
+                            ).tag(config=True)
+
+    def __init__(self, grader_service_dir: str, submission, **kwargs):
+        super().__init__(grader_service_dir, submission, **kwargs)
+        self._cgroup_path: Optional[str] = None
+        self._limits: Dict[str, Optional[float]] = {}
+        self._process: Optional[Popen] = None
+
+    @property
+    def limits(self) -> Dict[str, Optional[float]]:
+        """The limits of the job, the lecture specific limits override the configured ones."""
+        limits = {
+            "memory": self.memory_limit,
+            "cpu_time": self.cpu_time_limit,
+            "processes": self.process_limit,
+            "cpu_quota": self.cpu_quota,
+        }
+        limits.update(self.resource_limits_func(self.assignment.lecture) or {})
+        return limits
+
+    def _run(self):
+        self._limits = self.limits
+        self._cgroup_path = self._create_cgroup()
+        try:
+            super()._run()
+        except RuntimeError as e:
+            limit = self._exceeded_limit(self._process)
+            if limit is None:
+                raise
+            raise ResourceLimitExceeded(limit) from e
+        finally:
+            self._remove_cgroup()
+
+    def _run_logged_subprocess(self, command: str,
+                               preexec_fn: Optional[TCallable[[], None]] = None) -> Popen[bytes]:
+        self._process = super()._run_logged_subprocess(command, preexec_fn=self._make_preexec_fn())
+        self._read_cgroup_usage()
+        limit = self._exceeded_limit(self._process)
+        if limit is not None:
+            self.grading_logs = (self.grading_logs or "") + f"\n{ResourceLimitExceeded(limit)}\n"
+            if self._process.returncode == 0:
+                # e.g. a kernel was killed, the grades of the job cannot be trusted
+                raise ResourceLimitExceeded(limit)
+        return self._process
+
+    def _make_preexec_fn(self) -> TCallable[[], None]:
+        rlimits = []
+        if self._limits.get("memory") is not None and self._cgroup_path is None:
+            # the cgroup limits the memory of the job, the address space of processes
+            # that map much more than they use (e.g. numerical libraries) is not limited
+            rlimits.append((resource.RLIMIT_AS, int(self._limits["memory"])))
+        if self._limits.get("cpu_time") is not None:
+            rlimits.append((resource.RLIMIT_CPU, int(self._limits["cpu_time"])))
+        if self._limits.get("processes") is not None and self._cgroup_path is None:
+            # the cgroup limits the processes of the job instead of the whole user
+            rlimits.append((resource.RLIMIT_NPROC, int(self._limits["processes"])))
+        procs_path = None if self._cgroup_path is None else os.path.join(self._cgroup_path, "cgroup.procs")
+
+        def preexec_fn():
+            # runs in the child between fork and exec, so it must not log or allocate much
+            if procs_path is not None:
+                fd = os.open(procs_path, os.O_WRONLY)
+                try:
+                    os.write(fd, str(os.getpid()).encode())
+                finally:
+                    os.close(fd)
+            for limit, value in rlimits:
+                _, hard = resource.getrlimit(limit)
+                if hard != resource.RLIM_INFINITY:
+                    value = min(value, hard)
+                resource.setrlimit(limit, (value, hard))
+
+        return preexec_fn
+
+    def _create_cgroup(self) -> Optional[str]:
+        """
+        Creates the cgroup of the job with the memory, process and CPU limits.
+        :return: The path of the cgroup or None if use_cgroup is disabled.
+        :raises RuntimeError: If the cgroup cannot be created.
+        """
+        if not self.use_cgroup:
+            return None
+        if self.cgroup_parent is None:
+            raise RuntimeError("LocalSandboxAutogradeExecutor.use_cgroup requires a delegated cgroup_parent")
+        if not os.path.exists(os.path.join(self.cgroup_root, "cgroup.controllers")):
+            raise RuntimeError(f"No cgroup v2 hierarchy is mounted at {self.cgroup_root}")
+        path = os.path.join(self.cgroup_root, self.cgroup_parent.lstrip("/"),
+                            f"grader-{self.submission.id}-{os.getpid()}")
+        files = {}
+        if self._limits.get("memory") is not None:
+            files["memory.max"] = str(int(self._limits["memory"]))
+            files["memory.swap.max"] = "0"
+        if self._limits.get("processes") is not None:
+            files["pids.max"] = str(int(self._limits["processes"]))
+        if self._limits.get("cpu_quota") is not None:
+            period = 100000
+            files["cpu.max"] = f"{int(self._limits['cpu_quota'] * period)} {period}"
+        try:
+            os.makedirs(path, exist_ok=True)
+            for name, value in files.items():
+                with open(os.path.join(path, name), "w") as f:
+                    f.write(value)
+        except OSError as e:
+            self._remove_cgroup(path)
+            raise RuntimeError(f"Could not create cgroup {path}: {e}") from e
+        self.log.info(f"Running grading job in cgroup {path}")
+        return path
+
+    def _remove_cgroup(self, path: Optional[str] = None):
+        path = path or self._cgroup_path
+        if path is None:
+            return
+        try:
+            # kill processes of the job that are still running, e.g. orphaned kernels
+            with open(os.path.join(path, "cgroup.kill"), "w") as f:
+                f.write("1")
+        except OSError:
+            pass
+        try:
+            os.rmdir(path)
+        except OSError as e:
+            self.log.warning(f"Could not remove cgroup {path}: {e}")
+        if path == self._cgroup_path:
+            self._cgroup_path = None
+
+    def _read_cgroup_events(self, name: str) -> Dict[str, int]:
+        events = {}
+        if self._cgroup_path is None:
+            return events
+        try:
+            with open(os.path.join(self._cgroup_path, name)) as f:
+                for line in f:
+                    key, _, value = line.partition(" ")
+                    events[key] = int(value)
+        except (OSError, ValueError):
+            pass
+        return events
+
+    def _read_cgroup_usage(self) -> None:
+        """
+        Replaces the resource usage of the grading process with the accounting of the
+        job cgroup, which also covers processes the grading process did not wait for.
+        """
+        if self._cgroup_path is None:
+            return
+        usage_usec = self._read_cgroup_events("cpu.stat").get("usage_usec")
+        if usage_usec is not None:
+            self.cpu_time = usage_usec / 1e6
+        try:
+            # available since Linux 5.19
+            with open(os.path.join(self._cgroup_path, "memory.peak")) as f:
+                self.peak_rss = int(f.read().strip())
+        except (OSError, ValueError):
+            pass
+
+    def _exceeded_limit(self, process: Optional[Popen]) -> Optional[str]:
+        """
+        Determines which limit the job exceeded, if any.
+        :param process: The finished grading process.
+        :return: The name of the exceeded limit or None.
+        """
+        if self._read_cgroup_events("memory.events").get("oom_kill", 0) > 0:
+            return "memory"
+        if self._read_cgroup_events("pids.events").get("max", 0) > 0:
+            return "processes"
+        if process is None or process.returncode == 0:
+            return None
+        if process.returncode == -signal.SIGXCPU:
+            return "cpu_time"
+        cpu_time = self._limits.get("cpu_time")
+        if cpu_time is not None and self.cpu_time is not None and self.cpu_time >= cpu_time:
+            # a kernel was stopped by the CPU time limit and the grading process failed
+            return "cpu_time"
+        if self._limits.get("memory") is not None and self._cgroup_path is None and \
+                any(error in (self.grading_logs or "") for error in _OUT_OF_MEMORY_ERRORS):
+            # an allocation failed because of the address space limit
+            return "memory"
+        return None
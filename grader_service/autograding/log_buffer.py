@@ -0,0 +1,100 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import codecs
+import logging
+import threading
+import time
+from collections import deque
+from typing import BinaryIO, Callable, Deque, Optional
+
+from traitlets import Float, Integer
+from traitlets.config import LoggingConfigurable
+
+
+class LogBuffer(LoggingConfigurable):
+    """
+    Bounded buffer for the logs of a grading job that only keeps the last
+    max_size characters, so memory stays flat for jobs with huge outputs.
+    The offset is the number of characters that were dropped from the
+    beginning of the logs. While logs are written, the flush callback is
+    called with the buffered logs and the offset at most every
+    flush_interval seconds, e.g. to store intermediate logs in the database.
+    The buffer implements write and flush, so it can be used as the stream
+    of a :class:`logging.StreamHandler`.
+    """
+
+    max_size = Integer(1024 * 1024, allow_none=False,
+                       help="Maximum number of characters of the logs that are kept.").tag(config=True)
+
+    flush_interval = Float(5.0, allow_none=False,
+                           help="Minimum time in seconds between two flushes of intermediate logs. "
+                                "Intermediate logs are not flushed if the interval is not positive."
+                           ).tag(config=True)
+
+    def __init__(self, on_flush: Optional[Callable[[str, int], None]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.on_flush = on_flush
+        self.offset = 0
+        self._chunks: Deque[str] = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def write(self, text: str) -> None:
+        with self._lock:
+            self._chunks.append(text)
+            self._size += len(text)
+            while self._size > self.max_size:
+                excess = self._size - self.max_size
+                first = self._chunks[0]
+                if len(first) <= excess:
+                    self._chunks.popleft()
+                    dropped = len(first)
+                else:
+                    self._chunks[0] = first[excess:]
+                    dropped = excess
+                self._size -= dropped
+                self.offset += dropped
+        self.flush()
+
+    def flush(self) -> None:
+        """Flushes the logs if flush_interval passed since the last flush."""
+        if self.flush_interval > 0 and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        """Flushes the logs immediately."""
+        self._last_flush = time.monotonic()
+        if self.on_flush is None:
+            return
+        with self._lock:
+            logs, offset = "".join(self._chunks), self.offset
+        try:
+            self.on_flush(logs, offset)
+        except Exception:
+            self.log.warning("Could not flush intermediate logs", exc_info=True)
+
+    def getvalue(self) -> str:
+        with self._lock:
+            return "".join(self._chunks)
+
+    def consume(self, stream: BinaryIO, chunk_size: int = 65536) -> None:
+        """
+        Reads the stream into the buffer until it is closed. The stream is read
+        in chunks of at most chunk_size bytes as soon as they are available,
+        so output without line breaks does not have to fit into memory.
+        """
+        read = getattr(stream, "read1", stream.read)
+        # chunks may end within a multi-byte character
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for chunk in iter(lambda: read(chunk_size), b""):
+            self.write(decoder.decode(chunk))
+        self.write(decoder.decode(b"", final=True))
+
+    def handler(self) -> logging.Handler:
+        """Returns a logging handler that writes to the buffer."""
+        return logging.StreamHandler(self)
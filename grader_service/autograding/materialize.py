@@ -0,0 +1,108 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import subprocess
+import tarfile
+from subprocess import PIPE, CalledProcessError, Popen
+from typing import Dict, List, Optional
+
+from traitlets import Unicode
+from traitlets.config import LoggingConfigurable
+
+
+class SubmissionMaterializer(LoggingConfigurable):
+    """
+    Base class of the strategies that place the files of a submission
+    from a bare git repository into the input directory of an executor.
+    The strategy is selected by the ``submission_materializer_class``
+    of :class:`~grader_service.autograding.local_grader.LocalAutogradeExecutor`.
+    """
+    git_executable = Unicode("git", allow_none=False).tag(config=True)
+
+    def materialize(self, git_repo_path: str, ref: str,
+                    commit: Optional[str], dest: str) -> None:
+        """
+        Places the tree of the given commit (or of ``ref`` if commit is None)
+        into the existing and empty directory ``dest``.
+        :param git_repo_path: Path of the bare repository.
+        :param ref: The branch containing the commit.
+        :param commit: The commit hash to materialize or None for the head of ``ref``.
+        :param dest: The destination directory.
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def blob_ids(self, git_repo_path: str, ref: str, commit: Optional[str],
+                 min_size: int = 0) -> Dict[str, str]:
+        """
+        Returns the git blob ids of the files of the commit, which identify
+        their content without reading the materialized files.
+        :param git_repo_path: Path of the bare repository.
+        :param ref: The branch containing the commit.
+        :param commit: The commit hash or None for the head of ``ref``.
+        :param min_size: Files smaller than this number of bytes are skipped.
+        :return: The blob ids by the paths of the files relative to the commit.
+        """
+        output = self._run([self.git_executable, "ls-tree", "-r", "-l", "-z", commit or ref],
+                           git_repo_path).stdout
+        blob_ids = {}
+        for entry in output.split("\0"):
+            if not entry:
+                continue
+            info, path = entry.split("\t", 1)
+            _, object_type, blob_id, size = info.split()
+            if object_type == "blob" and int(size) >= min_size:
+                blob_ids[path] = blob_id
+        return blob_ids
+
+    def _run(self, args: List[str], cwd: str) -> subprocess.CompletedProcess:
+        self.log.info(f"Running {' '.join(args)}")
+        return subprocess.run(args, cwd=cwd, stdout=PIPE, stderr=PIPE, text=True, check=True)
+
+
+class GitPullMaterializer(SubmissionMaterializer):
+    """
+    Initializes a repository in the destination, pulls the whole history
+    of the branch and checks out the commit.
+    """
+
+    def materialize(self, git_repo_path: str, ref: str,
+                    commit: Optional[str], dest: str) -> None:
+        self._run([self.git_executable, "init"], dest)
+        self._run([self.git_executable, "pull", git_repo_path, ref], dest)
+        if commit is not None:
+            self._run([self.git_executable, "checkout", commit], dest)
+            self.log.info(f"Now at commit {commit}")
+
+
+class GitArchiveMaterializer(SubmissionMaterializer):
+    """
+    Streams ``git archive`` of the commit from the bare repository into the
+    destination without creating a repository or copying any history.
+    """
+
+    def materialize(self, git_repo_path: str, ref: str,
+                    commit: Optional[str], dest: str) -> None:
+        args = [self.git_executable, "archive", "--format=tar", commit or ref]
+        self.log.info(f"Running {' '.join(args)} in {git_repo_path}")
+        process = Popen(args, cwd=git_repo_path, stdout=PIPE, stderr=PIPE)
+        try:
+            with tarfile.open(fileobj=process.stdout, mode="r|") as tar:
+                if hasattr(tarfile, "data_filter"):
+                    tar.extractall(dest, filter="data")
+                else:
+                    tar.extractall(dest)
+        except tarfile.ReadError:
+            # an empty stream is not a valid tar file, the git error is raised below
+            pass
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            stderr = process.stderr.read().decode("utf-8")
+            self.log.error(stderr)
+            raise CalledProcessError(returncode, args, stderr=stderr)
+        process.stderr.close()
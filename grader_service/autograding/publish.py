@@ -0,0 +1,89 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import subprocess
+import tempfile
+from subprocess import PIPE
+from typing import List, Optional
+
+from traitlets import Unicode
+from traitlets.config import LoggingConfigurable
+
+
+class ResultPublisher(LoggingConfigurable):
+    """
+    Base class of the strategies that publish the contents of an output
+    directory as a branch of a bare git repository.
+    The strategy is selected by the ``result_publisher_class``
+    of :class:`~grader_service.autograding.local_grader.LocalAutogradeExecutor`.
+    """
+    git_executable = Unicode("git", allow_none=False).tag(config=True)
+
+    def publish(self, src_dir: str, git_repo_path: str, branch: str, message: str) -> None:
+        """
+        Commits all files in ``src_dir`` and points ``branch`` of the bare
+        repository at ``git_repo_path`` to the commit, replacing previous results.
+        :param src_dir: The directory containing the files to publish.
+        :param git_repo_path: Path of the existing bare repository.
+        :param branch: The name of the branch, e.g. submission_<hash>.
+        :param message: The commit message.
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def _run(self, args: List[str], cwd: Optional[str], env: Optional[dict] = None) -> str:
+        self.log.info(f"Running {' '.join(args)}")
+        return subprocess.run(args, cwd=cwd, env=env, stdout=PIPE, stderr=PIPE,
+                              text=True, check=True).stdout.strip()
+
+
+class GitPushPublisher(ResultPublisher):
+    """
+    Initializes a repository in the output directory, commits all files
+    to a new branch and force pushes the branch to the bare repository.
+    """
+
+    def publish(self, src_dir: str, git_repo_path: str, branch: str, message: str) -> None:
+        self._run([self.git_executable, "init"], src_dir)
+        self._run([self.git_executable, "switch", "-c", branch], src_dir)
+        self.log.info(f"Commiting all files in {src_dir}")
+        self._run([self.git_executable, "add", "-A"], src_dir)
+        self._run([self.git_executable, "commit", "-m", message], src_dir)
+        self.log.info(f"Pushing to {git_repo_path} at branch {branch}")
+        self._run([self.git_executable, "push", "-uf", git_repo_path, branch], src_dir)
+
+
+class GitPlumbingPublisher(ResultPublisher):
+    """
+    Writes the files of the output directory straight into the object
+    database of the bare repository using a temporary index, creates the
+    commit with ``commit-tree`` and updates the branch with ``update-ref``.
+    No repository is created in the output directory and the branch only
+    changes in the final, atomic ref update.
+    """
+    author_name = Unicode("Grader Service",
+                          help="Author and committer name of published results.").tag(config=True)
+    author_email = Unicode("grader-service@localhost",
+                           help="Author and committer email of published results.").tag(config=True)
+
+    def publish(self, src_dir: str, git_repo_path: str, branch: str, message: str) -> None:
+        git = [self.git_executable, f"--git-dir={git_repo_path}", f"--work-tree={src_dir}"]
+        with tempfile.TemporaryDirectory() as tmp:
+            env = os.environ.copy()
+            env.update({
+                "GIT_INDEX_FILE": os.path.join(tmp, "index"),
+                "GIT_AUTHOR_NAME": self.author_name,
+                "GIT_AUTHOR_EMAIL": self.author_email,
+                "GIT_COMMITTER_NAME": self.author_name,
+                "GIT_COMMITTER_EMAIL": self.author_email,
+            })
+            self.log.info(f"Writing all files in {src_dir} to {git_repo_path}")
+            self._run([*git, "add", "-A"], src_dir, env)
+            tree = self._run([*git, "write-tree"], src_dir, env)
+            commit = self._run([*git, "commit-tree", tree, "-m", message], src_dir, env)
+        self.log.info(f"Updating branch {branch} of {git_repo_path} to {commit}")
+        self._run([*git, "update-ref", f"refs/heads/{branch}", commit], src_dir)
@@ -0,0 +1,138 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from traitlets import Float, Integer
+from traitlets.config import LoggingConfigurable
+
+from grader_service.orm.base import DeleteState
+from grader_service.orm.submission import Submission
+from grader_service.orm.submission_properties import SubmissionProperties
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Returns the q-th percentile of the values with the nearest-rank method."""
+    values = sorted(values)
+    rank = math.ceil(q / 100 * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class AdaptiveTimeoutPolicy(LoggingConfigurable):
+    """
+    Derives the timeouts of the grade cells of an assignment from their
+    execution times in previous autograding runs, which are stored in the
+    gradebooks of the automatically graded submissions. The timeout of a cell
+    is a multiple of a high percentile of its execution times, bounded by a
+    floor and a ceiling. Cells without enough samples use the default timeout.
+    The execution times of an assignment are shared by all policies of the
+    process for cache_ttl seconds, so the gradebooks are not parsed for every job.
+    """
+
+    percentile = Float(95.0, allow_none=False,
+                       help="Percentile of the execution times of a cell the timeout is based on."
+                       ).tag(config=True)
+
+    multiplier = Float(3.0, allow_none=False,
+                       help="Factor the percentile is multiplied with.").tag(config=True)
+
+    floor = Float(10.0, allow_none=False,
+                  help="Minimum timeout of a cell in seconds.").tag(config=True)
+
+    ceiling = Float(default_value=None, allow_none=True,
+                    help="Maximum timeout of a cell in seconds. The default timeout of the lecture "
+                         "is the maximum if None.").tag(config=True)
+
+    min_samples = Integer(5, allow_none=False,
+                          help="Minimum number of execution times of a cell for an adaptive timeout."
+                          ).tag(config=True)
+
+    max_submissions = Integer(200, allow_none=False,
+                              help="Number of the most recently graded submissions the execution "
+                                   "times are taken from.").tag(config=True)
+
+    cache_ttl = Float(300.0, allow_none=False,
+                      help="Time in seconds the execution times of an assignment are reused "
+                           "before the gradebooks are parsed again. Not cached if 0.").tag(config=True)
+
+    # (assignment id, max_submissions) -> (time of the query, execution times)
+    _cache: Dict[Tuple[int, int], Tuple[float, Dict[str, List[float]]]] = {}
+    _cache_lock = threading.Lock()
+
+    def execution_times(self, session: Session, assignment_id: int) -> Dict[str, List[float]]:
+        """
+        Collects the execution times of the grade cells of an assignment.
+        :return: The execution times by "<notebook id>/<grade id>".
+        """
+        key = (assignment_id, self.max_submissions)
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None and now - cached[0] < self.cache_ttl:
+            return cached[1]
+        times = self._query_execution_times(session, assignment_id)
+        if self.cache_ttl > 0:
+            with self._cache_lock:
+                for k, (t, _) in list(self._cache.items()):
+                    if now - t >= self.cache_ttl:
+                        del self._cache[k]
+                self._cache[key] = (now, times)
+        return times
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    def _query_execution_times(self, session: Session, assignment_id: int) -> Dict[str, List[float]]:
+        rows = (session.query(SubmissionProperties.properties)
+                .join(Submission, Submission.id == SubmissionProperties.sub_id)
+                .filter(Submission.assignid == assignment_id,
+                        Submission.deleted == DeleteState.active,
+                        Submission.auto_status == "automatically_graded")
+                .order_by(Submission.id.desc())
+                .limit(self.max_submissions)
+                .all())
+        times = {}
+        for (properties,) in rows:
+            if not properties:
+                continue
+            try:
+                notebooks = json.loads(properties).get("notebooks", {})
+            except ValueError:
+                continue
+            for notebook_id, notebook in notebooks.items():
+                for grade_id, grade in notebook.get("grades_dict", {}).items():
+                    if grade.get("execution_time") is not None:
+                        times.setdefault(f"{notebook_id}/{grade_id}", []).append(grade["execution_time"])
+        return times
+
+    def cell_timeouts(self, session: Session, assignment_id: int,
+                      default_timeout: Optional[float]) -> Dict[str, float]:
+        """
+        Computes the timeouts of the grade cells of an assignment.
+        :param session: The database session.
+        :param assignment_id: The id of the assignment.
+        :param default_timeout: The timeout of cells without an adaptive timeout.
+        :return: The timeouts in seconds by "<notebook id>/<grade id>", see Execute.cell_timeouts.
+        """
+        ceiling = self.ceiling
+        if default_timeout is not None and default_timeout > 0:
+            ceiling = default_timeout if ceiling is None else min(ceiling, default_timeout)
+        timeouts = {}
+        for key, times in self.execution_times(session, assignment_id).items():
+            if len(times) < self.min_samples:
+                continue
+            timeout = max(math.ceil(self.multiplier * percentile(times, self.percentile)), self.floor)
+            if ceiling is not None:
+                timeout = min(timeout, ceiling)
+            timeouts[key] = timeout
+        return timeouts
@@ -1,14 +1,26 @@
 
 
+import copy
+import datetime
+import logging
+import logging.handlers
+import multiprocessing
 import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from textwrap import dedent
-from typing import Any
+from typing import Any, Optional, Tuple
 
-from traitlets import Bool, Dict, List
+import nbformat
+from nbconvert.exporters.exporter import ResourcesDict
+from nbformat import NotebookNode
+from traitlets import Bool, Dict, Integer, List, Unicode
 from traitlets.config.loader import Config
 
 from grader_service.convert import utils
 from grader_service.convert.gradebook.gradebook import Gradebook, MissingEntry
+from grader_service.convert.gradebook.models import Notebook
 from grader_service.convert.preprocessors import (
     CheckCellMetadata,
     ClearOutput,
@@ -26,6 +38,7 @@ from grader_service.convert.converters.baseapp import ConverterApp
 
 class Autograde(BaseConverter):
     _sanitizing = True
+    _executing = True
 
     sanitize_preprocessors = List(
         [
@@ -42,10 +55,70 @@ class Autograde(BaseConverter):
 
     preprocessors = List([])
 
+    notebook_workers = Integer(
+        1,
+        help=dedent(
+            """
+            Number of worker processes used to autograde the notebooks of an assignment
+            concurrently. Every worker grades into a private copy of the gradebook and
+            the grades are merged into gradebook.json after all notebooks are done.
+            The workers are spawned as fresh interpreters, so they do not inherit the
+            threads or the kernel pool of this process. They always start a fresh kernel
+            for every notebook, even if Execute.use_kernel_pool is set.
+            A value of 1 grades the notebooks one after another.
+            """
+        ),
+    ).tag(config=True)
+
+    previous_output_dir = Unicode(
+        None,
+        allow_none=True,
+        help=dedent(
+            """
+            Output directory of a previous autograding run of the same student, containing
+            the autograded notebooks and the resulting gradebook.json. Notebooks whose content
+            hash matches the hash recorded in the previous gradebook are not executed again;
+            their autograded notebook and automatic grades are copied forward instead.
+            """
+        ),
+    ).tag(config=True)
+
+    record_content_hashes = Bool(
+        False,
+        help=dedent(
+            """
+            Whether the content hash of every graded notebook is stored in the gradebook,
+            so a later run with the result as :attr:`previous_output_dir` can copy unchanged
+            notebooks forward. Hashes are always recorded if previous_output_dir is set.
+            """
+        ),
+    ).tag(config=True)
+
+    skip_unchanged_solutions = Bool(
+        False,
+        help=dedent(
+            """
+            Whether notebooks in which no solution cell was changed (e.g. the release
+            notebook was submitted unchanged) are graded without starting a kernel.
+            Their test cells are not executed and get zero points, their solution
+            cells get zero points and a "No response." comment as usual.
+            Code that students write outside of solution cells is not considered,
+            so only enable this if assignments are answered in the solution cells.
+            """
+        ),
+    ).tag(config=True)
+
+    not_executed_message = Unicode(
+        "The notebook was not executed because no solution cell was changed.",
+        help="The error shown in the test cells of notebooks graded without execution.",
+    ).tag(config=True)
+
     def _init_preprocessors(self) -> None:
         self.exporter._preprocessors = []
         if self._sanitizing:
             preprocessors = self.sanitize_preprocessors
+        elif not self._executing:
+            preprocessors = [pp for pp in self.autograde_preprocessors if not issubclass(pp, Execute)]
         else:
             preprocessors = self.autograde_preprocessors
 
@@ -53,9 +126,16 @@ class Autograde(BaseConverter):
             self.exporter.register_preprocessor(pp)
 
     def convert_single_notebook(self, notebook_filename: str) -> None:
+        """
+        Sanitizes and autogrades a single notebook.
+
+        The sanitized notebook is kept in memory and passed directly to the
+        autograde preprocessors, so the notebook is only serialized and
+        written once after it was executed.
+        """
         # ignore notebooks that aren't in the gradebook
         resources = self.init_single_notebook_resources(notebook_filename)
-        with Gradebook(resources["output_json_path"]) as gb:
+        with self.get_gradebook() as gb:
             try:
                 gb.find_notebook(resources["unique_key"])
             except MissingEntry:
@@ -65,24 +145,149 @@ class Autograde(BaseConverter):
         self.log.info("Sanitizing %s", notebook_filename)
         self._sanitizing = True
         self._init_preprocessors()
-        super(Autograde, self).convert_single_notebook(notebook_filename)
+        nb, _ = self._sanitize_notebook(notebook_filename, resources)
+        content_hash = None
+        if self._incremental:
+            content_hash = utils.compute_notebook_checksum(nb, self._get_extra_files_checksum())
+            if self._copy_forward(resources["unique_key"], content_hash):
+                return
 
-        notebook_filename = os.path.join(
-            self.writer.build_directory, os.path.basename(notebook_filename)
-        )
-        self.log.info("Autograding %s", notebook_filename)
+        self._executing = not (self.skip_unchanged_solutions
+                               and self._solutions_unchanged(resources["unique_key"], nb))
+        if self._executing:
+            self.log.info("Autograding %s", os.path.join(self._output_directory,
+                                                         os.path.basename(notebook_filename)))
+        else:
+            self.log.info("No solution cell of %s was changed, grading it without execution",
+                          resources["unique_key"])
+            self._mark_not_executed(nb)
         self._sanitizing = False
         self._init_preprocessors()
         try:
+            # the kernel runs in the output directory like it would for the written notebook
+            resources = self.init_single_notebook_resources(notebook_filename)
+            resources["metadata"] = dict(
+                name=resources["unique_key"],
+                path=self._output_directory,
+                modified_date=datetime.datetime.fromtimestamp(
+                    os.path.getmtime(notebook_filename), tz=datetime.timezone.utc
+                ).strftime("%B %d, %Y"),
+            )
             with utils.setenv(NBGRADER_EXECUTION="autograde"):
-                super(Autograde, self).convert_single_notebook(notebook_filename)
+                output, resources = self.exporter.from_notebook_node(nb, resources=resources)
+            self.write_single_notebook(output, resources)
+            if content_hash is not None:
+                with self.get_gradebook() as gb:
+                    gb.set_content_hash(resources["unique_key"], content_hash)
         finally:
             self._sanitizing = True
+            self._executing = True
+
+    def _solutions_unchanged(self, notebook_id: str, nb: NotebookNode) -> bool:
+        """
+        Checks whether every solution cell of the sanitized notebook still has the
+        checksum recorded in the gradebook, i.e. the student did not answer anything.
+        Notebooks without solution cells are always executed.
+        """
+        cells = {cell.metadata.nbgrader.grade_id: cell for cell in nb.cells if utils.is_solution(cell)}
+        with self.get_gradebook() as gb:
+            solution_cells = gb.find_notebook(notebook_id).solution_cells
+            if len(solution_cells) == 0:
+                return False
+            for solution_cell in solution_cells:
+                cell = cells.get(solution_cell.name)
+                if cell is None:
+                    return False
+                try:
+                    checksum = gb.find_source_cell(solution_cell.name, notebook_id).checksum
+                except MissingEntry:
+                    return False
+                if checksum is None or checksum != utils.compute_checksum(cell):
+                    return False
+        return True
+
+    def _mark_not_executed(self, nb: NotebookNode) -> None:
+        """
+        Adds an error output to the autograded test cells of a notebook that is not
+        executed, so they get zero points and the feedback shows the reason.
+        """
+        for cell in nb.cells:
+            if utils.is_grade(cell) and not utils.is_solution(cell) and cell.cell_type == "code":
+                cell.outputs = [nbformat.v4.new_output(
+                    "error", ename="NotExecuted", evalue=self.not_executed_message, traceback=[]
+                )]
+
+    @property
+    def _incremental(self) -> bool:
+        return self.record_content_hashes or self.previous_output_dir is not None
+
+    def _get_extra_files_checksum(self) -> str:
+        """
+        Checksum of the files next to the notebooks in the output directory
+        (e.g. data files), which are available to the notebooks during execution.
+        """
+        if self._extra_files_checksum is None:
+            self._extra_files_checksum = utils.compute_directory_checksum(
+                self._output_directory, ignore=["*.ipynb", "gradebook.json"] + self.ignore
+            )
+        return self._extra_files_checksum
+
+    def _copy_forward(self, notebook_id: str, content_hash: str) -> bool:
+        """
+        Copies the autograded notebook and the automatic grades and comments
+        of an unchanged notebook from :attr:`previous_output_dir`.
+        :param notebook_id: The unique key of the notebook.
+        :param content_hash: The content hash of the sanitized notebook.
+        :return: Whether the previous result was used.
+        """
+        if self.previous_output_dir is None:
+            return False
+        previous_notebook = os.path.join(self.previous_output_dir, f"{notebook_id}.ipynb")
+        previous_gradebook = os.path.join(self.previous_output_dir, "gradebook.json")
+        if not (os.path.isfile(previous_notebook) and os.path.isfile(previous_gradebook)):
+            return False
+        try:
+            previous = Gradebook(previous_gradebook, log=self.log).find_notebook(notebook_id)
+        except MissingEntry:
+            return False
+        if previous.content_hash is None or previous.content_hash != content_hash:
+            return False
+
+        self.log.info("Notebook %s is unchanged, copying previous autograding result", notebook_id)
+        shutil.copyfile(previous_notebook, os.path.join(self._output_directory, f"{notebook_id}.ipynb"))
+        with self.get_gradebook() as gb:
+            for previous_grade in previous.grades:
+                grade = gb.find_grade(previous_grade.id, notebook_id)
+                grade.auto_score = previous_grade.auto_score
+                grade.failed_tests = previous_grade.failed_tests
+                grade.execution_time = previous_grade.execution_time
+                grade.kernel_memory = previous_grade.kernel_memory
+                grade.needs_manual_grade = grade.manual_score is not None or grade.auto_score is None
+                gb.add_grade(previous_grade.id, notebook_id, grade)
+            for previous_comment in previous.comments:
+                comment = gb.find_comment(previous_comment.id, notebook_id)
+                comment.auto_comment = previous_comment.auto_comment
+                gb.add_comment(previous_comment.id, notebook_id, comment)
+            gb.set_content_hash(notebook_id, content_hash)
+        return True
+
+    def _sanitize_notebook(
+            self, notebook_filename: str, resources: dict
+    ) -> Tuple[NotebookNode, ResourcesDict]:
+        """
+        Runs the sanitize preprocessors on a notebook without serializing the result.
+        :return: The sanitized notebook node and the resources.
+        """
+        with open(notebook_filename, encoding="utf-8") as f:
+            nb = nbformat.read(f, as_version=4)
+        resources = self.exporter._init_resources(resources)
+        resources["metadata"]["name"] = resources["unique_key"]
+        resources["metadata"]["path"] = os.path.dirname(notebook_filename)
+        return self.exporter._preprocess(nb, resources)
 
     def convert_notebooks(self) -> None:
         # check for missing notebooks and give them a score of zero if they do not exist
-        json_path = os.path.join(self._output_directory, "gradebook.json")
-        with Gradebook(json_path) as gb:
+        with self.get_gradebook() as gb:
             self.copy_unmatched_files(gb)
 
             glob_notebooks = {
@@ -103,6 +308,47 @@ class Autograde(BaseConverter):
 
         super().convert_notebooks()
 
+    def convert_notebook_files(self) -> None:
+        if self.notebook_workers <= 1 or len(self.notebooks) <= 1:
+            super().convert_notebook_files()
+            return
+
+        workers = min(self.notebook_workers, len(self.notebooks))
+        self.log.info("Autograding %d notebooks with %d workers", len(self.notebooks), workers)
+        # computed once for the submission instead of in every worker
+        extra_files_checksum = self._get_extra_files_checksum() if self._incremental else None
+        # a forked worker would inherit the kernel pool and threads of this process
+        ctx = multiprocessing.get_context("spawn")
+        log_queue = ctx.Queue()
+        # the logs of the workers are forwarded while they run
+        log_listener = logging.handlers.QueueListener(log_queue, _LogForwarder(self.log))
+        log_listener.start()
+        # a kernel pool of a worker would outlive the notebooks it grades
+        worker_config = copy.deepcopy(self.config)
+        worker_config.Execute.use_kernel_pool = False
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir, ProcessPoolExecutor(
+                    max_workers=workers, mp_context=ctx, initializer=_init_autograde_worker,
+                    initargs=(log_queue, self.log.getEffectiveLevel())) as pool:
+                futures = []
+                for idx, notebook_filename in enumerate(self.notebooks):
+                    gradebook_path = os.path.join(tmp_dir, f"gradebook_{idx}.json")
+                    shutil.copyfile(self._gradebook_path, gradebook_path)
+                    futures.append(pool.submit(
+                        _autograde_notebook_worker, worker_config, self._input_directory,
+                        self._output_directory, self._file_pattern, self._copy_files,
+                        notebook_filename, gradebook_path, extra_files_checksum
+                    ))
+                # collect results in order, so the first error is deterministic
+                results = [future.result() for future in futures]
+        finally:
+            log_listener.stop()
+
+        with self.get_gradebook() as gb:
+            for notebook in results:
+                if notebook is not None:
+                    gb.update_notebook(Notebook.from_dict(notebook))
+
     def _load_config(self, cfg: Config, **kwargs: Any) -> None:
         super(Autograde, self)._load_config(cfg, **kwargs)
 
@@ -111,11 +357,66 @@ class Autograde(BaseConverter):
     ) -> None:
         super(Autograde, self).__init__(input_dir, output_dir, file_pattern, copy_files, **kwargs)
         self.force = True  # always overwrite generated assignments
+        self._extra_files_checksum: Optional[str] = None
 
     def start(self) -> None:
         super(Autograde, self).start()
 
 
+class _LogForwarder(logging.Handler):
+    """Passes the log records of the notebook workers to the log of the converter."""
+
+    def __init__(self, log: logging.Logger):
+        super().__init__()
+        self._log = log
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._log.handle(record)
+
+
+_worker_log_handler: Optional[logging.Handler] = None
+_worker_log_level = logging.INFO
+
+
+def _init_autograde_worker(log_queue, log_level: int) -> None:
+    """Initializes a worker process of :meth:`Autograde.convert_notebook_files`."""
+    global _worker_log_handler, _worker_log_level
+    _worker_log_handler = logging.handlers.QueueHandler(log_queue)
+    _worker_log_level = log_level
+
+
+def _autograde_notebook_worker(
+        config: Config, input_dir: str, output_dir: str, file_pattern: str, copy_files: bool,
+        notebook_filename: str, gradebook_path: str, extra_files_checksum: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Autogrades a single notebook in a worker process of :meth:`Autograde.convert_notebook_files`.
+    The logs are sent to the parent process while the notebook is graded.
+    :return: The updated gradebook entry of the notebook or None if it was skipped.
+    """
+    autograder = Autograde(input_dir, output_dir, file_pattern, copy_files, config=config)
+    autograder._gradebook_path = gradebook_path
+    autograder._extra_files_checksum = extra_files_checksum
+    autograder.notebooks = [notebook_filename]
+    autograder.init_exporter()
+
+    if _worker_log_handler is not None:
+        autograder.log.setLevel(_worker_log_level)
+        autograder.log.addHandler(_worker_log_handler)
+    os.chdir(output_dir)
+    try:
+        with autograder.gradebook_session() as gb:
+            autograder.convert_single_notebook(notebook_filename)
+            unique_key = autograder.init_single_notebook_resources(notebook_filename)["unique_key"]
+            try:
+                return gb.find_notebook(unique_key).to_dict()
+            except MissingEntry:
+                return None
+    finally:
+        if _worker_log_handler is not None:
+            autograder.log.removeHandler(_worker_log_handler)
+
+
 class AutogradeApp(ConverterApp):
     version = ConverterApp.__version__
 
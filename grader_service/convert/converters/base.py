@@ -1,3 +1,4 @@
+import contextlib
 import glob
 import importlib
 import os
@@ -25,6 +26,7 @@ from traitlets import (
 )
 from traitlets.config import Config, LoggingConfigurable
 
+from grader_service.convert.filecache import FileCache
 from grader_service.convert.gradebook.gradebook import Gradebook
 from grader_service.convert.nbgraderformat import SchemaTooNewError, SchemaTooOldError
 from grader_service.convert.nbgraderformat.common import ValidationError
@@ -100,6 +102,17 @@ class BaseConverter(LoggingConfigurable):
         ),
     )
 
+    gradebook_checkpoints = Bool(
+        False,
+        help=dedent(
+            """
+            Whether the gradebook session is written to disk after every converted
+            notebook. By default the gradebook is only written once after all
+            notebooks were converted.
+            """
+        ),
+    ).tag(config=True)
+
     permissions = Integer(
         help=dedent(
             """
@@ -161,6 +174,8 @@ class BaseConverter(LoggingConfigurable):
         self._output_directory = os.path.abspath(os.path.expanduser(output_dir))
         self._file_pattern = file_pattern
         self._copy_files = copy_files
+        self._gradebook_path = os.path.join(self._output_directory, "gradebook.json")
+        self.gradebook: typing.Optional[Gradebook] = None
         if self.parent and hasattr(self.parent, "logfile"):
             self.logfile = self.parent.logfile
         else:
@@ -180,23 +195,52 @@ class BaseConverter(LoggingConfigurable):
 
         c.Exporter.default_preprocessors = []
         self.update_config(c)
+        self.file_cache = FileCache(parent=self)
+        # files in the output directory that are hardlinks into the file cache
+        self._linked_files: typing.Set[str] = set()
 
     # register pre-processors to self.exporter
     # self.convert_notebooks() converts all notebooks in the CourseDir
     # notebooks are set in init_notebooks()
     def start(self) -> None:
         self.init_notebooks()
-        self.writer = FilesWriter(parent=self, config=self.config)
-        self.exporter: Exporter = self.exporter_class(parent=self, config=self.config)
-        for pp in self.preprocessors:
-            self.exporter.register_preprocessor(pp)
+        self.init_exporter()
         currdir = os.getcwd()
         os.chdir(self._output_directory)
         try:
-            self.convert_notebooks()
+            with self.gradebook_session():
+                self.convert_notebooks()
         finally:
             os.chdir(currdir)
 
+    @contextlib.contextmanager
+    def gradebook_session(self) -> typing.Iterator[Gradebook]:
+        """
+        Loads the gradebook once and shares it with all preprocessors through the
+        notebook resources. Changes are written atomically when the session ends.
+        """
+        self.gradebook = Gradebook(self._gradebook_path)
+        try:
+            with self.gradebook:
+                yield self.gradebook
+        finally:
+            self.gradebook = None
+
+    def get_gradebook(self) -> Gradebook:
+        """
+        Returns the gradebook of the current session or loads the gradebook
+        if no session is open.
+        """
+        if self.gradebook is not None:
+            return self.gradebook
+        return Gradebook(self._gradebook_path)
+
+    def init_exporter(self) -> None:
+        self.writer = FilesWriter(parent=self, config=self.config)
+        self.exporter: Exporter = self.exporter_class(parent=self, config=self.config)
+        for pp in self.preprocessors:
+            self.exporter.register_preprocessor(pp)
+
     @default("classes")
     def _classes_default(self):
         classes = super(BaseConverter, self)._classes_default()
@@ -231,10 +275,10 @@ class BaseConverter(LoggingConfigurable):
         ]
         resources["output_files_dir"] = "%s_files" % os.path.basename(notebook_filename)
         resources["output_json_file"] = "gradebook.json"
-        resources["output_json_path"] = os.path.join(
-            self._output_directory, resources["output_json_file"]
-        )
+        resources["output_json_path"] = self._gradebook_path
         resources["nbgrader"] = dict()  # support nbgrader pre-processors
+        if self.gradebook is not None:
+            resources["gradebook"] = self.gradebook
         return resources
 
     def write_single_notebook(self, output: str, resources: ResourcesDict) -> None:
@@ -277,7 +321,7 @@ class BaseConverter(LoggingConfigurable):
             copied_files = []
 
             def save_copy2(src_c, dst_c, *, follow_symlinks=True):
-                shutil.copy2(src_c, dst_c, follow_symlinks=follow_symlinks)
+                self._copy_file(src_c, dst_c)
                 rel_file_name = os.path.relpath(src_c, src)
                 copied_files.append(rel_file_name)
 
@@ -297,7 +341,15 @@ class BaseConverter(LoggingConfigurable):
                 os.makedirs(os.path.join(dst, rel_dir), exist_ok=True)
 
                 dst_file = os.path.join(dst, rel_path)
-                shutil.copy2(src_file, dst_file)
+                self._copy_file(src_file, dst_file)
+
+    def _copy_file(self, src_file: str, dst_file: str) -> None:
+        """Copies a file to the output directory, through the file cache if it is enabled."""
+        dst_file = os.path.abspath(dst_file)
+        if self.file_cache.place(src_file, dst_file):
+            self._linked_files.add(dst_file)
+        else:
+            self._linked_files.discard(dst_file)
 
     def set_permissions(self) -> None:
         self.log.info("Setting destination file permissions to %s", self.permissions)
@@ -305,7 +357,11 @@ class BaseConverter(LoggingConfigurable):
         permissions = int(str(self.permissions), 8)
         for dirname, _, filenames in os.walk(dest):
             for filename in filenames:
-                os.chmod(os.path.join(dirname, filename), permissions)
+                path = os.path.join(dirname, filename)
+                # the cached files are shared with other outputs and stay read-only
+                if os.path.abspath(path) in self._linked_files:
+                    continue
+                os.chmod(path, permissions)
 
     def convert_single_notebook(self, notebook_filename: str) -> None:
         """
@@ -323,6 +379,16 @@ class BaseConverter(LoggingConfigurable):
         )
         self.write_single_notebook(output, resources)
 
+    def convert_notebook_files(self) -> None:
+        """
+        Converts all matched notebooks one after another.
+        Converters can override this method to change how the notebooks are scheduled.
+        """
+        for notebook_filename in self.notebooks:
+            self.convert_single_notebook(notebook_filename)
+            if self.gradebook_checkpoints and self.gradebook is not None:
+                self.gradebook.flush()
+
     def convert_notebooks(self) -> None:
         errors = []
 
@@ -343,15 +409,13 @@ class BaseConverter(LoggingConfigurable):
             self.run_pre_convert_hook()
 
             # convert all the notebooks
-            for notebook_filename in self.notebooks:
-                self.convert_single_notebook(notebook_filename)
+            self.convert_notebook_files()
 
             # set assignment permissions
             self.set_permissions()
             self.run_post_convert_hook()
 
-            json_path = os.path.join(self._output_directory, "gradebook.json")
-            with Gradebook(json_path) as gb:
+            with self.get_gradebook() as gb:
                 self.copy_unmatched_files(gb)
 
         except UnresponsiveKernelError as e:
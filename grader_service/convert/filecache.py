@@ -0,0 +1,323 @@
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from textwrap import dedent
+from typing import Dict as TDict, Optional, Set
+
+from traitlets import Dict, Enum, Integer, Unicode
+from traitlets.config import LoggingConfigurable
+
+# ioctl request to clone the extents of a file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+class FileCache(LoggingConfigurable):
+    """
+    A content-addressed cache of the data files of assignments on a worker.
+
+    Every file is stored once per content hash in :attr:`cache_dir` and placed
+    into the output directories of conversions by reflink or hardlink, so
+    large data sets are not copied again for every submission. Source files
+    with a content id (the git blob id of the file in the submission) are only
+    hashed the first time the content id is seen, so the same data set is not
+    hashed again for every submission. The cached objects are read-only and
+    the least recently used ones are evicted if the cache grows larger than
+    :attr:`max_size`.
+    """
+
+    # whether reflinks are supported by the file system of a cache directory
+    _reflink_support: TDict[str, bool] = {}
+
+    cache_dir = Unicode(
+        None,
+        allow_none=True,
+        help=dedent(
+            """
+            Directory of the cache. It should be on the same file system as the
+            output directories, otherwise the files are copied. The cache is
+            disabled if None.
+            """
+        ),
+    ).tag(config=True)
+
+    link_mode = Enum(
+        ["hardlink", "reflink"],
+        default_value="hardlink",
+        help=dedent(
+            """
+            How cached files are placed into the output directory. 'hardlink' shares
+            the read-only file with the cache and all other outputs, 'reflink' gives
+            every output a private copy-on-write clone and falls back to hardlinks
+            if the file system does not support it (e.g. ext4, NFS or overlayfs).
+            A grading process running as root can still modify a shared file, so
+            cached objects are verified against their hash before they are reused
+            if they changed since they were last used. Files are copied if they
+            cannot be linked.
+            """
+        ),
+    ).tag(config=True)
+
+    min_file_size = Integer(
+        1024 * 1024,
+        help="Files smaller than this number of bytes are copied instead of cached.",
+    ).tag(config=True)
+
+    max_size = Integer(
+        None,
+        allow_none=True,
+        help="Maximum size of the cache in bytes. The cache is not evicted if None.",
+    ).tag(config=True)
+
+    content_ids = Dict(
+        key_trait=Unicode(),
+        value_trait=Unicode(),
+        help=dedent(
+            """
+            Content ids of source files by their absolute path, e.g. the git blob ids
+            of the files of the submission. The hash of a file with a content id is
+            looked up in the index of the cache instead of reading the file.
+            """
+        ),
+    ).tag(config=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None
+
+    def place(self, src: str, dst: str) -> bool:
+        """
+        Places a file at dst, from the cache if it is enabled and the file is large enough.
+        :param src: The file to place.
+        :param dst: The destination path, an existing file is replaced.
+        :return: Whether dst is a hardlink that shares its inode with the cache.
+        """
+        if not self.enabled:
+            shutil.copy2(src, dst)
+            return False
+        if os.path.lexists(dst):
+            # never write through a link into the cache
+            os.unlink(dst)
+        if os.path.getsize(src) < self.min_file_size:
+            shutil.copy2(src, dst)
+            return False
+
+        digest = self._source_digest(src)
+        for _ in range(2):
+            path = self._store(src, digest)
+            try:
+                linked = self._link(path, dst)
+                # linking changes the ctime of the object
+                self._record_stamp(path, digest)
+                return linked
+            except FileNotFoundError:
+                # evicted by another process in the meantime
+                continue
+        shutil.copy2(src, dst)
+        return False
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def _index_path(self, kind: str, key: str) -> str:
+        return os.path.join(self.cache_dir, "index", kind, key[:2], key)
+
+    @staticmethod
+    def _read_index(path: str) -> Optional[str]:
+        try:
+            with open(path) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write_index(path: str, value: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _source_digest(self, src: str) -> str:
+        """
+        Returns the content hash of a source file, which is only computed
+        if the content id of the file is unknown or was not seen before.
+        """
+        content_id = self.content_ids.get(os.path.abspath(src))
+        if content_id is None:
+            return self.file_digest(src)
+        index_path = self._index_path("files", content_id)
+        digest = self._read_index(index_path)
+        if digest is None:
+            digest = self.file_digest(src)
+            self._write_index(index_path, digest)
+        return digest
+
+    @staticmethod
+    def _object_stamp(path: str) -> str:
+        # writes change the mtime and chmod or resetting the mtime change the ctime
+        st = os.stat(path)
+        return f"{st.st_size}:{st.st_mtime_ns}:{st.st_ctime_ns}:{st.st_ino}"
+
+    def _verify(self, path: str, digest: str) -> bool:
+        """
+        Checks that a cached object was not modified, e.g. through a hardlink.
+        Only objects that changed since they were last used are hashed again.
+        """
+        if self._read_index(self._index_path("objects", digest)) == self._object_stamp(path):
+            return True
+        return self.file_digest(path) == digest
+
+    def _record_stamp(self, path: str, digest: str) -> None:
+        """Records the state of a shared object after it was verified and linked."""
+        self._write_index(self._index_path("objects", digest), self._object_stamp(path))
+
+    @staticmethod
+    def _touch(path: str) -> None:
+        """Marks the object as recently used for the eviction."""
+        st = os.stat(path)
+        # keeps the mtime, so modifications of shared objects can be detected
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+
+    def _store(self, src: str, digest: str) -> str:
+        """
+        Adds a file to the cache if it is not cached yet.
+        :return: The path of the cached object.
+        """
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            try:
+                if not self._verify(path, digest):
+                    self.log.warning(f"Cached object {path} was modified, replacing it")
+                    os.unlink(path)
+                else:
+                    self._touch(path)
+                    return path
+            except FileNotFoundError:
+                pass
+
+        self.log.info(f"Adding {src} to the file cache")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp_path)
+            os.chmod(tmp_path, 0o444)
+            # atomic, concurrent writers of the same object write the same content
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._touch(path)
+        self.evict(keep=path)
+        return path
+
+    def _link(self, path: str, dst: str) -> bool:
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        if self.link_mode == "reflink" and self._reflink_support.get(self.cache_dir, True):
+            try:
+                self._reflink(path, dst)
+                self._reflink_support[self.cache_dir] = True
+                return False
+            except FileNotFoundError:
+                raise
+            except OSError as e:
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+                if not self._reflink_support.get(self.cache_dir, False):
+                    # checked once, the file system is the same for all objects
+                    self.log.warning(f"Reflinks are not supported in {self.cache_dir}, "
+                                     f"falling back to hardlinks: {e}")
+                    self._reflink_support[self.cache_dir] = False
+                else:
+                    self.log.debug(f"Could not reflink {dst}: {e}")
+        try:
+            os.link(path, dst)
+            return True
+        except FileNotFoundError:
+            raise
+        except OSError as e:
+            # e.g. the cache is on a different file system
+            self.log.debug(f"Could not hardlink {dst}: {e}")
+        shutil.copyfile(path, dst)
+        os.chmod(dst, 0o644)
+        return False
+
+    @staticmethod
+    def _reflink(path: str, dst: str):
+        with open(path, "rb") as src_f, open(dst, "wb") as dst_f:
+            fcntl.ioctl(dst_f.fileno(), FICLONE, src_f.fileno())
+        os.chmod(dst, 0o644)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Removes the least recently used objects until the cache is not larger than :attr:`max_size`.
+        Outputs that link to a removed object keep their file.
+        :param keep: An object that is not removed.
+        """
+        if not self.enabled or self.max_size is None:
+            return
+        objects = []
+        for dirname, _, filenames in os.walk(os.path.join(self.cache_dir, "objects")):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirname, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                objects.append((st.st_atime, st.st_size, path))
+
+        total = sum(size for _, size, _ in objects)
+        evicted = set()
+        for _, size, path in sorted(objects):
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    self.log.warning(f"Could not evict {path} from the file cache: {e}")
+                    continue
+            self.log.info(f"Evicted {path} from the file cache")
+            evicted.add(os.path.basename(path))
+            total -= size
+        if evicted:
+            self._prune_index(evicted)
+
+    def _prune_index(self, digests: Set[str]) -> None:
+        """Removes the index entries of evicted objects."""
+        for digest in digests:
+            try:
+                os.unlink(self._index_path("objects", digest))
+            except FileNotFoundError:
+                pass
+        for dirname, _, filenames in os.walk(os.path.join(self.cache_dir, "index", "files")):
+            for filename in filenames:
+                path = os.path.join(dirname, filename)
+                if not filename.endswith(".tmp") and self._read_index(path) in digests:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
@@ -3,6 +3,8 @@
 import json
 import logging
 import os
+import stat
+import tempfile
 from functools import wraps
 from typing import Any, Optional, Union
 
@@ -56,6 +58,10 @@ class Gradebook:
     """
     The gradebook object to interface with the JSON output file of a conversion.
     Should only be used as a context manager when changing the data.
+
+    Contexts can be nested: changes are only written when the outermost
+    context exits, so a converter can keep one gradebook open as a session
+    for a whole run and flush it once (or at explicit checkpoints with :meth:`flush`).
     """
 
     def __init__(self, dest_json: str, log: logging.Logger = None) -> None:
@@ -93,22 +99,48 @@ class Gradebook:
         traceback: Optional[Any],
     ) -> None:
         self.in_context -= 1
-        if self.dirty and exc_type is None:
+        if self.dirty and exc_type is None and not self.is_in_context:
             self.write_model()
             self.dirty = False
 
+    def __deepcopy__(self, memo: dict) -> "Gradebook":
+        # nbconvert deep copies the resources passed to the preprocessors,
+        # the gradebook session has to be shared instead
+        return self
+
     @property
     def is_in_context(self) -> bool:
         return self.in_context > 0
 
     def write_model(self):
-        """Writes JSON string to a JSON file"""
-        with open(self.json_file, "w") as f:
-            json_str = json.dumps(self.model.to_dict())
-            self.log.info(
-                f"Writing {len(json_str.encode('utf-8'))} bytes to {self.json_file}"
-            )
-            f.write(json_str)
+        """
+        Writes JSON string to a JSON file.
+        The file is replaced atomically, so readers never see a partially written gradebook.
+        """
+        json_str = json.dumps(self.model.to_dict())
+        self.log.info(
+            f"Writing {len(json_str.encode('utf-8'))} bytes to {self.json_file}"
+        )
+        dir_name = os.path.dirname(os.path.abspath(self.json_file))
+        fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix=".gradebook", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json_str)
+            if os.path.exists(self.json_file):
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(self.json_file).st_mode))
+            else:
+                os.chmod(tmp_path, 0o664)
+            os.replace(tmp_path, self.json_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def flush(self):
+        """Writes pending changes of an open gradebook session to the JSON file."""
+        if self.dirty:
+            self.write_model()
+            self.dirty = False
 
     # Notebooks
     @write_access
@@ -147,6 +179,29 @@ class Gradebook:
         """
         raise NotImplementedError()
 
+    @write_access
+    def update_notebook(self, notebook: Notebook) -> Notebook:
+        """
+        Replaces the notebook with the same name by the given notebook,
+        e.g. to merge the results of a gradebook copy.
+        :param notebook: the new notebook
+        :return: notebook : :class:`~Notebook`
+        """
+        self.model.notebooks[notebook.name] = notebook
+        return notebook
+
+    @write_access
+    def set_content_hash(self, name: str, content_hash: str) -> Notebook:
+        """
+        Records the content hash of the autograded version of a notebook.
+        :param name: the name of the notebook
+        :param content_hash: the hash of the sanitized notebook
+        :return: notebook : :class:`~Notebook`
+        """
+        notebook = self.find_notebook(name)
+        notebook.content_hash = content_hash
+        return notebook
+
     @write_access
     def remove_notebook(self, name: str):
         """
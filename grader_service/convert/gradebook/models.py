@@ -64,6 +64,11 @@ class Grade(BaseModel, IDMixin, NotebookRelashionship, CellRelashionship):
     #: otherwise False.
     failed_tests: bool
 
+    #: The wall time in seconds it took to execute the cell during autograding
+    execution_time: Optional[float] = None
+    #: The peak memory of the kernel in bytes after the cell was executed during autograding
+    kernel_memory: Optional[int] = None
+
     @property
     def score(self) -> float:
         """
@@ -225,6 +230,9 @@ class Notebook(BaseModel, IDMixin, NameMixin):
     comments_dict: Dict[str, Type[Comment]]
     #: Whether this assignment has been flagged by a human grader
     flagged: bool
+    #: Hash of the sanitized notebook that was autograded, used to detect
+    #: unchanged notebooks when a submission is regraded incrementally
+    content_hash: Optional[str] = None
 
     def __post_init__(self):
         super().__post_init__()
@@ -322,6 +330,7 @@ class Notebook(BaseModel, IDMixin, NameMixin):
             source_cells_dict=sr,
             grades_dict=gr,
             comments_dict=co,
+            content_hash=d.get("content_hash"),
         )
 
     def to_dict(self) -> dict:
@@ -344,6 +353,7 @@ class Notebook(BaseModel, IDMixin, NameMixin):
             },
             "grades_dict": {k: v.to_dict() for k, v in self.grades_dict.items()},
             "comments_dict": {k: v.to_dict() for k, v in self.comments_dict.items()},
+            "content_hash": self.content_hash,
             "_type": self._type,
         }
 
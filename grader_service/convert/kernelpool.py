@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from textwrap import dedent
+from typing import Dict as TDict, List as TList, Optional, Tuple
+
+from jupyter_client.kernelspec import KernelSpecManager, NoSuchKernel
+from jupyter_client.manager import AsyncKernelManager
+from jupyter_client.utils import run_sync
+from traitlets import Dict, Enum, Float, Integer, List, Unicode
+from traitlets.config import SingletonConfigurable
+
+
+@dataclass
+class _PooledKernel:
+    km: AsyncKernelManager
+    key: Tuple[str, str]
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class KernelPool(SingletonConfigurable):
+    """
+    A per-process pool of pre-started Jupyter kernels that the
+    :class:`~grader_service.convert.preprocessors.Execute` preprocessor can lease.
+
+    Kernels are keyed by kernel name and an arbitrary pool key
+    (e.g. the lecture code or image). After a lease the kernel is
+    restarted or replaced in a background thread, so student code never
+    shares interpreter state with a previous submission.
+    """
+
+    max_kernels = Integer(
+        8, help="Maximum number of idle kernels kept in the pool over all keys."
+    ).tag(config=True)
+
+    max_kernels_per_key = Integer(
+        2, help="Maximum number of idle kernels kept for a single kernel name and key."
+    ).tag(config=True)
+
+    idle_timeout = Float(
+        600.0, help="Time in seconds after which an unused kernel is shut down."
+    ).tag(config=True)
+
+    recycle = Enum(
+        ["restart", "replace"],
+        default_value="restart",
+        help=dedent(
+            """
+            How a kernel is prepared for the next lease after it was used.
+            'restart' restarts the kernel process with the same connection info,
+            'replace' shuts the kernel down and starts a completely new one.
+            """
+        ),
+    ).tag(config=True)
+
+    warmup_code = Unicode(
+        "",
+        help=dedent(
+            """
+            Code that is executed in every kernel after it was (re-)started,
+            e.g. 'import numpy, pandas' to pay the import cost before the
+            kernel is leased. It should not define any state the graded
+            notebook could depend on.
+            """
+        ),
+    ).tag(config=True)
+
+    env = Dict(
+        {"NBGRADER_EXECUTION": "autograde"},
+        help="Environment variables added to the environment of pooled kernels.",
+    ).tag(config=True)
+
+    extra_arguments = List(
+        ["--HistoryManager.hist_file=:memory:"],
+        help="Extra arguments passed to IPython kernels started by the pool.",
+    ).tag(config=True)
+
+    startup_timeout = Integer(
+        60, help="Time in seconds to wait for a pooled kernel to become ready."
+    ).tag(config=True)
+
+    prestart_keys = List(
+        Unicode(),
+        default_value=[],
+        help=dedent(
+            """
+            Keys, e.g. the lecture codes used by LocalAutogradeExecutor.use_kernel_pool,
+            for which kernels are started when a grading worker process starts, so the
+            first submissions do not wait for a cold kernel start.
+            """
+        ),
+    ).tag(config=True)
+
+    prestart_kernel_name = Unicode(
+        "python3", help="Name of the kernelspec of the kernels started for prestart_keys."
+    ).tag(config=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._idle: TDict[Tuple[str, str], TList[_PooledKernel]] = {}
+        self._pending: TDict[Tuple[str, str], TList[Future]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kernel-pool")
+        self._spec_manager = KernelSpecManager()
+        self._languages: TDict[str, Optional[str]] = {}
+
+    def supports(self, kernel_name: str) -> bool:
+        """
+        Only python kernels can be pooled because the working directory of a
+        leased kernel has to be changed before the notebook is executed.
+        """
+        if kernel_name not in self._languages:
+            try:
+                spec = self._spec_manager.get_kernel_spec(kernel_name)
+                self._languages[kernel_name] = spec.language
+            except NoSuchKernel:
+                self._languages[kernel_name] = None
+        language = self._languages[kernel_name]
+        return language is not None and language.lower() == "python"
+
+    def acquire(self, kernel_name: str, key: str = "") -> AsyncKernelManager:
+        """
+        Leases a running kernel. Idle kernels are health checked before they
+        are handed out. If no idle kernel is available, a kernel that is
+        currently being recycled is awaited, otherwise a new kernel is started.
+        :param kernel_name: The name of the kernelspec.
+        :param key: Additional key to separate kernels, e.g. of different lectures.
+        :return: The kernel manager of a running kernel.
+        """
+        pool_key = (kernel_name, key)
+        self.evict_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(pool_key, [])
+                pooled = idle.pop() if idle else None
+                pending = list(self._pending.get(pool_key, []))
+            if pooled is not None:
+                if run_sync(pooled.km.is_alive)():
+                    self.log.debug("Leasing pooled kernel %s for key %s", kernel_name, key)
+                    return pooled.km
+                self.log.warning("Discarding dead pooled kernel %s", kernel_name)
+                self._shutdown(pooled.km)
+                continue
+            if pending:
+                # a recycled kernel is ready sooner than a cold start
+                for future in pending:
+                    future.result()
+                continue
+            self.log.info("Kernel pool is empty for %s, starting new kernel", pool_key)
+            return self._start(kernel_name)
+
+    def release(self, km: AsyncKernelManager, kernel_name: str, key: str = "") -> None:
+        """
+        Returns a leased kernel to the pool. The kernel is restarted or replaced
+        in the background before it can be leased again.
+        :param km: The kernel manager returned by :meth:`acquire`.
+        :param kernel_name: The name of the kernelspec used for :meth:`acquire`.
+        :param key: The key used for :meth:`acquire`.
+        """
+        pool_key = (kernel_name, key)
+        with self._lock:
+            full = (len(self._idle.get(pool_key, [])) + len(self._pending.get(pool_key, []))
+                    >= self.max_kernels_per_key) or self._size() >= self.max_kernels
+            if not full:
+                self._schedule_recycle(km, pool_key)
+        if full:
+            self._executor.submit(self._shutdown, km)
+
+    def prestart(self, kernel_name: str, key: str = "", n: Optional[int] = None) -> None:
+        """
+        Starts kernels in the background until ``n`` (default: max_kernels_per_key)
+        idle kernels exist for the given kernel name and key.
+        """
+        pool_key = (kernel_name, key)
+        n = self.max_kernels_per_key if n is None else min(n, self.max_kernels_per_key)
+        with self._lock:
+            missing = n - len(self._idle.get(pool_key, [])) - len(self._pending.get(pool_key, []))
+            for _ in range(max(0, min(missing, self.max_kernels - self._size()))):
+                self._schedule_recycle(None, pool_key)
+
+    def prestart_configured(self) -> None:
+        """Starts kernels in the background for all prestart_keys."""
+        for key in self.prestart_keys:
+            self.log.info("Prestarting kernels %s for key %s", self.prestart_kernel_name, key)
+            self.prestart(self.prestart_kernel_name, key)
+
+    def evict_idle(self) -> None:
+        """Shuts down all kernels that were not used for longer than idle_timeout."""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for pool_key, idle in self._idle.items():
+                keep = [p for p in idle if now - p.last_used <= self.idle_timeout]
+                evicted.extend(p for p in idle if now - p.last_used > self.idle_timeout)
+                self._idle[pool_key] = keep
+        for pooled in evicted:
+            self.log.info("Evicting idle kernel %s", pooled.key)
+            self._shutdown(pooled.km)
+
+    def shutdown_all(self) -> None:
+        """Waits for pending recycles and shuts down all idle kernels."""
+        with self._lock:
+            pending = [f for futures in self._pending.values() for f in futures]
+        for future in pending:
+            future.result()
+        with self._lock:
+            idle = [p for kernels in self._idle.values() for p in kernels]
+            self._idle.clear()
+        for pooled in idle:
+            self._shutdown(pooled.km)
+
+    def _size(self) -> int:
+        return (sum(len(k) for k in self._idle.values())
+                + sum(len(f) for f in self._pending.values()))
+
+    def _schedule_recycle(self, km: Optional[AsyncKernelManager], pool_key: Tuple[str, str]) -> None:
+        # has to be called while holding the lock
+        future = Future()
+        self._pending.setdefault(pool_key, []).append(future)
+        self._executor.submit(self._recycle, km, pool_key, future)
+
+    def _recycle(self, km: Optional[AsyncKernelManager], pool_key: Tuple[str, str],
+                 future: Future) -> None:
+        try:
+            if km is not None and self.recycle == "restart" and run_sync(km.is_alive)():
+                run_sync(km.restart_kernel)(now=True)
+            else:
+                if km is not None:
+                    self._shutdown(km)
+                km = self._start(pool_key[0])
+            if self.warmup_code:
+                run_sync(self._async_execute)(km, self.warmup_code)
+            with self._lock:
+                self._idle.setdefault(pool_key, []).append(_PooledKernel(km=km, key=pool_key))
+        except Exception:
+            self.log.error("Could not recycle kernel %s", pool_key, exc_info=True)
+            if km is not None:
+                self._shutdown(km)
+        finally:
+            with self._lock:
+                self._pending[pool_key].remove(future)
+            future.set_result(None)
+
+    def _start(self, kernel_name: str) -> AsyncKernelManager:
+        km = AsyncKernelManager(kernel_name=kernel_name, parent=self)
+        env = os.environ.copy()
+        env.update(self.env)
+        extra_arguments = list(self.extra_arguments) if km.ipykernel else []
+        run_sync(km.start_kernel)(extra_arguments=extra_arguments, env=env)
+        return km
+
+    def _shutdown(self, km: AsyncKernelManager) -> None:
+        try:
+            run_sync(km.shutdown_kernel)(now=True)
+        except Exception:
+            self.log.debug("Could not shut down kernel", exc_info=True)
+        finally:
+            run_sync(km.cleanup_resources)()
+
+    async def _async_execute(self, km: AsyncKernelManager, code: str) -> None:
+        kc = km.client()
+        kc.start_channels()
+        try:
+            await kc.wait_for_ready(timeout=self.startup_timeout)
+            await kc.execute_interactive(code, silent=True, store_history=False,
+                                         timeout=self.startup_timeout,
+                                         output_hook=lambda msg: None)
+        finally:
+            kc.stop_channels()
@@ -1,8 +1,11 @@
 
 
+from nbconvert.exporters.exporter import ResourcesDict
 from nbconvert.preprocessors import Preprocessor
 from traitlets import Bool, List, Unicode
 
+from grader_service.convert.gradebook.gradebook import Gradebook
+
 
 class NbGraderPreprocessor(Preprocessor):
 
@@ -21,3 +24,13 @@ class NbGraderPreprocessor(Preprocessor):
     enabled = Bool(
         True, help="Whether to use this preprocessor when running nbgrader"
     ).tag(config=True)
+
+    def _get_gradebook(self, resources: ResourcesDict) -> Gradebook:
+        """
+        Returns the gradebook session of the converter if one was passed in the
+        resources, otherwise the gradebook is loaded from the output JSON path.
+        """
+        gradebook = resources.get("gradebook", None)
+        if gradebook is None:
+            gradebook = Gradebook(resources["output_json_path"])
+        return gradebook
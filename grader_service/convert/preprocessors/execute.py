@@ -1,6 +1,8 @@
 
 
+import time
 import typing as t
+from queue import Empty
 from textwrap import dedent
 from typing import Any, Optional, Tuple
 
@@ -10,8 +12,10 @@ from nbclient.exceptions import CellTimeoutError
 from nbconvert.exporters.exporter import ResourcesDict
 from nbconvert.preprocessors import CellExecutionError, ExecutePreprocessor
 from nbformat.notebooknode import NotebookNode
-from traitlets import Bool, Integer, List
+from traitlets import Bool, Dict, Float, Integer, List, Unicode
 
+from grader_service.convert import utils
+from grader_service.convert.kernelpool import KernelPool
 from grader_service.convert.preprocessors.base import NbGraderPreprocessor
 
 
@@ -19,6 +23,11 @@ class UnresponsiveKernelError(Exception):
     pass
 
 
+# peak resident set size of a python kernel in bytes, ru_maxrss is in bytes on macOS and kilobytes elsewhere
+_KERNEL_MEMORY_EXPRESSION = ("__import__('resource').getrusage(__import__('resource').RUSAGE_SELF).ru_maxrss"
+                             " * (1 if __import__('sys').platform == 'darwin' else 1024)")
+
+
 class Execute(NbGraderPreprocessor, ExecutePreprocessor):
     interrupt_on_timeout = Bool(True)
     allow_errors = Bool(True)
@@ -45,6 +54,47 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
         ),
     ).tag(config=True)
 
+    use_kernel_pool = Bool(
+        False,
+        help=dedent(
+            """
+        Whether to lease an already running kernel from the :class:`KernelPool`
+        of the current process instead of starting a new kernel for every notebook.
+        Only python kernels are pooled.
+        """
+        ),
+    ).tag(config=True)
+
+    kernel_pool_key = Unicode(
+        "",
+        help="Key used to separate pooled kernels, e.g. by lecture or image.",
+    ).tag(config=True)
+
+    cell_timeouts = Dict(
+        value_trait=Float(),
+        help=dedent(
+            """
+        Timeouts in seconds of grade cells by "<notebook id>/<grade id>" that override
+        the timeout, e.g. the adaptive timeouts derived from previous execution times.
+        """
+        ),
+    ).tag(config=True)
+
+    record_kernel_memory = Bool(
+        False,
+        help=dedent(
+            """
+        Whether the peak memory of the kernel is requested after every grade cell.
+        Only supported by python kernels, other kernels report no memory.
+        """
+        ),
+    ).tag(config=True)
+
+    kernel_memory_timeout = Integer(
+        5,
+        help="Time in seconds to wait for the kernel to report its memory.",
+    ).tag(config=True)
+
     def preprocess(
             self, nb: NotebookNode, resources: ResourcesDict, retries: Optional[Any] = None
     ) -> Tuple[NotebookNode, ResourcesDict]:
@@ -55,17 +105,89 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
 
         if retries is None:
             retries = self.execute_retries
+
+        km = None
+        kernel_name = self.kernel_name or nb.metadata.get("kernelspec", {}).get("name", "")
+        if self.use_kernel_pool and KernelPool.instance().supports(kernel_name):
+            km = KernelPool.instance().acquire(kernel_name, key=self.kernel_pool_key)
         try:
-            output = super(Execute, self).preprocess(nb, resources)
+            output = super(Execute, self).preprocess(nb, resources, km=km)
         except RuntimeError:
             if retries == 0:
                 raise UnresponsiveKernelError()
             else:
                 self.log.warning("Failed to execute notebook, trying again...")
                 return self.preprocess(nb, resources, retries=retries - 1)
+        finally:
+            if km is not None:
+                if self.kc is not None:
+                    self.kc.stop_channels()
+                    self.kc = None
+                KernelPool.instance().release(km, kernel_name, key=self.kernel_pool_key)
 
         return output
 
+    async def async_start_new_kernel_client(self):
+        kc = await super().async_start_new_kernel_client()
+        path = self.resources.get("metadata", {}).get("path")
+        if not self.owns_km and path:
+            # pooled kernels were started before the output directory was known
+            await kc.execute_interactive(f"import os as __os; __os.chdir({path!r}); del __os",
+                                         silent=True, store_history=False,
+                                         timeout=self.startup_timeout,
+                                         output_hook=lambda msg: None)
+        return kc
+
+    start_new_kernel_client = run_sync(async_start_new_kernel_client)
+
+    async def async_execute_cell(
+            self, cell: NotebookNode, cell_index: int, execution_count: t.Optional[int] = None,
+            store_history: bool = True
+    ) -> NotebookNode:
+        if not utils.is_grade(cell):
+            return await super().async_execute_cell(cell, cell_index, execution_count, store_history)
+        # the execution time and memory of grade cells are stored in the gradebook by SaveAutoGrades
+        grade_id = cell.metadata["nbgrader"]["grade_id"]
+        nbgrader = self.resources.setdefault("nbgrader", {})
+        start = time.monotonic()
+        try:
+            return await super().async_execute_cell(cell, cell_index, execution_count, store_history)
+        finally:
+            nbgrader.setdefault("execution_times", {})[grade_id] = time.monotonic() - start
+            if self.record_kernel_memory:
+                nbgrader.setdefault("kernel_memory", {})[grade_id] = await self._async_get_kernel_memory()
+
+    execute_cell = run_sync(async_execute_cell)
+
+    async def _async_get_kernel_memory(self) -> t.Optional[int]:
+        """Returns the peak resident set size of the kernel in bytes or None if it is not reported."""
+        if self.kc is None:
+            return None
+        msg_id = await ensure_async(self.kc.execute("", silent=True, store_history=False,
+                                                    user_expressions={"memory": _KERNEL_MEMORY_EXPRESSION}))
+        deadline = time.monotonic() + self.kernel_memory_timeout
+        while time.monotonic() < deadline:
+            try:
+                msg = await ensure_async(self.kc.shell_channel.get_msg(timeout=self.shell_timeout_interval))
+            except Empty:
+                continue
+            if msg["parent_header"].get("msg_id") != msg_id:
+                continue
+            result = msg["content"].get("user_expressions", {}).get("memory", {})
+            try:
+                return int(result["data"]["text/plain"])
+            except (KeyError, TypeError, ValueError):
+                return None
+        self.log.warning("Kernel did not report its memory")
+        return None
+
+    def _get_timeout(self, cell: t.Optional[NotebookNode]) -> t.Optional[int]:
+        if cell is not None and self.cell_timeouts and utils.is_grade(cell):
+            key = f"{self.resources.get('unique_key')}/{cell.metadata['nbgrader']['grade_id']}"
+            if key in self.cell_timeouts:
+                return self.cell_timeouts[key]
+        return super()._get_timeout(cell)
+
     async def _async_handle_timeout(self, timeout: int, cell: t.Optional[NotebookNode] = None) -> None:
         await super()._async_handle_timeout(timeout, cell)
 
@@ -73,5 +195,5 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
         error_output.ename = "CellTimeoutError"
         error_output.evalue = "CellTimeoutError"
         error_output.traceback = [
-            f"CellTimeoutInterrupt: Cell execution timed out after maximum execution time of {self.timeout} seconds."]
+            f"CellTimeoutInterrupt: Cell execution timed out after maximum execution time of {timeout:g} seconds."]
         cell.outputs.append(error_output)
@@ -6,7 +6,6 @@ from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
 from traitlets import List
 
-from grader_service.convert.gradebook.gradebook import Gradebook
 from grader_service.convert import utils
 from grader_service.convert.preprocessors.base import NbGraderPreprocessor
 
@@ -36,7 +35,7 @@ class GetGrades(NbGraderPreprocessor):
         self.json_path = resources["output_json_path"]
 
         # connect to the database
-        self.gradebook = Gradebook(self.json_path)
+        self.gradebook = self._get_gradebook(resources)
 
         with self.gradebook:
             # process the cells
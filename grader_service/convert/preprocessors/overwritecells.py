@@ -7,7 +7,7 @@ from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
 from traitlets import Bool, Unicode
 
-from grader_service.convert.gradebook.gradebook import Gradebook, MissingEntry
+from grader_service.convert.gradebook.gradebook import MissingEntry
 from grader_service.convert import utils
 from grader_service.convert.nbgraderformat import MetadataValidator
 from grader_service.convert.preprocessors.base import NbGraderPreprocessor
@@ -41,7 +41,7 @@ class OverwriteCells(NbGraderPreprocessor):
         # pull information from the resources
         self.notebook_id = resources["unique_key"]
         self.json_path = resources["output_json_path"]
-        self.gradebook = Gradebook(self.json_path)
+        self.gradebook = self._get_gradebook(resources)
 
         with self.gradebook:
             nb, resources = super(OverwriteCells, self).preprocess(nb, resources)      
@@ -6,7 +6,6 @@ from typing import Tuple
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
 
-from grader_service.convert.gradebook.gradebook import Gradebook
 from grader_service.convert.preprocessors.base import NbGraderPreprocessor
 
 
@@ -20,7 +19,7 @@ class OverwriteKernelspec(NbGraderPreprocessor):
         self.notebook_id = resources["unique_key"]
         self.json_path = resources["output_json_path"]
 
-        with Gradebook(self.json_path) as gb:
+        with self._get_gradebook(resources) as gb:
             kernelspec = json.loads(gb.find_notebook(self.notebook_id).kernelspec)
             self.log.debug("Source notebook kernelspec: {}".format(kernelspec))
             self.log.debug(
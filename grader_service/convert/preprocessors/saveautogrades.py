@@ -5,7 +5,6 @@ from typing import Tuple
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
 
-from grader_service.convert.gradebook.gradebook import Gradebook
 from grader_service.convert import utils
 from grader_service.convert.preprocessors.base import NbGraderPreprocessor
 
@@ -19,7 +18,7 @@ class SaveAutoGrades(NbGraderPreprocessor):
         # pull information from the resources
         self.notebook_id = resources["unique_key"]
         self.json_path = resources["output_json_path"]
-        self.gradebook = Gradebook(self.json_path)
+        self.gradebook = self._get_gradebook(resources)
 
         with self.gradebook:
             # process the cells
@@ -45,6 +44,12 @@ class SaveAutoGrades(NbGraderPreprocessor):
         auto_score, _ = utils.determine_grade(cell, self.log)
         grade.auto_score = auto_score
 
+        # recorded by the Execute preprocessor
+        grade_id = cell.metadata["nbgrader"]["grade_id"]
+        nbgrader = resources.get("nbgrader", {})
+        grade.execution_time = nbgrader.get("execution_times", {}).get(grade_id)
+        grade.kernel_memory = nbgrader.get("kernel_memory", {}).get(grade_id)
+
         # if there was previously a manual grade, or if there is no autograder
         # score, then we should mark this as needing review
         if (grade.manual_score is not None) or (grade.auto_score is None):
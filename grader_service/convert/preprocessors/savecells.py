@@ -6,7 +6,7 @@ from typing import Tuple
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
 
-from grader_service.convert.gradebook.gradebook import Gradebook, MissingEntry
+from grader_service.convert.gradebook.gradebook import MissingEntry
 from grader_service.convert.gradebook.models import GradeCell, SolutionCell, SourceCell, TaskCell
 from grader_service.convert import utils
 from grader_service.convert.preprocessors.base import NbGraderPreprocessor
@@ -108,7 +108,7 @@ class SaveCells(NbGraderPreprocessor):
         self.new_source_cells = {}
 
         # connect to the database
-        self.gradebook = Gradebook(self.json_path)
+        self.gradebook = self._get_gradebook(resources)
 
         with self.gradebook:
             nb, resources = super(SaveCells, self).preprocess(nb, resources)
@@ -5,6 +5,7 @@ import fnmatch
 import glob
 import hashlib
 import io
+import json
 import logging
 import os
 import shutil
@@ -192,6 +193,54 @@ def compute_checksum(cell: NotebookNode) -> str:
     return m.hexdigest()
 
 
+def compute_notebook_checksum(nb: NotebookNode, *extra: str) -> str:
+    """
+    Computes a checksum over the kernel and the type, source and nbgrader
+    metadata of all cells of a notebook. Outputs are not included, so the
+    checksum of a sanitized notebook identifies what the autograder executes.
+    :param nb: The notebook.
+    :param extra: Additional strings the checksum depends on.
+    :return: The hex digest.
+    """
+    m = hashlib.sha256()
+    m.update(to_bytes(nb.metadata.get("kernelspec", {}).get("name", "")))
+    for cell in nb.cells:
+        m.update(b"\0")
+        m.update(to_bytes(cell.cell_type))
+        m.update(b"\0")
+        m.update(to_bytes(cell.source))
+        m.update(b"\0")
+        m.update(to_bytes(json.dumps(cell.metadata.get("nbgrader", {}), sort_keys=True)))
+    for e in extra:
+        m.update(b"\0")
+        m.update(to_bytes(e))
+    return m.hexdigest()
+
+
+def compute_directory_checksum(path: str, ignore: List[str]) -> str:
+    """
+    Computes a checksum over the relative paths and contents of all files in a directory.
+    :param path: The directory.
+    :param ignore: Glob patterns of file names or relative paths that are not included.
+    :return: The hex digest.
+    """
+    m = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            abs_path = os.path.join(root, file)
+            rel_path = os.path.relpath(abs_path, path)
+            if any(fnmatch.fnmatch(file, p) or fnmatch.fnmatch(rel_path, p) for p in ignore):
+                continue
+            m.update(to_bytes(rel_path))
+            m.update(b"\0")
+            with open(abs_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    m.update(chunk)
+            m.update(b"\0")
+    return m.hexdigest()
+
+
 def parse_utc(ts: Union[datetime, str]) -> datetime:
     """Parses a timestamp into datetime format, converting it to UTC if necessary."""
     if ts is None:
@@ -999,6 +999,9 @@ class RequestHandlerConfig(SingletonConfigurable):
                                     klass=object,
                                     allow_none=False, config=True)
 
+    # number of submissions of a bulk regrade that are graded at the same time
+    bulk_grading_parallelism = Integer(8, allow_none=False, config=True)
+
     # Git server file policy defaults
     git_max_file_size_mb = Integer(80, allow_none=False, config=True)
     git_max_file_count = Integer(512, allow_none=False, config=True)
@@ -6,15 +6,20 @@
 from http import HTTPStatus
 
 import celery
+import tornado
+from sqlalchemy.sql.expression import func
 from tornado.web import HTTPError
 
 from .handler_utils import parse_ids
+from grader_service.autograding.dedup import AUTOGRADE, FEEDBACK, TaskDeduplicator
+from grader_service.orm.base import DeleteState
+from grader_service.orm.grading_job import GradingJob
 from grader_service.orm.submission import Submission
 from grader_service.orm.takepart import Scope
 from grader_service.registry import VersionSpecifier, register_handler
 from grader_service.autograding.celery.tasks import autograde_task, generate_feedback_task, lti_sync_task
 
-from grader_service.handlers.base_handler import GraderBaseHandler, authorize
+from grader_service.handlers.base_handler import GraderBaseHandler, authorize, RequestHandlerConfig
 
 
 @register_handler(
@@ -49,18 +54,24 @@ class GradingAutoHandler(GraderBaseHandler):
         """
         lecture_id, assignment_id, sub_id = parse_ids(
             lecture_id, assignment_id, sub_id)
-        self.validate_parameters()
+        self.validate_parameters("bypass-cache")
+        bypass_cache = self.get_argument("bypass-cache", "false") == "true"
         submission = self.get_submission(lecture_id, assignment_id, sub_id)
         submission.auto_status = "pending"
         if submission.feedback_status == "generated":
             submission.feedback_status = "feedback_outdated"
         self.session.commit()
+        started = TaskDeduplicator.instance().acquire(self.session, AUTOGRADE, submission)
 
         submission = self.session.query(Submission).get(sub_id)
 
-        autograde_task.delay(lecture_id, assignment_id, sub_id)
-        self.set_status(HTTPStatus.ACCEPTED,
-                        reason="Autograding submission process started")
+        if started:
+            autograde_task.delay(lecture_id, assignment_id, sub_id, bypass_cache=bypass_cache)
+            self.set_status(HTTPStatus.ACCEPTED,
+                            reason="Autograding submission process started")
+        else:
+            self.set_status(HTTPStatus.ACCEPTED,
+                            reason="Autograding submission process already in progress")
 
         self.write_json(submission)
 
@@ -103,12 +114,138 @@ class GenerateFeedbackHandler(GraderBaseHandler):
         submission.feedback_status = "generating"
         self.session.commit()
 
-        # use immutable signature: https://docs.celeryq.dev/en/stable/reference/celery.app.task.html#celery.app.task.Task.si
-        generate_feedback_chain = celery.chain(
-            generate_feedback_task.si(lecture_id, assignment_id, sub_id),
-            lti_sync_task.si(lecture_id, assignment_id, sub_id, sync_on_feedback=True)
-        )
-        generate_feedback_chain()
-
-        self.set_status(HTTPStatus.ACCEPTED, reason="Generating feedback process started")
+        if TaskDeduplicator.instance().acquire(self.session, FEEDBACK, submission):
+            # use immutable signature: https://docs.celeryq.dev/en/stable/reference/celery.app.task.html#celery.app.task.Task.si
+            generate_feedback_chain = celery.chain(
+                generate_feedback_task.si(lecture_id, assignment_id, sub_id),
+                lti_sync_task.si(lecture_id, assignment_id, sub_id, sync_on_feedback=True)
+            )
+            generate_feedback_chain()
+            self.set_status(HTTPStatus.ACCEPTED, reason="Generating feedback process started")
+        else:
+            self.set_status(HTTPStatus.ACCEPTED, reason="Generating feedback process already in progress")
         self.write_json(submission)
+
+
+@register_handler(
+    path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments' +
+         r'\/(?P<assignment_id>\d*)\/grading\/auto\/?',
+    version_specifier=VersionSpecifier.ALL,
+)
+class BulkGradingAutoHandler(GraderBaseHandler):
+    """
+    Tornado Handler class for http requests to
+    /lectures/{lecture_id}/assignments/{assignment_id}/grading/auto.
+    """
+
+    @authorize([Scope.tutor, Scope.instructor])
+    async def post(self, lecture_id: int, assignment_id: int):
+        """
+        Starts a grading job that autogrades the submissions of an assignment.
+        The body can contain the submission filter ('latest', 'best' or 'all'),
+        explicit submission ids, whether the grades are synced with LTI
+        after the job is complete and whether the result cache is bypassed.
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :raises HTTPError: throws err if the body is invalid or no submissions were found
+        """
+        lecture_id, assignment_id = parse_ids(lecture_id, assignment_id)
+        self.validate_parameters()
+        assignment = self.get_assignment(lecture_id, assignment_id)
+        try:
+            body = tornado.escape.json_decode(self.request.body) if self.request.body else {}
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, reason="Body has to be valid JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, reason="Body has to be a JSON object")
+        submission_filter = body.get("filter", "latest")
+        if submission_filter not in ["latest", "best", "all"]:
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            reason="Filter has to be either 'latest', 'best' or 'all'")
+
+        query = self.session.query(Submission).filter(
+            Submission.assignid == assignment.id,
+            Submission.deleted == DeleteState.active)
+        if body.get("ids") is not None:
+            try:
+                if not isinstance(body["ids"], list):
+                    raise TypeError
+                ids = [int(i) for i in body["ids"]]
+            except (TypeError, ValueError):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, reason="IDs have to be a list of numerical IDs")
+            query = query.filter(Submission.id.in_(ids))
+        elif submission_filter != "all":
+            # exactly one submission per user, ties are broken by the latest submission
+            order = [Submission.date.desc(), Submission.id.desc()]
+            if submission_filter == "best":
+                order.insert(0, Submission.score.desc().nullslast())
+            subquery = (self.session.query(
+                Submission.id,
+                func.row_number().over(partition_by=Submission.username, order_by=order).label("rank"))
+                        .filter(Submission.assignid == assignment.id,
+                                Submission.deleted == DeleteState.active)
+                        .subquery())
+            query = query.join(subquery, (Submission.id == subquery.c.id) & (subquery.c.rank == 1))
+        submissions = query.order_by(Submission.id).all()
+        if len(submissions) == 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, reason="No submissions to grade")
+
+        for submission in submissions:
+            submission.auto_status = "pending"
+            if submission.feedback_status == "generated":
+                submission.feedback_status = "feedback_outdated"
+        job = GradingJob(assignid=assignment.id, username=self.user.name,
+                         sync_lti=bool(body.get("sync_lti", False)), total=len(submissions),
+                         running=0, succeeded=0, failed=0)
+        self.session.add(job)
+        self.session.commit()
+
+        # the submissions are graded in parallel chains to bound the number of running tasks
+        bypass_cache = bool(body.get("bypass_cache", False))
+        parallelism = max(1, RequestHandlerConfig.instance().bulk_grading_parallelism)
+        chains = [
+            celery.chain(*[autograde_task.si(lecture_id, assignment_id, s.id,
+                                             bypass_cache=bypass_cache, job_id=job.id)
+                           for s in submissions[i::parallelism]])
+            for i in range(min(parallelism, len(submissions)))
+        ]
+        celery.group(chains)()
+
+        self.set_status(HTTPStatus.ACCEPTED, reason="Grading job started")
+        self.write_json(job)
+
+
+@register_handler(
+    path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments' +
+         r'\/(?P<assignment_id>\d*)\/grading\/jobs\/(?P<job_id>\d*)\/?',
+    version_specifier=VersionSpecifier.ALL,
+)
+class GradingJobHandler(GraderBaseHandler):
+    """
+    Tornado Handler class for http requests to
+    /lectures/{lecture_id}/assignments/{assignment_id}/grading/jobs/{job_id}.
+    """
+
+    @authorize([Scope.tutor, Scope.instructor])
+    async def get(self, lecture_id: int, assignment_id: int, job_id: int):
+        """
+        Returns the progress of a grading job.
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :param job_id: id of the grading job
+        :type job_id: int
+        :raises HTTPError: throws err if the grading job was not found
+        """
+        lecture_id, assignment_id, job_id = parse_ids(lecture_id, assignment_id, job_id)
+        self.validate_parameters()
+        assignment = self.get_assignment(lecture_id, assignment_id)
+        job = self.session.query(GradingJob).get(job_id)
+        if job is None or job.assignid != assignment.id:
+            raise HTTPError(HTTPStatus.NOT_FOUND, reason="Grading job was not found")
+        self.write_json(job)
@@ -27,12 +27,16 @@ from grader_service.orm.assignment import Assignment
 from grader_service.orm.lecture import Lecture
 from grader_service.orm.submission import Submission
 from grader_service.orm.submission_logs import SubmissionLogs
+from grader_service.orm.submission_metrics import PHASES, SubmissionMetrics
 from grader_service.orm.submission_properties import SubmissionProperties
 from grader_service.orm.takepart import Role, Scope
 from grader_service.registry import VersionSpecifier, register_handler
 from sqlalchemy.sql.expression import func
 from tornado.web import HTTPError
 from grader_service.convert.gradebook.models import GradeBookModel
+from grader_service.autograding.admission import AdmissionController
+from grader_service.autograding.celery.app import CeleryApp
+from grader_service.autograding.dedup import AUTOGRADE, TaskDeduplicator
 from grader_service.autograding.celery.tasks import autograde_task, generate_feedback_task, lti_sync_task
 
 from grader_service.handlers.base_handler import GraderBaseHandler, authorize, \
@@ -267,6 +271,14 @@ class SubmissionHandler(GraderBaseHandler):
                 raise HTTPError(HTTPStatus.CONFLICT, reason="Maximum number \
                 of submissions reached!")
 
+        automatic_grading = assignment.automatic_grading
+        admission = AdmissionController.instance()
+        throttle_reason = None
+        if automatic_grading in [AutoGradingBehaviour.auto, AutoGradingBehaviour.full_auto] \
+                and role.role < Scope.tutor:
+            # the submission is recorded in any case, only its grading is throttled
+            throttle_reason = admission.admit(self.session, assignment, role.username)
+
         submission = Submission()
         submission.assignid = assignment.id
         submission.date = submission_ts
@@ -296,8 +308,6 @@ class SubmissionHandler(GraderBaseHandler):
         submission.manual_status = "not_graded"
         submission.feedback_status = "not_generated"
 
-        automatic_grading = assignment.automatic_grading
-
         self.session.add(submission)
         self.session.commit()
         self.set_status(HTTPStatus.CREATED)
@@ -308,22 +318,45 @@ class SubmissionHandler(GraderBaseHandler):
         if automatic_grading in [AutoGradingBehaviour.auto,
                                  AutoGradingBehaviour.full_auto]:
             submission.auto_status = "pending"
+            # the lock records whether the grading task has started
+            TaskDeduplicator.instance().register(self.session, AUTOGRADE, submission)
+            admission.supersede(self.session, submission)
             self.session.commit()
             self.set_status(HTTPStatus.ACCEPTED)
+            if throttle_reason is None:
+                # new submissions are graded before regrades of instructors
+                options = CeleryApp.instance().submission_options
+            else:
+                self.log.info(f"Delaying the grading of submission {submission.id} by "
+                              f"{admission.throttle_delay}s: {throttle_reason}")
+                options = {}
 
             if automatic_grading == AutoGradingBehaviour.full_auto:
                 submission.feedback_status = "generating"
                 self.session.commit()
 
                 # use immutable signature: https://docs.celeryq.dev/en/stable/reference/celery.app.task.html#celery.app.task.Task.si
-                grading_chain = chain(
-                    autograde_task.si(lecture_id, assignment_id, submission.id),
-                    generate_feedback_task.si(lecture_id, assignment_id, submission.id),
-                    lti_sync_task.si(lecture_id, assignment_id, submission.id, sync_on_feedback=True)
-                )
+                if CeleryApp.instance().fuse_feedback:
+                    # the feedback is generated from the autograding output in the same task
+                    grading_chain = chain(
+                        autograde_task.si(lecture_id, assignment_id, submission.id,
+                                          generate_feedback=True).set(**options),
+                        lti_sync_task.si(lecture_id, assignment_id, submission.id,
+                                         sync_on_feedback=True).set(**options)
+                    )
+                else:
+                    grading_chain = chain(
+                        autograde_task.si(lecture_id, assignment_id, submission.id).set(**options),
+                        generate_feedback_task.si(lecture_id, assignment_id, submission.id).set(**options),
+                        lti_sync_task.si(lecture_id, assignment_id, submission.id,
+                                         sync_on_feedback=True).set(**options)
+                    )
             else:
-                grading_chain = chain(autograde_task.si(lecture_id, assignment_id, submission.id))
-            grading_chain()
+                grading_chain = chain(autograde_task.si(lecture_id, assignment_id, submission.id).set(**options))
+            if throttle_reason is None:
+                grading_chain()
+            else:
+                grading_chain.apply_async(countdown=admission.throttle_delay)
 
         if automatic_grading == AutoGradingBehaviour.unassisted:
             self.session.close()
@@ -487,6 +520,213 @@ class SubmissionLogsHandler(GraderBaseHandler):
                             reason="Properties of submission were not found")
 
 
+@register_handler(
+    path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments\/' +
+         r'(?P<assignment_id>\d*)\/submissions\/(?P<submission_id>\d*)\/metrics\/?',
+    version_specifier=VersionSpecifier.ALL,
+)
+class SubmissionMetricsHandler(GraderBaseHandler):
+    @authorize([Scope.tutor, Scope.instructor])
+    async def get(self, lecture_id: int, assignment_id: int,
+                  submission_id: int):
+        """Returns the durations of the phases and the resource usage
+        of the last autograding job of a submission.
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :param submission_id: id of the submission
+        :type submission_id: int
+        :raises HTTPError: throws err if the submission metrics are not found
+        """
+        lecture_id, assignment_id, submission_id = parse_ids(
+            lecture_id, assignment_id, submission_id
+        )
+        self.validate_parameters()
+        self.get_submission(lecture_id, assignment_id, submission_id)
+        metrics = self.session.query(SubmissionMetrics).get(submission_id)
+        if metrics is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND,
+                            reason="Metrics of submission were not found")
+        self.write_json(metrics)
+
+
+@register_handler(
+    path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments\/' +
+         r'(?P<assignment_id>\d*)\/metrics\/?',
+    version_specifier=VersionSpecifier.ALL,
+)
+class AssignmentMetricsHandler(GraderBaseHandler):
+    @authorize([Scope.tutor, Scope.instructor])
+    async def get(self, lecture_id: int, assignment_id: int):
+        """Returns the number of autograded submissions of an assignment
+        with metrics and the mean and maximum of each metric.
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :raises HTTPError: throws err if the assignment was not found
+        """
+        lecture_id, assignment_id = parse_ids(lecture_id, assignment_id)
+        self.validate_parameters()
+        self.get_assignment(lecture_id, assignment_id)
+        columns = [f"{phase}_time" for phase in PHASES] + \
+                  ["total_time", "cpu_time", "peak_rss", "output_bytes"]
+        aggregates = []
+        for column in columns:
+            attr = getattr(SubmissionMetrics, column)
+            aggregates += [func.avg(attr), func.max(attr)]
+        row = (self.session.query(func.count(SubmissionMetrics.sub_id), *aggregates)
+               .join(Submission, Submission.id == SubmissionMetrics.sub_id)
+               .filter(Submission.assignid == assignment_id,
+                       Submission.deleted == DeleteState.active)
+               .one())
+        response = {"count": row[0]}
+        for i, column in enumerate(columns):
+            response[column] = {"mean": row[1 + 2 * i], "max": row[2 + 2 * i]}
+        self.write_json(response)
+
+
+@register_handler(
+    path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments\/' +
+         r'(?P<assignment_id>\d*)\/metrics\/cells\/?',
+    version_specifier=VersionSpecifier.ALL,
+)
+class AssignmentHotCellsHandler(GraderBaseHandler):
+    @authorize([Scope.tutor, Scope.instructor])
+    async def get(self, lecture_id: int, assignment_id: int):
+        """Returns the grade cells of an assignment that take the most
+        execution time summed over all automatically graded submissions,
+        with the number of executions, the mean and maximum execution time
+        and the maximum kernel memory. The number of returned cells is
+        limited by the query argument limit.
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :raises HTTPError: throws err if the assignment was not found
+        """
+        lecture_id, assignment_id = parse_ids(lecture_id, assignment_id)
+        self.validate_parameters("limit")
+        try:
+            limit = int(self.get_argument("limit", "10"))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, reason="Limit has to be an integer")
+        self.get_assignment(lecture_id, assignment_id)
+        properties = (self.session.query(SubmissionProperties.properties)
+                      .join(Submission, Submission.id == SubmissionProperties.sub_id)
+                      .filter(Submission.assignid == assignment_id,
+                              Submission.deleted == DeleteState.active,
+                              Submission.auto_status == "automatically_graded")
+                      .all())
+        cells = {}
+        for (gradebook_str,) in properties:
+            if not gradebook_str:
+                continue
+            gradebook = json.loads(gradebook_str)
+            for notebook_id, notebook in gradebook.get("notebooks", {}).items():
+                for grade_id, grade in notebook.get("grades_dict", {}).items():
+                    execution_time = grade.get("execution_time")
+                    if execution_time is None:
+                        continue
+                    cell = cells.setdefault((notebook_id, grade_id), {
+                        "notebook_id": notebook_id, "grade_id": grade_id, "count": 0,
+                        "total_time": 0.0, "max_time": 0.0, "max_kernel_memory": None})
+                    cell["count"] += 1
+                    cell["total_time"] += execution_time
+                    cell["max_time"] = max(cell["max_time"], execution_time)
+                    memory = grade.get("kernel_memory")
+                    if memory is not None:
+                        cell["max_kernel_memory"] = max(cell["max_kernel_memory"] or 0, memory)
+        total = sum(c["total_time"] for c in cells.values())
+        hot_cells = sorted(cells.values(), key=lambda c: c["total_time"], reverse=True)[:max(limit, 0)]
+        for cell in hot_cells:
+            cell["mean_time"] = cell["total_time"] / cell["count"]
+            cell["share"] = cell["total_time"] / total if total > 0 else None
+        self.write_json(hot_cells)
+
+
+@register_handler(
+    path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments\/' +
+         r'(?P<assignment_id>\d*)\/submissions\/(?P<submission_id>\d*)\/queue\/?',
+    version_specifier=VersionSpecifier.ALL,
+)
+class SubmissionQueueHandler(GraderBaseHandler):
+    @authorize([Scope.student, Scope.tutor, Scope.instructor])
+    async def get(self, lecture_id: int, assignment_id: int,
+                  submission_id: int):
+        """Returns the estimated position of a submission in the grading
+        queue and the expected time in seconds until it is graded.
+        Both are null if the submission is not waiting to be graded.
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :param submission_id: id of the submission
+        :type submission_id: int
+        :raises HTTPError: throws err if the submission was not found
+        """
+        lecture_id, assignment_id, submission_id = parse_ids(
+            lecture_id, assignment_id, submission_id
+        )
+        self.validate_parameters()
+        role = self.get_role(lecture_id)
+        submission = self.get_submission(lecture_id, assignment_id, submission_id)
+        if role.role == Scope.student and submission.username != self.user.name:
+            raise HTTPError(HTTPStatus.NOT_FOUND, reason="Submission was not found")
+        position, expected_wait = AdmissionController.instance().queue_position(
+            self.session, submission)
+        self.write_json({"position": position, "expected_wait": expected_wait})
+
+
+@register_handler(
+    path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments\/' +
+         r'(?P<assignment_id>\d*)\/submissions\/(?P<submission_id>\d*)\/logs\/tail\/?',
+    version_specifier=VersionSpecifier.ALL,
+)
+class SubmissionLogsTailHandler(GraderBaseHandler):
+    @authorize([Scope.tutor, Scope.instructor])
+    async def get(self, lecture_id: int, assignment_id: int,
+                  submission_id: int):
+        """Returns the logs of a submission that were written after the
+        offset given by the query argument, e.g. while it is graded.
+        The response contains the new logs, the offset of the first returned
+        character and the offset to request the next logs with. If the
+        requested logs are no longer available, the returned offset is larger
+        than the requested one. If the logs were replaced, they are returned
+        from the beginning.
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :param submission_id: id of the submission
+        :type submission_id: int
+        :raises HTTPError: throws err if the submission logs are not found
+        """
+        lecture_id, assignment_id, submission_id = parse_ids(
+            lecture_id, assignment_id, submission_id
+        )
+        self.validate_parameters("offset")
+        try:
+            offset = int(self.get_argument("offset", "0"))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, reason="Offset has to be an integer")
+        logs = self.session.query(SubmissionLogs).get(submission_id)
+        if logs is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND,
+                            reason="Logs of submission were not found")
+        text = logs.logs or ""
+        end = logs.offset + len(text)
+        if offset < logs.offset or offset > end:
+            offset = logs.offset
+        self.write_json({"logs": text[offset - logs.offset:], "offset": offset, "next_offset": end})
+
+
 @register_handler(
     path=r'\/lectures\/(?P<lecture_id>\d*)\/assignments\/' +
          r'(?P<assignment_id>\d*)\/submissions\/(?P<submission_id>\d*)\/' +
@@ -29,6 +29,8 @@ from grader_service.auth.auth import Authenticator
 # run __init__.py to register handlers
 from grader_service.auth.dummy import DummyAuthenticator
 from grader_service.handlers.base_handler import RequestHandlerConfig
+from grader_service.autograding.admission import AdmissionController
+from grader_service.autograding.dedup import TaskDeduplicator
 from grader_service.autograding.celery.app import CeleryApp
 from grader_service.handlers.static import CacheControlStaticFilesHandler, LogoHandler
 from grader_service.oauth2.provider import make_provider
@@ -319,6 +321,8 @@ class GraderService(config.Application):
         RequestHandlerConfig.config = self.config
         LTISyncGrades.config = self.config
         CeleryApp.instance(config=self.config)
+        AdmissionController.instance(config=self.config)
+        TaskDeduplicator.instance(config=self.config)
 
     async def cleanup(self):
         pass
@@ -0,0 +1,38 @@
+"""add_grading_job_table
+
+Revision ID: 5b8e0f4c1a2d
+Revises: e2a6c7b5d3f1
+Create Date: 2026-10-18 11:40:07.215836
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e0f4c1a2d'
+down_revision = 'e2a6c7b5d3f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('grading_job',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('assignid', sa.Integer(), nullable=False),
+                    sa.Column('username', sa.String(length=255), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('finished_at', sa.DateTime(), nullable=True),
+                    sa.Column('sync_lti', sa.Boolean(), nullable=False),
+                    sa.Column('total', sa.Integer(), nullable=False),
+                    sa.Column('running', sa.Integer(), nullable=False),
+                    sa.Column('succeeded', sa.Integer(), nullable=False),
+                    sa.Column('failed', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['assignid'], ['assignment.id'], ),
+                    sa.ForeignKeyConstraint(['username'], ['user.name'], ),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+
+
+def downgrade():
+    op.drop_table('grading_job')
@@ -0,0 +1,25 @@
+"""add_submission_metrics_failure_reason
+
+Revision ID: b7d2e9c4a615
+Revises: f3a81d6e2b94
+Create Date: 2026-10-18 18:41:07.215934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e9c4a615'
+down_revision = 'f3a81d6e2b94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('submission_metrics',
+                  sa.Column('failure_reason', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    op.drop_column('submission_metrics', 'failure_reason')
@@ -0,0 +1,33 @@
+"""add_task_lock_table
+
+Revision ID: c4d9a2f7e813
+Revises: 5b8e0f4c1a2d
+Create Date: 2026-10-18 13:05:44.918273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9a2f7e813'
+down_revision = '5b8e0f4c1a2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task_lock',
+                    sa.Column('task_type', sa.String(length=64), nullable=False),
+                    sa.Column('sub_id', sa.Integer(), nullable=False),
+                    sa.Column('version', sa.String(length=64), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('started_at', sa.DateTime(), nullable=True),
+                    sa.Column('rerun', sa.Boolean(), nullable=False),
+                    sa.ForeignKeyConstraint(['sub_id'], ['submission.id'], ),
+                    sa.PrimaryKeyConstraint('task_type', 'sub_id')
+                    )
+
+
+def downgrade():
+    op.drop_table('task_lock')
@@ -0,0 +1,25 @@
+"""add_submission_logs_offset
+
+Revision ID: e2a6c7b5d3f1
+Revises: a0718dae969d
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a6c7b5d3f1'
+down_revision = 'a0718dae969d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('submission_logs',
+                  sa.Column('offset', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('submission_logs', 'offset')
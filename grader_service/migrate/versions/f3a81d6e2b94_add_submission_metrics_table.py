@@ -0,0 +1,39 @@
+"""add_submission_metrics_table
+
+Revision ID: f3a81d6e2b94
+Revises: c4d9a2f7e813
+Create Date: 2026-10-18 14:22:19.530648
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a81d6e2b94'
+down_revision = 'c4d9a2f7e813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('submission_metrics',
+                    sa.Column('sub_id', sa.Integer(), nullable=False),
+                    sa.Column('pull_time', sa.Float(), nullable=True),
+                    sa.Column('gradebook_time', sa.Float(), nullable=True),
+                    sa.Column('execute_time', sa.Float(), nullable=True),
+                    sa.Column('set_properties_time', sa.Float(), nullable=True),
+                    sa.Column('push_time', sa.Float(), nullable=True),
+                    sa.Column('db_time', sa.Float(), nullable=True),
+                    sa.Column('total_time', sa.Float(), nullable=True),
+                    sa.Column('cpu_time', sa.Float(), nullable=True),
+                    sa.Column('peak_rss', sa.BigInteger(), nullable=True),
+                    sa.Column('output_bytes', sa.BigInteger(), nullable=True),
+                    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(['sub_id'], ['submission.id'], ),
+                    sa.PrimaryKeyConstraint('sub_id')
+                    )
+
+
+def downgrade():
+    op.drop_table('submission_metrics')
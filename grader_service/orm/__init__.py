@@ -14,6 +14,9 @@ from grader_service.orm.group import Group
 from grader_service.orm.oauthcode import OAuthCode
 from grader_service.orm.oauthclient import OAuthClient
 from grader_service.orm.api_token import APIToken
+from grader_service.orm.grading_job import GradingJob
+from grader_service.orm.task_lock import TaskLock
+from grader_service.orm.submission_metrics import SubmissionMetrics
 
 __all__ = ['Lecture', 'User', 'Role', 'Submission',
            'Assignment', 'Base', 'Group']
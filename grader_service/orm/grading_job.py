@@ -0,0 +1,53 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+
+from grader_service.orm.base import Base, Serializable
+
+
+class GradingJob(Base, Serializable):
+    """Progress of a bulk regrade of the submissions of an assignment."""
+    __tablename__ = "grading_job"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    assignid = Column(Integer, ForeignKey("assignment.id"), nullable=False)
+    username = Column(String(255), ForeignKey("user.name"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    sync_lti = Column(Boolean, default=False, nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    running = Column(Integer, default=0, nullable=False)
+    succeeded = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+
+    @property
+    def queued(self) -> int:
+        return self.total - self.running - self.succeeded - self.failed
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return "completed"
+        if self.queued < self.total:
+            return "running"
+        return "queued"
+
+    def serialize(self) -> dict:
+        return {
+            "id": self.id,
+            "assignid": self.assignid,
+            "username": self.username,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "status": self.status,
+            "total": self.total,
+            "queued": self.queued,
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
@@ -13,5 +13,7 @@ class SubmissionLogs(Base, Serializable):
     __tablename__ = "submission_logs"
     sub_id = Column(Integer, ForeignKey("submission.id"), primary_key=True)
     logs = Column(Text, nullable=True)
+    # number of characters that were dropped from the beginning of the logs
+    offset = Column(Integer, nullable=False, default=0, server_default="0")
 
     submission = relationship("Submission", back_populates="logs")
@@ -0,0 +1,47 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Float, ForeignKey, Integer, String
+
+from grader_service.orm.base import Base, Serializable
+
+# phases of an autograding job, stored in the <phase>_time columns
+PHASES = ("pull", "gradebook", "execute", "set_properties", "push", "db")
+
+
+class SubmissionMetrics(Base, Serializable):
+    """Timing and resource usage of the last autograding job of a submission."""
+    __tablename__ = "submission_metrics"
+    sub_id = Column(Integer, ForeignKey("submission.id"), primary_key=True)
+    # durations in seconds, None if the phase did not run
+    pull_time = Column(Float, nullable=True)
+    gradebook_time = Column(Float, nullable=True)
+    execute_time = Column(Float, nullable=True)
+    set_properties_time = Column(Float, nullable=True)
+    push_time = Column(Float, nullable=True)
+    db_time = Column(Float, nullable=True)
+    total_time = Column(Float, nullable=True)
+    # CPU time in seconds and peak resident set size in bytes of the execution
+    cpu_time = Column(Float, nullable=True)
+    peak_rss = Column(BigInteger, nullable=True)
+    output_bytes = Column(BigInteger, nullable=True)
+    # why the job failed, e.g. "memory_limit_exceeded", None if it succeeded
+    failure_reason = Column(String(255), nullable=True)
+    recorded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def serialize(self) -> dict:
+        return {
+            "sub_id": self.sub_id,
+            **{f"{phase}_time": getattr(self, f"{phase}_time") for phase in PHASES},
+            "total_time": self.total_time,
+            "cpu_time": self.cpu_time,
+            "peak_rss": self.peak_rss,
+            "output_bytes": self.output_bytes,
+            "failure_reason": self.failure_reason,
+            "recorded_at": self.recorded_at,
+        }
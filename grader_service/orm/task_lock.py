@@ -0,0 +1,32 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+
+from grader_service.orm.base import Base, Serializable
+
+
+class TaskLock(Base, Serializable):
+    """In-flight grading task of a submission, see :class:`TaskDeduplicator`."""
+    __tablename__ = "task_lock"
+    task_type = Column(String(64), primary_key=True)
+    sub_id = Column(Integer, ForeignKey("submission.id"), primary_key=True)
+    version = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    rerun = Column(Boolean, default=False, nullable=False)
+
+    def serialize(self) -> dict:
+        return {
+            "task_type": self.task_type,
+            "sub_id": self.sub_id,
+            "version": self.version,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "rerun": self.rerun,
+        }
@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from grader_service.autograding.kube import async_pods
+from grader_service.autograding.kube.async_pods import AsyncPodRunner
+from grader_service.autograding.log_buffer import LogBuffer
+
+
+class FakeAsyncApi:
+    """Pods reach their phase after two status reads."""
+
+    def __init__(self, phase="Succeeded"):
+        self.phase = phase
+        self.reads = {}
+        self.running = 0
+        self.max_running = 0
+        self.deleted = []
+
+    async def create_namespaced_pod(self, namespace, body):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.reads[body["metadata"]["name"]] = 0
+
+    async def read_namespaced_pod_status(self, name, namespace):
+        await asyncio.sleep(0.01)
+        self.reads[name] += 1
+        phase = self.phase if self.reads[name] >= 2 else "Running"
+        return SimpleNamespace(status=SimpleNamespace(phase=phase))
+
+    async def read_namespaced_pod_log(self, name, namespace, follow=False, _preload_content=True):
+        if follow:
+            return FakeLogStream([f"logs of {name}\n".encode()[:5], f"logs of {name}\n".encode()[5:]])
+        return f"logs of {name}\n"
+
+    async def delete_namespaced_pod(self, name, namespace):
+        self.running -= 1
+        self.deleted.append(name)
+
+
+class FakeLogStream:
+    def __init__(self, chunks):
+        self.content = self
+        self.chunks = chunks
+        self.released = False
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    def release(self):
+        self.released = True
+
+
+class FakeWatcher:
+    """A connected watch that reports the phase of every pod."""
+    connected = True
+
+    def __init__(self, phase):
+        self.phase = phase
+        self.forgotten = []
+
+    async def wait_async(self, name, timeout):
+        return self.phase
+
+    def forget(self, name):
+        self.forgotten.append(name)
+
+
+@pytest.fixture
+def runner():
+    runner = AsyncPodRunner(max_in_flight=2, poll_interval=0.01)
+    yield runner
+    runner.stop()
+
+
+def pod(name):
+    return {"metadata": {"name": name}}
+
+
+def test_run_returns_phase_and_logs(runner):
+    runner._api = FakeAsyncApi()
+    assert runner.run(pod("sub"), "ns") == ("Succeeded", "logs of sub", 0)
+    assert runner._api.deleted == ["sub"]
+
+
+def test_failed_pod_is_deleted(runner):
+    runner._api = FakeAsyncApi(phase="Failed")
+    assert runner.run(pod("sub"), "ns")[0] == "Failed"
+    assert runner._api.deleted == ["sub"]
+
+
+def test_in_flight_pods_are_limited(runner):
+    api = runner._api = FakeAsyncApi()
+
+    async def run_all():
+        return await asyncio.gather(*[runner.run_pod(pod(f"sub-{i}"), "ns") for i in range(6)])
+
+    results = asyncio.run_coroutine_threadsafe(run_all(), runner._get_loop()).result()
+    assert [logs for _, logs, _ in results] == [f"logs of sub-{i}" for i in range(6)]
+    assert api.max_running == 2
+    assert len(api.deleted) == 6
+
+
+def test_missing_client_raises(runner, monkeypatch):
+    monkeypatch.setattr(async_pods, "async_client", None)
+    with pytest.raises(RuntimeError):
+        runner.run(pod("sub"), "ns")
+
+
+def test_watcher_replaces_polling(runner):
+    api = runner._api = FakeAsyncApi()
+    watcher = FakeWatcher("Failed")
+    assert runner.run(pod("sub"), "ns", watcher=watcher)[0] == "Failed"
+    assert api.reads == {"sub": 0}
+    assert watcher.forgotten == ["sub"]
+
+
+def test_logs_are_followed(runner):
+    runner._api = FakeAsyncApi()
+    buffer = LogBuffer(max_size=8, flush_interval=0)
+    assert runner.run(pod("sub"), "ns", log_buffer=buffer) == ("Succeeded", "of sub", 4)
+
+
+def test_loop_is_recreated_after_fork(runner):
+    loop = runner._get_loop()
+    with patch.object(async_pods.os, "getpid", return_value=-1):
+        assert runner._get_loop() is not loop
+    runner.stop()
+    loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,92 @@
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from grader_service.autograding.cache import AutogradeResultCache
+from grader_service.autograding.local_grader import LocalAutogradeExecutor
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AutogradeResultCache(str(tmp_path))
+
+
+def make_output(path, content):
+    path.mkdir()
+    (path / "gradebook.json").write_text(content)
+    return str(path)
+
+
+def test_cache_dir_in_service_dir(tmp_path, cache):
+    assert cache.cache_dir == os.path.join(str(tmp_path), "autograde_cache")
+
+
+def test_make_key_depends_on_all_parts():
+    assert AutogradeResultCache.make_key("a", "b") == AutogradeResultCache.make_key("a", "b")
+    assert AutogradeResultCache.make_key("a", "b") != AutogradeResultCache.make_key("ab", "")
+    assert AutogradeResultCache.make_key("a", 360) != AutogradeResultCache.make_key("a", 720)
+
+
+def result_cache_key(tmp_path, **traits):
+    with patch("grader_service.autograding.local_grader.Session.object_session", return_value=MagicMock()):
+        executor = LocalAutogradeExecutor(str(tmp_path), MagicMock(id=1), close_session=False,
+                                          use_result_cache=True, **traits)
+    with patch.object(executor, "_get_submission_source", return_value=(str(tmp_path), "main", "abc")), \
+            patch.object(executor, "_put_grades_in_assignment_properties", return_value="{}"), \
+            patch.object(executor, "_get_environment_key", return_value="env"), \
+            patch("grader_service.autograding.local_grader.subprocess.run",
+                  return_value=MagicMock(stdout="tree\n")):
+        executor.assignment.allow_files = False
+        return executor._get_result_cache_key()
+
+
+def test_result_cache_key_depends_on_grading_options(tmp_path):
+    key = result_cache_key(tmp_path)
+    assert key == result_cache_key(tmp_path)
+    assert key != result_cache_key(tmp_path, skip_unchanged_solutions=True)
+    assert key != result_cache_key(tmp_path, record_kernel_memory=True)
+    with patch.object(LocalAutogradeExecutor, "_get_cell_timeouts", return_value={"nb/a": 12}):
+        assert key != result_cache_key(tmp_path)
+
+
+def test_get_missing(cache, tmp_path):
+    assert cache.get("missing", str(tmp_path / "out")) is None
+    assert not (tmp_path / "out").exists()
+
+
+def test_put_and_get(cache, tmp_path):
+    cache.put("key", make_output(tmp_path / "out", "{}"), "logs")
+    restore = tmp_path / "restore"
+    assert cache.get("key", str(restore)) == "logs"
+    assert (restore / "gradebook.json").read_text() == "{}"
+
+
+def test_get_replaces_existing_output(cache, tmp_path):
+    cache.put("key", make_output(tmp_path / "out", "cached"), "logs")
+    restore = tmp_path / "restore"
+    restore.mkdir()
+    (restore / "stale.txt").write_text("stale")
+    cache.get("key", str(restore))
+    assert os.listdir(restore) == ["gradebook.json"]
+
+
+def test_put_keeps_or_replaces_entry(cache, tmp_path):
+    cache.put("key", make_output(tmp_path / "first", "first"), "first")
+    cache.put("key", make_output(tmp_path / "second", "second"), "second")
+    assert cache.get("key", str(tmp_path / "restore")) == "first"
+    cache.put("key", str(tmp_path / "second"), "second", replace=True)
+    assert cache.get("key", str(tmp_path / "restore")) == "second"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = AutogradeResultCache(str(tmp_path), max_size=250)
+    cache.put("old", make_output(tmp_path / "old", "x" * 100), "")
+    cache.put("used", make_output(tmp_path / "used", "x" * 100), "")
+    past = time.time() - 100
+    os.utime(os.path.join(cache.cache_dir, "old"), (past, past))
+    os.utime(os.path.join(cache.cache_dir, "used"), (past + 1, past + 1))
+    cache.get("used", str(tmp_path / "restore"))
+    cache.put("new", make_output(tmp_path / "new", "x" * 100), "")
+    assert sorted(os.listdir(cache.cache_dir)) == ["new", "used"]
@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+from traitlets.config import Config
+
+from grader_service.autograding.celery.app import CeleryApp, route_task
+
+AUTOGRADE = "grader_service.autograding.celery.tasks.autograde_task"
+FEEDBACK = "grader_service.autograding.celery.tasks.generate_feedback_task"
+
+
+def make_app(**traits):
+    c = Config()
+    c.CeleryApp.worker_kwargs = {}
+    for name, value in traits.items():
+        setattr(c.CeleryApp, name, value)
+    return CeleryApp(config=c)
+
+
+def test_no_routing_by_default():
+    celery = make_app()
+    assert celery.route(AUTOGRADE, (1, 2, 3), {}) is None
+    assert celery.submission_options == {}
+
+
+def test_task_queues():
+    celery = make_app(task_queues={"autograde_task": "autograde"})
+    assert celery.route(AUTOGRADE, (1, 2, 3), {}) == {"queue": "autograde"}
+    assert celery.route(FEEDBACK, (1, 2, 3), {}) is None
+
+
+def test_lecture_queue_takes_precedence():
+    celery = make_app(task_queues={"autograde_task": "autograde", "generate_feedback_task": "feedback"},
+                      lecture_queue_func=lambda lecture_id, task: "big" if lecture_id == 1 else None)
+    assert celery.route(AUTOGRADE, (1, 2, 3), {}) == {"queue": "big"}
+    assert celery.route(FEEDBACK, (), {"lecture_id": 1}) == {"queue": "big"}
+    assert celery.route(AUTOGRADE, (2, 2, 3), {}) == {"queue": "autograde"}
+
+
+def test_priorities():
+    celery = make_app(default_priority=1, submission_priority=9)
+    assert celery.route(AUTOGRADE, (1, 2, 3), {}) == {"priority": 1}
+    assert celery.submission_options == {"priority": 9}
+
+
+def test_router_is_installed_once():
+    celery = make_app(task_queues={"autograde_task": "autograde"}, default_priority=1)
+    make_app()
+    assert list(celery.app.conf.task_routes).count(route_task) == 1
+
+    router = celery.app.amqp.router
+    with patch.object(CeleryApp, "instance", return_value=celery):
+        assert router.route({}, AUTOGRADE, (1, 2, 3), {})["queue"].name == "autograde"
+        # explicit options of the signature take precedence
+        assert router.route({"priority": 9}, AUTOGRADE, (1, 2, 3), {})["priority"] == 9
+        assert router.route({"priority": None}, AUTOGRADE, (1, 2, 3), {})["priority"] == 1
@@ -0,0 +1,144 @@
+import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from traitlets.config import Config
+
+from grader_service.autograding.dedup import AUTOGRADE, FEEDBACK, TaskDeduplicator
+from grader_service.orm import Assignment, Base, Submission
+from grader_service.orm.task_lock import TaskLock
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def make_submission(sub_id=1, properties="{}"):
+    submission = MagicMock(id=sub_id)
+    submission.assignment.properties = properties
+    return submission
+
+
+def make_dedup(**traits):
+    c = Config()
+    for name, value in traits.items():
+        setattr(c.TaskDeduplicator, name, value)
+    return TaskDeduplicator(config=c)
+
+
+def test_duplicate_attaches_to_queued_task(session):
+    dedup = make_dedup()
+    submission = make_submission()
+    assert dedup.acquire(session, AUTOGRADE, submission)
+    assert not dedup.acquire(session, AUTOGRADE, submission)
+    assert not dedup.acquire(session, AUTOGRADE, submission)
+    # the queued task has not read the submission yet, so no follow-up is required
+    dedup.start(session, AUTOGRADE, submission.id)
+    assert not dedup.release(session, AUTOGRADE, submission.id)
+    assert session.query(TaskLock).count() == 0
+    assert dedup.acquire(session, AUTOGRADE, submission)
+
+
+def test_task_types_are_independent(session):
+    dedup = make_dedup()
+    submission = make_submission()
+    assert dedup.acquire(session, AUTOGRADE, submission)
+    assert dedup.acquire(session, FEEDBACK, submission)
+    assert dedup.acquire(session, AUTOGRADE, make_submission(sub_id=2))
+
+
+def test_duplicates_of_running_task_collapse_into_one_rerun(session):
+    dedup = make_dedup()
+    submission = make_submission()
+    assert dedup.acquire(session, AUTOGRADE, submission)
+    dedup.start(session, AUTOGRADE, submission.id)
+    assert not dedup.acquire(session, AUTOGRADE, submission)
+    assert not dedup.acquire(session, AUTOGRADE, submission)
+    assert dedup.release(session, AUTOGRADE, submission.id)
+    # the follow-up run keeps the lock
+    assert not dedup.acquire(session, AUTOGRADE, submission)
+    dedup.start(session, AUTOGRADE, submission.id)
+    assert not dedup.release(session, AUTOGRADE, submission.id)
+    assert session.query(TaskLock).count() == 0
+
+
+def test_changed_properties_require_rerun(session):
+    dedup = make_dedup()
+    assert dedup.acquire(session, AUTOGRADE, make_submission(properties="{}"))
+    assert not dedup.acquire(session, AUTOGRADE, make_submission(properties='{"changed": true}'))
+    assert session.query(TaskLock).one().rerun
+
+
+def test_stale_lock_is_replaced(session):
+    dedup = make_dedup(lock_timeout=60.0)
+    submission = make_submission()
+    assert dedup.acquire(session, AUTOGRADE, submission)
+    session.query(TaskLock).update(
+        {TaskLock.created_at: datetime.datetime.utcnow() - datetime.timedelta(minutes=5)})
+    session.commit()
+    assert dedup.acquire(session, AUTOGRADE, submission)
+
+
+def test_disabled(session):
+    dedup = make_dedup(enabled=False)
+    submission = make_submission()
+    assert dedup.acquire(session, AUTOGRADE, submission)
+    assert dedup.acquire(session, AUTOGRADE, submission)
+    assert session.query(TaskLock).count() == 0
+
+
+def test_release_without_lock(session):
+    dedup = make_dedup()
+    dedup.start(session, AUTOGRADE, 1)
+    assert not dedup.release(session, AUTOGRADE, 1)
+
+
+def run_job_task(session, dedup):
+    from grader_service.autograding.celery import tasks
+
+    session.add(Assignment(id=1, name="assignment", lectid=1, properties="{}",
+                           duedate=datetime.datetime.utcnow(), automatic_grading="auto",
+                           deleted="active"))
+    session.add(Submission(id=1, assignid=1, username="user", commit_hash="0" * 40,
+                           date=datetime.datetime.utcnow(), auto_status="pending",
+                           manual_status="not_graded", edited=False, grading_score=0))
+    session.commit()
+    with patch.object(tasks.CeleryApp, "instance", return_value=MagicMock()), \
+            patch.object(tasks.GraderTask, "session", session), \
+            patch.object(tasks.TaskDeduplicator, "instance", return_value=dedup), \
+            patch.object(tasks, "_update_job"), \
+            patch.object(tasks, "_finish_job_task", return_value=False) as finish_job_task, \
+            patch.object(tasks, "_rerun_autograde") as rerun_autograde, \
+            patch.object(tasks, "_autograde", return_value=True) as autograde:
+        tasks.autograde_task.run(1, 1, 1, job_id=7)
+    return autograde, finish_job_task, rerun_autograde
+
+
+def test_job_task_acquires_lock(session):
+    dedup = make_dedup()
+    autograde, finish_job_task, rerun_autograde = run_job_task(session, dedup)
+
+    autograde.assert_called_once()
+    finish_job_task.assert_called_once_with(session, 7, True)
+    rerun_autograde.assert_not_called()
+    # the lock is released after the task
+    assert session.query(TaskLock).count() == 0
+
+
+def test_job_task_is_coalesced_with_running_task(session):
+    dedup = make_dedup()
+    assert dedup.acquire(session, AUTOGRADE, make_submission())
+    dedup.start(session, AUTOGRADE, 1)
+    autograde, finish_job_task, _ = run_job_task(session, dedup)
+
+    autograde.assert_not_called()
+    finish_job_task.assert_called_once_with(session, 7, True)
+    # the running task starts a follow-up run for the job
+    assert session.query(TaskLock).one().rerun
@@ -0,0 +1,76 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from grader_service.autograding.local_feedback import GenerateFeedbackExecutor
+from grader_service.autograding.local_grader import LocalAutogradeExecutor
+
+
+@pytest.fixture
+def executor(tmp_path):
+    feedback_executor_class = MagicMock()
+    with patch("grader_service.autograding.local_grader.Session.object_session", return_value=MagicMock()):
+        executor = LocalAutogradeExecutor(str(tmp_path), MagicMock(id=1), close_session=False,
+                                          feedback_executor_class=feedback_executor_class)
+    return executor
+
+
+def start(executor, auto_status):
+    calls = []
+
+    def set_db_state(success=True):
+        executor.submission.auto_status = auto_status
+
+    executor.feedback_executor_class.return_value.start.side_effect = lambda: calls.append("feedback")
+    with patch.object(executor, "_restore_cached_result", return_value=True), \
+            patch.object(executor, "_set_properties"), \
+            patch.object(executor, "_push_results"), \
+            patch.object(executor, "_store_metrics"), \
+            patch.object(executor, "_set_db_state", side_effect=set_db_state), \
+            patch.object(executor, "_cleanup", side_effect=lambda: calls.append("cleanup")):
+        executor.autograding_start = executor.autograding_finished = MagicMock()
+        executor.start()
+    return calls
+
+
+def test_feedback_is_generated_from_output(executor):
+    calls = start(executor, "automatically_graded")
+
+    # the feedback is generated before the output directory is removed
+    assert calls == ["feedback", "cleanup"]
+    _, kwargs = executor.feedback_executor_class.call_args
+    assert kwargs["source_path"] == executor.output_path
+    assert kwargs["close_session"] is False
+
+
+def test_no_feedback_if_grading_failed(executor):
+    calls = start(executor, "grading_failed")
+
+    assert calls == ["cleanup"]
+    executor.feedback_executor_class.assert_not_called()
+    assert executor.submission.feedback_status == "generation_failed"
+
+
+def test_feedback_executor_uses_source_path(tmp_path):
+    source_path = tmp_path / "autograde_output"
+    (source_path / ".git").mkdir(parents=True)
+    (source_path / ".git" / "HEAD").write_text("ref: refs/heads/submission")
+    (source_path / "nb.ipynb").write_text("{}")
+    with patch("grader_service.autograding.local_grader.Session.object_session", return_value=MagicMock()):
+        executor = GenerateFeedbackExecutor(str(tmp_path), MagicMock(id=1), close_session=False,
+                                            source_path=str(source_path))
+
+    with patch.object(executor, "_materialize") as materialize:
+        executor._pull_submission()
+    materialize.assert_not_called()
+    # a clean input directory without the repository of the result publisher
+    assert sorted(os.listdir(executor.input_path)) == ["nb.ipynb"]
+    assert os.path.samefile(os.path.join(executor.input_path, "nb.ipynb"), source_path / "nb.ipynb")
+
+    os.makedirs(executor.output_path)
+    executor._cleanup()
+    # the autograding job removes its output directory
+    assert (source_path / "nb.ipynb").exists()
+    assert not os.path.exists(executor.input_path)
+    assert not os.path.exists(executor.output_path)
@@ -0,0 +1,68 @@
+import io
+import logging
+from unittest.mock import patch
+
+from grader_service.autograding.log_buffer import LogBuffer
+
+
+def test_buffer_keeps_last_characters():
+    buffer = LogBuffer(max_size=10)
+    buffer.write("0123456")
+    buffer.write("789ab")
+    buffer.write("cdefghijklmno")
+    assert buffer.getvalue() == "fghijklmno"
+    assert buffer.offset == 15
+
+
+def test_buffer_flushes_after_interval():
+    flushed = []
+    buffer = LogBuffer(on_flush=lambda logs, offset: flushed.append((logs, offset)),
+                       max_size=4, flush_interval=0.0001)
+    buffer._last_flush = 0
+    buffer.write("abcdef")
+    assert flushed == [("cdef", 2)]
+
+
+def test_buffer_does_not_flush_without_interval():
+    flushed = []
+    buffer = LogBuffer(on_flush=lambda logs, offset: flushed.append(logs), flush_interval=0)
+    buffer._last_flush = 0
+    buffer.write("abc")
+    assert flushed == []
+    buffer.sync()
+    assert flushed == ["abc"]
+
+
+def test_flush_errors_are_ignored():
+    def fail(logs, offset):
+        raise RuntimeError("database is gone")
+
+    buffer = LogBuffer(on_flush=fail)
+    buffer.write("abc")
+    buffer.sync()
+    assert buffer.getvalue() == "abc"
+
+
+def test_consume_stream_and_handler():
+    buffer = LogBuffer()
+    buffer.consume(io.BytesIO("line 1\nline 2 ä\n".encode("utf-8")))
+    logger = logging.getLogger("test_log_buffer")
+    logger.propagate = False
+    handler = buffer.handler()
+    logger.addHandler(handler)
+    try:
+        logger.warning("line 3")
+    finally:
+        logger.removeHandler(handler)
+    assert buffer.getvalue() == "line 1\nline 2 ä\nline 3\n"
+
+
+def test_consume_long_line_is_bounded():
+    buffer = LogBuffer(max_size=10)
+    stream = io.BytesIO(("ä" * 100000 + "end").encode("utf-8"))
+    with patch.object(buffer, "write", wraps=buffer.write) as write:
+        buffer.consume(stream, chunk_size=1001)
+    # the line is not read at once and characters split between chunks are decoded
+    assert max(len(c.args[0]) for c in write.call_args_list) <= 1001
+    assert buffer.getvalue() == "ä" * 7 + "end"
+    assert buffer.offset == 100000 - 7
@@ -0,0 +1,112 @@
+import os
+import subprocess
+from subprocess import CalledProcessError
+from unittest.mock import MagicMock, patch
+
+import pytest
+from traitlets.config import Config
+
+from grader_service.autograding.local_grader import LocalAutogradeExecutor
+from grader_service.autograding.materialize import GitArchiveMaterializer, GitPullMaterializer
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "grader", "GIT_AUTHOR_EMAIL": "grader@example.com",
+    "GIT_COMMITTER_NAME": "grader", "GIT_COMMITTER_EMAIL": "grader@example.com",
+}
+
+
+def git(*args, cwd):
+    env = dict(os.environ, **GIT_ENV)
+    return subprocess.run(["git", *args], cwd=cwd, env=env, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def bare_repo(tmp_path):
+    """A bare repository with two commits on main, returns (path, first commit)."""
+    bare = tmp_path / "bare"
+    work = tmp_path / "work"
+    bare.mkdir()
+    work.mkdir()
+    git("init", "--bare", "-b", "main", cwd=bare)
+    git("init", "-b", "main", cwd=work)
+    (work / "assignment.ipynb").write_text("first")
+    (work / "data").mkdir()
+    (work / "data" / "a.csv").write_text("1,2")
+    git("add", "-A", cwd=work)
+    git("commit", "-m", "first", cwd=work)
+    first = git("rev-parse", "HEAD", cwd=work)
+    (work / "assignment.ipynb").write_text("second")
+    (work / "extra.txt").write_text("extra")
+    git("add", "-A", cwd=work)
+    git("commit", "-m", "second", cwd=work)
+    git("push", str(bare), "main", cwd=work)
+    return str(bare), first
+
+
+@pytest.mark.parametrize("materializer_class", [GitPullMaterializer, GitArchiveMaterializer])
+def test_materialize_commit(materializer_class, bare_repo, tmp_path):
+    repo, first = bare_repo
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    materializer_class().materialize(repo, "main", first, str(dest))
+    assert (dest / "assignment.ipynb").read_text() == "first"
+    assert (dest / "data" / "a.csv").read_text() == "1,2"
+    assert not (dest / "extra.txt").exists()
+
+
+@pytest.mark.parametrize("materializer_class", [GitPullMaterializer, GitArchiveMaterializer])
+def test_materialize_ref(materializer_class, bare_repo, tmp_path):
+    repo, _ = bare_repo
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    materializer_class().materialize(repo, "main", None, str(dest))
+    assert (dest / "assignment.ipynb").read_text() == "second"
+    assert (dest / "extra.txt").exists()
+
+
+def test_archive_does_not_copy_history(bare_repo, tmp_path):
+    repo, first = bare_repo
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    GitArchiveMaterializer().materialize(repo, "main", first, str(dest))
+    assert not (dest / ".git").exists()
+
+
+def test_archive_unknown_commit_raises(bare_repo, tmp_path):
+    repo, _ = bare_repo
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    with pytest.raises(CalledProcessError):
+        GitArchiveMaterializer().materialize(repo, "main", "0" * 40, str(dest))
+
+
+def test_blob_ids(bare_repo, tmp_path):
+    path, first = bare_repo
+    materializer = GitArchiveMaterializer()
+    blob_ids = materializer.blob_ids(str(path), "main", first)
+    assert set(blob_ids) == {"assignment.ipynb", "data/a.csv"}
+    assert blob_ids["data/a.csv"] == git("rev-parse", f"{first}:data/a.csv", cwd=path)
+    # only files the file cache would store
+    assert set(materializer.blob_ids(str(path), "main", None, min_size=4)) == {"assignment.ipynb", "extra.txt"}
+
+
+@pytest.mark.parametrize("cache_dir", [None, "cache"])
+def test_executor_passes_blob_ids_to_file_cache(bare_repo, tmp_path, cache_dir):
+    path, first = bare_repo
+    c = Config()
+    if cache_dir is not None:
+        c.FileCache.cache_dir = str(tmp_path / cache_dir)
+    c.FileCache.min_file_size = 4
+    with patch("grader_service.autograding.local_grader.Session.object_session", return_value=MagicMock()):
+        executor = LocalAutogradeExecutor(str(tmp_path), MagicMock(id=1), config=c)
+    executor._content_ids = executor._get_content_ids(GitArchiveMaterializer(), path, "main", first)
+
+    if cache_dir is None:
+        assert executor._content_ids == {}
+        return
+    notebook = os.path.join(executor.input_path, "assignment.ipynb")
+    blob_id = git("rev-parse", f"{first}:assignment.ipynb", cwd=path)
+    assert executor._content_ids == {notebook: blob_id}
+    assert executor._get_file_cache_config().FileCache.content_ids == {notebook: blob_id}
+    assert f"--FileCache.content_ids={notebook}={blob_id}" in executor._get_file_cache_args()
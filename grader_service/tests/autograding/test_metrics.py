@@ -0,0 +1,86 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from grader_service.autograding.local_grader import LocalAutogradeExecutor
+from grader_service.orm.submission_metrics import SubmissionMetrics
+
+
+@pytest.fixture
+def executor(tmp_path):
+    session = MagicMock()
+    with patch("grader_service.autograding.local_grader.Session.object_session", return_value=session):
+        executor = LocalAutogradeExecutor(str(tmp_path), MagicMock(id=1), close_session=False)
+    return executor
+
+
+def test_nested_phases_are_excluded(executor):
+    with patch("grader_service.autograding.local_grader.time.perf_counter", side_effect=[0.0, 1.0, 3.0, 10.0]):
+        with executor._timed("execute"):
+            with executor._timed("gradebook"):
+                pass
+    assert executor.phase_times == {"execute": 8.0, "gradebook": 2.0}
+
+
+def test_start_records_phases(executor, tmp_path):
+    def run():
+        os.makedirs(executor.output_path)
+        executor._write_gradebook("{}")
+
+    with patch.object(executor, "_restore_cached_result", return_value=False), \
+            patch.object(executor, "_pull_submission"), \
+            patch.object(executor, "_run", side_effect=run), \
+            patch.object(executor, "_store_result"), \
+            patch.object(executor, "_set_properties"), \
+            patch.object(executor, "_push_results"), \
+            patch.object(executor, "_set_db_state"), \
+            patch.object(executor, "_cleanup"):
+        executor.start()
+
+    assert set(executor.phase_times) == {"pull", "gradebook", "execute", "set_properties", "push", "db"}
+    # the job ran in the worker process, so its resource usage cannot be separated
+    assert executor.cpu_time is None
+    assert executor.peak_rss is None
+    metrics = executor.session.merge.call_args.args[0]
+    assert isinstance(metrics, SubmissionMetrics)
+    assert metrics.sub_id == 1
+    assert metrics.gradebook_time == executor.phase_times["gradebook"]
+    assert metrics.output_bytes == 2  # the gradebook
+    assert metrics.total_time >= sum(executor.phase_times.values())
+
+
+def test_failed_job_records_metrics(executor):
+    with patch.object(executor, "_restore_cached_result", side_effect=RuntimeError), \
+            patch.object(executor, "_set_db_state") as set_db_state, \
+            patch.object(executor, "_cleanup"):
+        executor.start()
+
+    set_db_state.assert_called_once_with(success=False)
+    metrics = executor.session.merge.call_args.args[0]
+    assert metrics.execute_time is None
+    assert metrics.db_time is not None
+    assert metrics.failure_reason == "grading_error"
+
+
+def test_exceeded_limit_is_recorded_as_failure_reason(executor):
+    from grader_service.autograding.local_sandbox import ResourceLimitExceeded
+
+    with patch.object(executor, "_restore_cached_result", side_effect=ResourceLimitExceeded("memory")), \
+            patch.object(executor, "_set_db_state"), \
+            patch.object(executor, "_cleanup"):
+        executor.start()
+
+    metrics = executor.session.merge.call_args.args[0]
+    assert metrics.failure_reason == "memory_limit_exceeded"
+
+
+def test_subprocess_usage_is_measured(executor):
+    command = (f'{sys.executable} -c "import time; x = bytearray(64 * 2 ** 20); '
+               f'end = time.process_time() + 0.2\nwhile time.process_time() < end: pass\nraise SystemExit(3)"')
+    process = executor._run_logged_subprocess(command)
+
+    assert process.returncode == 3
+    assert executor.cpu_time >= 0.2
+    assert executor.peak_rss >= 64 * 2 ** 20
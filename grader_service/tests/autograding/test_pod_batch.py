@@ -0,0 +1,107 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from grader_service.autograding.kube.batch import BatchJob, PodBatcher
+from grader_service.autograding.kube.kube_grader import KubeAutogradeExecutor
+from grader_service.autograding.kube.util import make_pod
+
+
+@pytest.fixture
+def batcher():
+    return PodBatcher(max_batch_size=2, max_wait=0.2)
+
+
+def make_job(name):
+    return BatchJob(output_path=f"/out/{name}", command=["grader-convert", name])
+
+
+def test_full_batch_is_dispatched_immediately(batcher):
+    batches = []
+
+    def run(jobs):
+        batches.append([job.output_path for job in jobs])
+        for job in jobs:
+            job.returncode = 0
+
+    jobs = [make_job("a"), make_job("b")]
+    start = time.monotonic()
+    for job in jobs:
+        batcher.submit("image", job, run)
+    assert all(job.done.wait(5) for job in jobs)
+    assert time.monotonic() - start < 0.2
+    assert batches == [["/out/a", "/out/b"]]
+    assert all(job.returncode == 0 for job in jobs)
+
+
+def test_partial_batch_is_dispatched_after_max_wait(batcher):
+    run_called = threading.Event()
+
+    def run(jobs):
+        run_called.set()
+
+    job = make_job("a")
+    start = time.monotonic()
+    batcher.submit("image", job, run)
+    assert job.done.wait(5)
+    assert run_called.is_set()
+    assert time.monotonic() - start >= 0.2
+
+
+def test_keys_are_batched_separately(batcher):
+    batches = []
+    run = lambda jobs: batches.append(len(jobs))  # noqa: E731
+    jobs = [make_job("a"), make_job("b"), make_job("c")]
+    batcher.submit("image1", jobs[0], run)
+    batcher.submit("image2", jobs[1], run)
+    batcher.submit("image1", jobs[2], run)
+    assert all(job.done.wait(5) for job in jobs)
+    assert sorted(batches) == [1, 2]
+
+
+def test_failed_batch_fails_all_jobs(batcher):
+    def run(jobs):
+        jobs[0].returncode = 0
+        raise RuntimeError("pod could not be created")
+
+    jobs = [make_job("a"), make_job("b")]
+    for job in jobs:
+        batcher.submit("image", job, run)
+    assert all(job.done.wait(5) for job in jobs)
+    assert jobs[0].returncode == 0
+    assert jobs[1].returncode is None
+    assert "pod could not be created" in jobs[1].logs
+
+
+def test_batch_pod_isolates_jobs():
+    executor = MagicMock()
+    executor.extra_volume_mounts = []
+    executor._make_pod.side_effect = lambda name, command, volume_mounts, image, node_selector: make_pod(
+        name=name, cmd=command, image=image, image_pull_policy=None, volume_mounts=volume_mounts)
+    executor.client.create_namespaced_pod.side_effect = lambda namespace, body: body
+    executor._grader_pod.side_effect = lambda pod: SimpleNamespace(
+        name=pod.metadata.name, namespace="ns", poll=lambda: "Failed")
+    executor.client.read_namespaced_pod.return_value = SimpleNamespace(status=SimpleNamespace(
+        container_statuses=[
+            SimpleNamespace(name="job-0", state=SimpleNamespace(terminated=SimpleNamespace(exit_code=0))),
+            SimpleNamespace(name="job-1", state=SimpleNamespace(terminated=SimpleNamespace(exit_code=1))),
+        ]))
+    executor.client.read_namespaced_pod_log.side_effect = lambda name, namespace, container: f"logs of {container}"
+
+    jobs = [BatchJob(output_path=f"/out/submission_{i}", command=["grader-convert", str(i)],
+                     volume_mounts=[{"name": "data", "mountPath": f"/out/submission_{i}",
+                                     "subPath": f"convert_out/submission_{i}"}])
+            for i in range(2)]
+    KubeAutogradeExecutor._run_batch_pod(executor, jobs, image="image", node_selector=None)
+
+    pod = executor.client.create_namespaced_pod.call_args.kwargs["body"]
+    assert [c.name for c in pod.spec.containers] == ["job-0", "job-1"]
+    for i, container in enumerate(pod.spec.containers):
+        assert container.args == ["grader-convert", str(i)]
+        # every container only mounts the directories of its own submission
+        assert [m.sub_path for m in container.volume_mounts] == [f"convert_out/submission_{i}"]
+    assert [(job.returncode, job.logs) for job in jobs] == [(0, "logs of job-0"), (1, "logs of job-1")]
+    executor._delete_pod.assert_called_once()
@@ -0,0 +1,134 @@
+import asyncio
+import queue
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from grader_service.autograding.kube import watch as pod_watch
+from grader_service.autograding.kube.kube_grader import GraderPod
+from grader_service.autograding.kube.watch import PodWatcher
+
+
+def make_pod(name, phase):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, namespace="ns"),
+                           status=SimpleNamespace(phase=phase))
+
+
+class FakeWatch:
+    """Streams the events put into the class level queue until it is stopped."""
+    events = None
+
+    def __init__(self):
+        self._stop = False
+
+    def stream(self, func, **kwargs):
+        while not self._stop:
+            try:
+                event = self.events.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+    def stop(self):
+        self._stop = True
+
+
+@pytest.fixture
+def events():
+    FakeWatch.events = queue.Queue()
+    with patch.object(pod_watch.watch, "Watch", FakeWatch):
+        yield FakeWatch.events
+
+
+@pytest.fixture
+def api():
+    api = MagicMock()
+    api.list_namespaced_pod.return_value = SimpleNamespace(
+        items=[make_pod("running", "Running")], metadata=SimpleNamespace(resource_version="1"))
+    return api
+
+
+@pytest.fixture
+def watcher(api, events):
+    watcher = PodWatcher(api, "ns", "app=grader", reconnect_interval=0.05).start()
+    deadline = time.monotonic() + 5
+    while not watcher.connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield watcher
+    watcher.stop()
+
+
+def test_wait_returns_terminal_phase(watcher, events):
+    events.put({"type": "MODIFIED", "object": make_pod("running", "Succeeded")})
+    assert watcher.wait("running", timeout=5) == "Succeeded"
+
+
+def test_wait_times_out(watcher):
+    start = time.monotonic()
+    assert watcher.wait("running", timeout=0.2) is None
+    assert time.monotonic() - start >= 0.2
+
+
+def test_phase_is_kept_after_delete_while_waiting(watcher, events):
+    assert watcher.wait("pod", timeout=0.01) is None
+    events.put({"type": "MODIFIED", "object": make_pod("pod", "Failed")})
+    events.put({"type": "DELETED", "object": make_pod("pod", "Failed")})
+    assert watcher.wait("pod", timeout=5) == "Failed"
+    watcher.forget("pod")
+    assert watcher.wait("pod", timeout=0.01) is None
+
+
+def test_disconnect_wakes_up_waiters(watcher, events):
+    watcher.reconnect_interval = 10
+    events.put(RuntimeError("connection lost"))
+    start = time.monotonic()
+    assert watcher.wait("running", timeout=5) is None
+    assert time.monotonic() - start < 5
+    assert not watcher.connected
+
+
+def test_wait_async_returns_terminal_phase(watcher, events):
+    async def wait():
+        task = asyncio.ensure_future(watcher.wait_async("running", timeout=5))
+        await asyncio.sleep(0.05)
+        events.put({"type": "MODIFIED", "object": make_pod("running", "Succeeded")})
+        return await task
+
+    assert asyncio.new_event_loop().run_until_complete(wait()) == "Succeeded"
+    assert watcher._callbacks == {}
+
+
+def test_wait_async_wakes_up_on_disconnect(watcher, events):
+    watcher.reconnect_interval = 10
+
+    async def wait():
+        task = asyncio.ensure_future(watcher.wait_async("running", timeout=5))
+        await asyncio.sleep(0.05)
+        events.put(RuntimeError("connection lost"))
+        return await task
+
+    assert asyncio.new_event_loop().run_until_complete(wait()) is None
+    assert not watcher.connected
+
+
+def test_grader_pod_uses_watch(watcher, events):
+    client = MagicMock()
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    pod = GraderPod(make_pod("running", "Running"), client, watcher=watcher)
+    events.put({"type": "MODIFIED", "object": make_pod("running", "Succeeded")})
+    assert pod.poll() == "Succeeded"
+    client.read_namespaced_pod_status.assert_not_called()
+
+
+def test_grader_pod_polls_without_watch():
+    client = MagicMock()
+    client.read_namespaced_pod_status.side_effect = [
+        make_pod("pod", "Running"), make_pod("pod", "Failed")]
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    pod = GraderPod(make_pod("pod", "Pending"), client, poll_interval=10)
+    assert pod.poll() == "Failed"
+    assert client.read_namespaced_pod_status.call_count == 2
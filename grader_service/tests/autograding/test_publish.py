@@ -0,0 +1,62 @@
+import os
+import subprocess
+
+import pytest
+
+from grader_service.autograding.publish import GitPlumbingPublisher, GitPushPublisher
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "grader", "GIT_AUTHOR_EMAIL": "grader@example.com",
+    "GIT_COMMITTER_NAME": "grader", "GIT_COMMITTER_EMAIL": "grader@example.com",
+}
+
+
+def git(*args, cwd):
+    env = dict(os.environ, **GIT_ENV)
+    return subprocess.run(["git", *args], cwd=cwd, env=env, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def bare_repo(tmp_path):
+    bare = tmp_path / "bare"
+    bare.mkdir()
+    git("init", "--bare", "-b", "main", cwd=bare)
+    return str(bare)
+
+
+def make_output(path, content):
+    path.mkdir()
+    (path / "assignment.ipynb").write_text(content)
+    (path / "data").mkdir()
+    (path / "data" / "a.csv").write_text("1,2")
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def git_identity(monkeypatch):
+    for key, value in GIT_ENV.items():
+        monkeypatch.setenv(key, value)
+
+
+@pytest.mark.parametrize("publisher_class", [GitPushPublisher, GitPlumbingPublisher])
+def test_publish_branch(publisher_class, bare_repo, tmp_path):
+    out = make_output(tmp_path / "out", "graded")
+    publisher_class().publish(out, bare_repo, "submission_abc", "abc")
+    assert git("show", "submission_abc:assignment.ipynb", cwd=bare_repo) == "graded"
+    assert git("show", "submission_abc:data/a.csv", cwd=bare_repo) == "1,2"
+    assert git("log", "-1", "--format=%s", "submission_abc", cwd=bare_repo) == "abc"
+
+
+@pytest.mark.parametrize("publisher_class", [GitPushPublisher, GitPlumbingPublisher])
+def test_publish_replaces_branch(publisher_class, bare_repo, tmp_path):
+    publisher_class().publish(make_output(tmp_path / "first", "first"), bare_repo, "submission_abc", "abc")
+    publisher_class().publish(make_output(tmp_path / "second", "second"), bare_repo, "submission_abc", "abc")
+    assert git("show", "submission_abc:assignment.ipynb", cwd=bare_repo) == "second"
+
+
+def test_plumbing_does_not_create_repo(bare_repo, tmp_path):
+    out = make_output(tmp_path / "out", "graded")
+    GitPlumbingPublisher().publish(out, bare_repo, "feedback_abc", "abc")
+    assert not os.path.exists(os.path.join(out, ".git"))
+    assert os.listdir(os.path.join(bare_repo, "refs", "heads")) == ["feedback_abc"]
@@ -0,0 +1,144 @@
+import os
+import resource
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from traitlets.config import Config
+
+from grader_service.autograding.local_sandbox import LocalSandboxAutogradeExecutor, ResourceLimitExceeded
+
+
+def make_executor(tmp_path, lecture_limits=None, **traits):
+    c = Config()
+    c.LocalSandboxAutogradeExecutor.use_cgroup = False
+    c.LogBuffer.flush_interval = 0
+    for name, value in traits.items():
+        setattr(c.LocalSandboxAutogradeExecutor, name, value)
+    if lecture_limits is not None:
+        c.LocalSandboxAutogradeExecutor.resource_limits_func = lambda l: lecture_limits
+    with patch("grader_service.autograding.local_grader.Session.object_session", return_value=MagicMock()):
+        executor = LocalSandboxAutogradeExecutor(str(tmp_path), MagicMock(id=1), config=c)
+    executor._limits = executor.limits
+    return executor
+
+
+def python(code):
+    return f'{sys.executable} -c "{code}"'
+
+
+def test_lecture_limits_override_defaults(tmp_path):
+    executor = make_executor(tmp_path, lecture_limits={"cpu_time": 10}, memory_limit=2 ** 30, cpu_time_limit=5)
+    assert executor.limits == {"memory": 2 ** 30, "cpu_time": 10, "processes": None, "cpu_quota": None}
+
+
+def test_rlimits_are_applied(tmp_path):
+    executor = make_executor(tmp_path, memory_limit=2 ** 31, cpu_time_limit=30)
+    process = executor._run_logged_subprocess(
+        python("import resource; print(resource.getrlimit(resource.RLIMIT_AS)[0], "
+               "resource.getrlimit(resource.RLIMIT_CPU)[0])"))
+    assert process.returncode == 0
+    assert executor.grading_logs.split() == [str(2 ** 31), "30"]
+    # the limits only apply to the grading process
+    assert resource.getrlimit(resource.RLIMIT_CPU)[0] != 30
+
+
+def test_cpu_time_limit_is_reported(tmp_path):
+    executor = make_executor(tmp_path, cpu_time_limit=1)
+    process = executor._run_logged_subprocess(python("while True: pass"))
+    assert process.returncode != 0
+    assert executor._exceeded_limit(process) == "cpu_time"
+    assert "Grading exceeded the cpu_time limit" in executor.grading_logs
+
+
+def test_failure_without_exceeded_limit(tmp_path):
+    executor = make_executor(tmp_path, cpu_time_limit=30)
+    process = executor._run_logged_subprocess(python("raise SystemExit(3)"))
+    assert process.returncode == 3
+    assert executor._exceeded_limit(process) is None
+
+
+def test_memory_limit_without_cgroup_is_reported(tmp_path):
+    executor = make_executor(tmp_path, memory_limit=2 ** 30)
+    process = executor._run_logged_subprocess(python("x = bytearray(2 ** 34)"))
+    assert process.returncode != 0
+    assert "MemoryError" in executor.grading_logs
+    assert executor._exceeded_limit(process) == "memory"
+    assert "Grading exceeded the memory limit" in executor.grading_logs
+
+
+def test_memory_error_without_memory_limit(tmp_path):
+    executor = make_executor(tmp_path, cpu_time_limit=30)
+    process = executor._run_logged_subprocess(python("raise MemoryError"))
+    assert process.returncode != 0
+    assert executor._exceeded_limit(process) is None
+
+
+def test_run_raises_distinct_error(tmp_path):
+    executor = make_executor(tmp_path, cpu_time_limit=1)
+
+    def run():
+        executor._run_logged_subprocess(python("while True: pass"))
+        raise RuntimeError("Process has failed execution!")
+
+    with patch("grader_service.autograding.local_grader.LocalProcessAutogradeExecutor._run", side_effect=run):
+        with pytest.raises(ResourceLimitExceeded) as exc_info:
+            executor._run()
+    assert exc_info.value.limit == "cpu_time"
+
+
+def test_cgroup_requires_parent(tmp_path):
+    root = tmp_path / "cgroup"
+    root.mkdir()
+    (root / "cgroup.controllers").write_text("cpu memory pids")
+    executor = make_executor(tmp_path, memory_limit=2 ** 30, use_cgroup=True, cgroup_root=str(root))
+    # the cgroup of the service cannot have child cgroups with limits
+    with pytest.raises(RuntimeError, match="cgroup_parent"):
+        executor._create_cgroup()
+
+
+def test_cgroup_failure_is_raised(tmp_path):
+    executor = make_executor(tmp_path, memory_limit=2 ** 30, use_cgroup=True,
+                             cgroup_root=str(tmp_path / "cgroup"), cgroup_parent="/grader")
+    # no cgroup v2 hierarchy at the root
+    with pytest.raises(RuntimeError, match="cgroup v2"):
+        executor._create_cgroup()
+
+
+def test_no_address_space_limit_in_cgroup(tmp_path):
+    executor = make_executor(tmp_path, memory_limit=2 ** 31, cpu_time_limit=30)
+    executor._cgroup_path = str(tmp_path)
+    (tmp_path / "cgroup.procs").write_text("")
+    with patch("grader_service.autograding.local_sandbox.resource.setrlimit") as setrlimit:
+        executor._make_preexec_fn()()
+    assert (tmp_path / "cgroup.procs").read_text() == str(os.getpid())
+    assert [c.args[0] for c in setrlimit.call_args_list] == [resource.RLIMIT_CPU]
+
+
+def test_cgroup_limits(tmp_path):
+    root = tmp_path / "cgroup"
+    (root / "grader").mkdir(parents=True)
+    (root / "cgroup.controllers").write_text("cpu memory pids")
+    executor = make_executor(tmp_path, memory_limit=2 ** 30, process_limit=16, cpu_quota=1.5,
+                             use_cgroup=True, cgroup_root=str(root), cgroup_parent="/grader")
+    path = executor._create_cgroup()
+    assert path == str(root / "grader" / f"grader-1-{os.getpid()}")
+    assert (Path(path) / "memory.max").read_text() == str(2 ** 30)
+    assert (Path(path) / "pids.max").read_text() == "16"
+    assert (Path(path) / "cpu.max").read_text() == "150000 100000"
+
+    executor._cgroup_path = path
+    (Path(path) / "memory.events").write_text("low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n")
+    assert executor._exceeded_limit(None) == "memory"
+
+
+def test_cgroup_usage_replaces_process_usage(tmp_path):
+    executor = make_executor(tmp_path)
+    executor._cgroup_path = str(tmp_path)
+    (tmp_path / "cpu.stat").write_text("usage_usec 2500000\nuser_usec 2000000\n")
+    (tmp_path / "memory.peak").write_text("1048576\n")
+    executor.cpu_time, executor.peak_rss = 1.0, 10
+    executor._read_cgroup_usage()
+    assert executor.cpu_time == 2.5
+    assert executor.peak_rss == 1048576
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from grader_service.autograding.kube.kube_grader import KubeAutogradeExecutor
+from grader_service.autograding.kube.standby import StandbyPool, pool_id
+from grader_service.autograding.kube.standby_worker import StandbyWorker, write_atomic
+
+
+def make_executor(tmp_path):
+    executor = MagicMock()
+    executor.grader_service_dir = str(tmp_path)
+    executor.input_path = str(tmp_path / "convert_in" / "submission_1")
+    executor.output_path = str(tmp_path / "convert_out" / "submission_1")
+    executor.has_previous_result = False
+    executor.namespace = "ns"
+    executor.pod_labels = {"app": "grader"}
+    executor.client.list_namespaced_pod.return_value = SimpleNamespace(items=[])
+    os.makedirs(executor.input_path)
+    os.makedirs(executor.output_path)
+    return executor
+
+
+def pod(name, phase="Running"):
+    return SimpleNamespace(status=SimpleNamespace(phase=phase),
+                           metadata=SimpleNamespace(name=name, deletion_timestamp=None))
+
+
+def test_worker_runs_one_job(tmp_path):
+    slot_dir = tmp_path / "slot"
+    slot_dir.mkdir()
+    worker = StandbyWorker(str(slot_dir), poll_interval=0.01)
+    thread = threading.Thread(target=worker.start, daemon=True)
+    thread.start()
+    while not (slot_dir / "ready").exists():
+        time.sleep(0.01)
+    write_atomic(str(slot_dir / "job.json"), {"command": [sys.executable, "-c", "print('graded')"]})
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert json.loads((slot_dir / "done.json").read_text()) == {"returncode": 0}
+    assert (slot_dir / "log").read_text().strip() == "graded"
+
+
+def test_claim_is_exclusive(tmp_path):
+    os.makedirs(tmp_path / "claims")
+    assert StandbyPool._claim(str(tmp_path), "a")
+    assert not StandbyPool._claim(str(tmp_path), "a")
+
+
+def test_pool_runs_job_in_isolated_slot(tmp_path):
+    executor = make_executor(tmp_path)
+    with open(os.path.join(executor.input_path, "nb.ipynb"), "w") as f:
+        f.write("submission")
+    # writes the input file into the output directory, like grader-convert
+    executor._get_convert_command.side_effect = lambda input_path, output_path, file_cache: [
+        sys.executable, "-c",
+        "import shutil, sys; shutil.copy(sys.argv[1] + '/nb.ipynb', sys.argv[2]); sys.exit(3)",
+        input_path, output_path]
+
+    pool = StandbyPool(poll_interval=0.01)
+    queue_dir = pool.queue_dir(executor, "image")
+    assert queue_dir == os.path.join(str(tmp_path), "standby", pool_id("image"))
+    created = []
+
+    def create_pod(name, command, volume_mounts, *args, **kwargs):
+        created.append((name, volume_mounts))
+        worker = StandbyWorker(command[command.index("--slot-dir") + 1], poll_interval=0.01)
+        threading.Thread(target=worker.start, daemon=True).start()
+
+    executor._create_pod.side_effect = create_pod
+    returncode, logs = pool.run(executor, "image", None, min_pods=0, max_pods=2)
+
+    assert returncode == 3
+    assert len(created) == 1
+    name, volume_mounts = created[0]
+    # the pod only mounts its own slot
+    assert volume_mounts == [{"name": "data", "mountPath": os.path.join(queue_dir, "slots", name),
+                              "subPath": f"standby/{pool_id('image')}/slots/{name}"}]
+    slot_dir = os.path.join(queue_dir, "slots", name)
+    executor._get_convert_command.assert_called_once_with(
+        input_path=os.path.join(slot_dir, "in"), output_path=os.path.join(slot_dir, "out"),
+        file_cache=False)
+    with open(os.path.join(executor.output_path, "nb.ipynb")) as f:
+        assert f.read() == "submission"
+    # the directories of the submission are moved back
+    assert os.listdir(executor.input_path) == ["nb.ipynb"]
+    # the pod is single use
+    executor.client.delete_namespaced_pod.assert_called_with(name=name, namespace="ns")
+    assert os.listdir(os.path.join(queue_dir, "slots")) == []
+    assert os.listdir(os.path.join(queue_dir, "claims")) == []
+
+
+def test_convert_command_uses_slot_paths():
+    executor = MagicMock(input_path="/data/convert_in/submission_1",
+                         output_path="/data/convert_out/submission_1",
+                         previous_output_path="/data/convert_in/previous_1",
+                         has_previous_result=True, convert_executable="grader-convert")
+    executor._get_cell_timeouts_args.return_value = []
+    executor._get_file_cache_args.return_value = ["--FileCache.cache_dir=/data/cache"]
+    command = KubeAutogradeExecutor._get_convert_command(
+        executor, input_path="/slot/in", output_path="/slot/out",
+        previous_output_path="/slot/previous", file_cache=False)
+
+    assert command[2:6] == ["-i", "/slot/in", "-o", "/slot/out"]
+    assert command[-1] == "--Autograde.previous_output_dir=/slot/previous"
+    assert not any(arg.startswith("--FileCache.") or "/data/" in arg for arg in command)
+    assert "--FileCache.cache_dir=/data/cache" in KubeAutogradeExecutor._get_convert_command(executor)
+
+
+def test_scale_removes_idle_and_dead_slots(tmp_path):
+    executor = make_executor(tmp_path)
+    pool = StandbyPool(idle_timeout=0, pod_start_grace=0)
+    queue_dir = pool.queue_dir(executor, "image")
+    for d in ("slots", "claims", "waiting"):
+        os.makedirs(os.path.join(queue_dir, d))
+    for slot in ("a", "b", "dead"):
+        os.makedirs(os.path.join(queue_dir, "slots", slot))
+        open(os.path.join(queue_dir, "slots", slot, "ready"), "w").close()
+    executor.client.list_namespaced_pod.return_value = SimpleNamespace(items=[pod("a"), pod("b")])
+
+    pool._scale(executor, "image", None, min_pods=1, max_pods=4)
+
+    # one idle pod is kept as minimum
+    assert os.listdir(os.path.join(queue_dir, "slots")) == ["a"]
+    deleted = {c.kwargs["name"] for c in executor.client.delete_namespaced_pod.call_args_list}
+    assert deleted == {"b", "dead"}
+    executor._create_pod.assert_not_called()
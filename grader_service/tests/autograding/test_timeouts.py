@@ -0,0 +1,99 @@
+import json
+import secrets
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from traitlets.config import Config
+
+from grader_service.autograding.local_grader import LocalAutogradeExecutor
+from grader_service.autograding.timeouts import AdaptiveTimeoutPolicy, percentile
+from grader_service.orm import Base, Submission
+from grader_service.orm.submission_properties import SubmissionProperties
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    AdaptiveTimeoutPolicy.clear_cache()
+    yield
+    AdaptiveTimeoutPolicy.clear_cache()
+
+
+def add_submission(session, times, auto_status="automatically_graded", assignid=1):
+    submission = Submission(date=datetime.now(), auto_status=auto_status, manual_status="not_graded",
+                            assignid=assignid, username="user", commit_hash=secrets.token_hex(20),
+                            edited=False, grading_score=0)
+    session.add(submission)
+    session.flush()
+    grades = {grade_id: {"execution_time": t} for grade_id, t in times.items()}
+    properties = json.dumps({"notebooks": {"nb": {"grades_dict": grades}}})
+    session.add(SubmissionProperties(sub_id=submission.id, properties=properties))
+    session.commit()
+
+
+def make_policy(**traits):
+    c = Config()
+    for name, value in traits.items():
+        setattr(c.AdaptiveTimeoutPolicy, name, value)
+    return AdaptiveTimeoutPolicy(config=c)
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([3.0], 50) == 3.0
+
+
+def test_execution_times(session):
+    add_submission(session, {"a": 1.0, "b": None})
+    add_submission(session, {"a": 2.0})
+    add_submission(session, {"a": 100.0}, auto_status="grading_failed")
+    add_submission(session, {"a": 100.0}, assignid=2)
+    assert make_policy().execution_times(session, 1) == {"nb/a": [2.0, 1.0]}
+    assert make_policy(max_submissions=1).execution_times(session, 1) == {"nb/a": [2.0]}
+
+
+def test_execution_times_are_cached(session):
+    add_submission(session, {"a": 1.0})
+    assert make_policy().execution_times(session, 1) == {"nb/a": [1.0]}
+    add_submission(session, {"a": 2.0})
+    # another policy of the process reuses the times
+    assert make_policy().execution_times(session, 1) == {"nb/a": [1.0]}
+    assert make_policy(cache_ttl=0).execution_times(session, 1) == {"nb/a": [2.0, 1.0]}
+    AdaptiveTimeoutPolicy.clear_cache()
+    assert make_policy().execution_times(session, 1) == {"nb/a": [2.0, 1.0]}
+
+
+def test_cell_timeouts(session):
+    for t in [1.0, 2.0, 2.0, 3.0, 4.0]:
+        add_submission(session, {"fast": t / 10, "slow": t * 100, "medium": t * 5, "rare": t} if t == 1.0
+                       else {"fast": t / 10, "slow": t * 100, "medium": t * 5})
+    policy = make_policy(percentile=80, multiplier=2, floor=5, min_samples=5)
+    timeouts = policy.cell_timeouts(session, 1, default_timeout=360)
+    # floor, multiple of the percentile and ceiling, too few samples of the rare cell
+    assert timeouts == {"nb/fast": 5, "nb/medium": 30, "nb/slow": 360}
+    assert make_policy(ceiling=100.0).cell_timeouts(session, 1, default_timeout=360)["nb/slow"] == 100.0
+
+
+def test_executor_passes_cell_timeouts(tmp_path):
+    c = Config()
+    c.LocalAutogradeExecutor.use_adaptive_timeouts = True
+    with patch("grader_service.autograding.local_grader.Session.object_session", return_value=MagicMock()):
+        executor = LocalAutogradeExecutor(str(tmp_path), MagicMock(id=1), config=c)
+    with patch.object(AdaptiveTimeoutPolicy, "cell_timeouts", return_value={"nb/a": 12}) as cell_timeouts:
+        assert executor._get_cell_timeouts_args() == ["--Execute.cell_timeouts=nb/a=12"]
+        assert executor._get_cell_timeouts() == {"nb/a": 12}
+    # the timeouts are computed once per job
+    cell_timeouts.assert_called_once()
@@ -0,0 +1,126 @@
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from traitlets.config import Config
+
+from grader_service.autograding.celery import tasks
+from grader_service.autograding.celery.tasks import (GraderTask, WorkerBootstrap, init_worker_process,
+                                                     worker_bootstrap)
+from grader_service.autograding.local_feedback import GenerateFeedbackExecutor
+from grader_service.convert.kernelpool import KernelPool
+from grader_service.handlers.base_handler import RequestHandlerConfig
+
+
+def make_celery(tmp_path):
+    c = Config()
+    c.GraderService.grader_service_dir = str(tmp_path)
+    celery = MagicMock(config=c)
+    celery._db = MagicMock(engine=create_engine("sqlite://"))
+    celery.db = celery._db
+    return celery
+
+
+def test_bootstrap(tmp_path):
+    bootstrap = WorkerBootstrap(make_celery(tmp_path))
+    assert bootstrap.grader_service_dir == str(tmp_path)
+    assert bootstrap.feedback_executor_class is GenerateFeedbackExecutor
+    assert bootstrap.Session().bind is not None
+
+
+def test_bootstrap_prestarts_kernels(tmp_path):
+    celery = make_celery(tmp_path)
+    celery.config.KernelPool.prestart_keys = ["lecture"]
+    try:
+        with patch.object(KernelPool, "prestart") as prestart:
+            WorkerBootstrap(celery)
+        prestart.assert_called_once_with("python3", "lecture")
+    finally:
+        KernelPool.clear_instance()
+
+
+def test_bootstrap_without_prestart_keys(tmp_path):
+    with patch.object(KernelPool, "instance") as instance:
+        WorkerBootstrap(make_celery(tmp_path))
+    instance.assert_not_called()
+
+
+def test_bootstrap_is_cached(tmp_path):
+    celery = make_celery(tmp_path)
+    with patch.object(tasks, "_bootstrap", None), \
+            patch("grader_service.autograding.celery.tasks.CeleryApp.instance", return_value=celery):
+        assert worker_bootstrap() is worker_bootstrap()
+
+
+def test_worker_process_init_disposes_inherited_connections(tmp_path):
+    celery = make_celery(tmp_path)
+    engine = celery._db.engine
+    with patch.object(tasks, "_bootstrap", None), \
+            patch("grader_service.autograding.celery.tasks.CeleryApp.instance", return_value=celery), \
+            patch.object(engine, "dispose") as dispose:
+        inherited = worker_bootstrap()
+        init_worker_process()
+        dispose.assert_called_once_with(close=False)
+        assert tasks._bootstrap is not None
+        assert tasks._bootstrap is not inherited
+
+
+def test_tasks_reuse_bootstrap_of_worker_process(tmp_path):
+    celery = make_celery(tmp_path)
+    with patch.object(tasks, "_bootstrap", None), \
+            patch("grader_service.autograding.celery.tasks.CeleryApp.instance", return_value=celery):
+        init_worker_process()
+        bootstrap = tasks._bootstrap
+        task = GraderTask()
+        with patch.object(tasks, "WorkerBootstrap") as build:
+            for _ in range(3):
+                start_task(task)
+        build.assert_not_called()
+        assert task.bootstrap is bootstrap
+    RequestHandlerConfig.clear_instance()
+
+
+def start_task(task: GraderTask) -> float:
+    """Runs the startup and teardown of a task and returns the time until it can grade."""
+    start = time.perf_counter()
+    task.before_start("task", (), {})
+    task._sessions["task"], task.bootstrap.grader_service_dir, task.bootstrap.autograde_executor_class
+    duration = time.perf_counter() - start
+    task.after_return("SUCCESS", None, "task", (), {}, None)
+    return duration
+
+
+@pytest.mark.skipif(not os.environ.get("GRADER_SERVICE_BENCHMARKS"),
+                    reason="Wall-clock benchmark, set GRADER_SERVICE_BENCHMARKS=1 to run it")
+def test_benchmark_task_startup(tmp_path):
+    """
+    Compares the startup of the first task of a worker process, which builds the
+    service directory, session factory and executor classes if the process was not
+    bootstrapped in worker_process_init, and the startup of the following tasks.
+    """
+    celery = make_celery(tmp_path)
+    n = 20
+    with patch.object(tasks, "_bootstrap", None), \
+            patch("grader_service.autograding.celery.tasks.CeleryApp.instance", return_value=celery):
+        task = GraderTask()
+        # imports are shared by both cases
+        worker_bootstrap()
+
+        first_task = {}
+        for bootstrapped in (False, True):
+            tasks._bootstrap = None
+            RequestHandlerConfig.clear_instance()
+            if bootstrapped:
+                init_worker_process()
+            first_task[bootstrapped] = start_task(task)
+        following_tasks = sum(start_task(task) for _ in range(n)) / n
+    RequestHandlerConfig.clear_instance()
+
+    saving = first_task[False] - first_task[True]
+    print(f"\ntask startup: first task {first_task[False] * 1000:.3f} ms without and "
+          f"{first_task[True] * 1000:.3f} ms with bootstrap at process init "
+          f"(saving {saving * 1000:.3f} ms), following tasks {following_tasks * 1000:.3f} ms")
+    assert first_task[True] < first_task[False]
+    assert following_tasks < first_task[False]
@@ -1,7 +1,10 @@
+import json
 import logging
 import shutil
 from unittest.mock import patch
 
+import pytest
+
 from grader_service.tests.convert.converters import _create_input_output_dirs
 from grader_service.convert.converters import GenerateAssignment, Autograde
 
@@ -170,3 +173,317 @@ def test_autograde_with_deleted_extra_file(tmp_path, caplog):
             ).start()
 
     mock_waring.assert_called_with(f"The file test.txt cannot be copied because it does not exist in {str(output_dir)}!")
+
+
+def test_autograde_parallel_notebooks(tmp_path, caplog):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb", "test.ipynb"])
+
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=None
+    ).start()
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    from traitlets.config import Config
+    c = Config()
+    c.Autograde.notebook_workers = 2
+    # the workers are spawned, so the kernel name has to be configured instead of patched
+    c.Execute.kernel_name = "python3"
+    with caplog.at_level(logging.INFO):
+        Autograde(
+            input_dir=str(output_dir),
+            output_dir=str(output_dir2),
+            file_pattern="*.ipynb",
+            copy_files=False,
+            config=c
+        ).start()
+
+    # the logs of the workers are forwarded
+    assert any(r.getMessage().startswith("Autograding") and r.getMessage().endswith("simple.ipynb")
+               for r in caplog.records)
+    assert (output_dir2 / "simple.ipynb").exists()
+    assert (output_dir2 / "test.ipynb").exists()
+
+    gradebook = json.loads((output_dir2 / "gradebook.json").read_text())
+    for name in ["simple", "test"]:
+        grades = gradebook["notebooks"][name]["grades_dict"]
+        assert len(grades) > 0
+        assert all(g["auto_score"] is not None or g["needs_manual_grade"] for g in grades.values())
+
+
+def test_autograde_parallel_notebooks_leave_no_kernels(tmp_path):
+    psutil = pytest.importorskip("psutil")
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb", "test.ipynb"])
+
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=None
+    ).start()
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    def kernels():
+        return {p.pid for p in psutil.process_iter(["cmdline"])
+                if "ipykernel_launcher" in " ".join(p.info["cmdline"] or [])}
+
+    from traitlets.config import Config
+    c = Config()
+    c.Autograde.notebook_workers = 2
+    c.Execute.kernel_name = "python3"
+    c.Execute.use_kernel_pool = True
+    before = kernels()
+    Autograde(
+        input_dir=str(output_dir),
+        output_dir=str(output_dir2),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=c
+    ).start()
+
+    assert kernels() - before == set()
+    # the config of the converter is not changed for the workers
+    assert c.Execute.use_kernel_pool
+
+
+def test_autograde_writes_notebook_once(tmp_path):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb"])
+
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=None
+    ).start()
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    from nbclient.client import NotebookClient
+    from nbconvert.writers import FilesWriter
+    write = FilesWriter.write
+    with patch.object(NotebookClient, "kernel_name", "python3"):
+        with patch.object(FilesWriter, "write", autospec=True, side_effect=write) as write_mock:
+            Autograde(
+                input_dir=str(output_dir),
+                output_dir=str(output_dir2),
+                file_pattern="*.ipynb",
+                copy_files=False,
+                config=None
+            ).start()
+
+    assert write_mock.call_count == 1
+    nb = json.loads((output_dir2 / "simple.ipynb").read_text())
+    # the notebook was executed in the output directory
+    assert any(len(c.get("outputs", [])) > 0 for c in nb["cells"])
+
+
+def test_autograde_writes_gradebook_once(tmp_path):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb", "test.ipynb"])
+
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=None
+    ).start()
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    from nbclient.client import NotebookClient
+    from grader_service.convert.gradebook.gradebook import Gradebook
+    write_model = Gradebook.write_model
+    with patch.object(NotebookClient, "kernel_name", "python3"):
+        with patch.object(Gradebook, "write_model", autospec=True, side_effect=write_model) as write_mock:
+            Autograde(
+                input_dir=str(output_dir),
+                output_dir=str(output_dir2),
+                file_pattern="*.ipynb",
+                copy_files=False,
+                config=None
+            ).start()
+
+    assert write_mock.call_count == 1
+    gradebook = json.loads((output_dir2 / "gradebook.json").read_text())
+    assert all(len(nb["grades_dict"]) > 0 for nb in gradebook["notebooks"].values())
+
+
+def test_autograde_incremental(tmp_path):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb", "test.ipynb"])
+
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=None
+    ).start()
+
+    previous_dir = tmp_path / "previous_dir"
+    previous_dir.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", previous_dir / "gradebook.json")
+
+    from traitlets.config import Config
+    from nbclient.client import NotebookClient
+    from grader_service.convert.preprocessors import Execute
+    c = Config()
+    c.Autograde.record_content_hashes = True
+    with patch.object(NotebookClient, "kernel_name", "python3"):
+        Autograde(
+            input_dir=str(output_dir),
+            output_dir=str(previous_dir),
+            file_pattern="*.ipynb",
+            copy_files=False,
+            config=c
+        ).start()
+    previous_gradebook = json.loads((previous_dir / "gradebook.json").read_text())
+    assert all(nb["content_hash"] is not None for nb in previous_gradebook["notebooks"].values())
+
+    # the student changes one of the notebooks
+    submission_dir = tmp_path / "submission_dir"
+    shutil.copytree(output_dir, submission_dir)
+    nb = json.loads((submission_dir / "test.ipynb").read_text())
+    nb["cells"].append({"cell_type": "markdown", "metadata": {}, "source": "changed"})
+    (submission_dir / "test.ipynb").write_text(json.dumps(nb))
+
+    output_dir3 = tmp_path / "output_dir3"
+    output_dir3.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir3 / "gradebook.json")
+
+    c = Config()
+    c.Autograde.previous_output_dir = str(previous_dir)
+    preprocess = Execute.preprocess
+    with patch.object(NotebookClient, "kernel_name", "python3"):
+        with patch.object(Execute, "preprocess", autospec=True, side_effect=preprocess) as execute_mock:
+            Autograde(
+                input_dir=str(submission_dir),
+                output_dir=str(output_dir3),
+                file_pattern="*.ipynb",
+                copy_files=False,
+                config=c
+            ).start()
+
+    assert execute_mock.call_count == 1
+    assert (output_dir3 / "simple.ipynb").read_text() == (previous_dir / "simple.ipynb").read_text()
+    gradebook = json.loads((output_dir3 / "gradebook.json").read_text())
+    simple, previous_simple = gradebook["notebooks"]["simple"], previous_gradebook["notebooks"]["simple"]
+    assert simple["content_hash"] == previous_simple["content_hash"]
+    for field in ("auto_score", "execution_time"):
+        assert ({k: g[field] for k, g in simple["grades_dict"].items()}
+                == {k: g[field] for k, g in previous_simple["grades_dict"].items()})
+    assert (gradebook["notebooks"]["test"]["content_hash"]
+            != previous_gradebook["notebooks"]["test"]["content_hash"])
+
+
+def test_autograde_records_no_content_hashes_by_default(tmp_path):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb"])
+
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=None
+    ).start()
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    from nbclient.client import NotebookClient
+    with patch.object(NotebookClient, "kernel_name", "python3"):
+        with patch("grader_service.convert.utils.compute_notebook_checksum") as checksum_mock:
+            Autograde(
+                input_dir=str(output_dir),
+                output_dir=str(output_dir2),
+                file_pattern="*.ipynb",
+                copy_files=False,
+                config=None
+            ).start()
+
+    checksum_mock.assert_not_called()
+    gradebook = json.loads((output_dir2 / "gradebook.json").read_text())
+    assert gradebook["notebooks"]["simple"]["content_hash"] is None
+
+
+def _autograde_unchanged_solutions(tmp_path, change_solution):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb"])
+
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=False,
+        config=None
+    ).start()
+
+    if change_solution:
+        nb = json.loads((output_dir / "simple.ipynb").read_text())
+        for cell in nb["cells"]:
+            if cell["metadata"].get("nbgrader", {}).get("solution") and cell["cell_type"] == "code":
+                cell["source"] = "def reverse(s):\n    return s[::-1]"
+        (output_dir / "simple.ipynb").write_text(json.dumps(nb))
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    from traitlets.config import Config
+    from nbclient.client import NotebookClient
+    from grader_service.convert.preprocessors import Execute
+    c = Config()
+    c.Autograde.skip_unchanged_solutions = True
+    c.Autograde.record_content_hashes = True
+    preprocess = Execute.preprocess
+    with patch.object(NotebookClient, "kernel_name", "python3"):
+        with patch.object(Execute, "preprocess", autospec=True, side_effect=preprocess) as execute_mock:
+            Autograde(
+                input_dir=str(output_dir),
+                output_dir=str(output_dir2),
+                file_pattern="*.ipynb",
+                copy_files=False,
+                config=c
+            ).start()
+    gradebook = json.loads((output_dir2 / "gradebook.json").read_text())
+    return execute_mock.call_count, gradebook["notebooks"]["simple"], output_dir2
+
+
+def test_autograde_skips_unchanged_solutions(tmp_path):
+    execute_count, notebook, output_dir = _autograde_unchanged_solutions(tmp_path, change_solution=False)
+
+    assert execute_count == 0
+    grades = notebook["grades_dict"]
+    # the test cells and the markdown solution cell get zero points
+    assert {k: g["auto_score"] for k, g in grades.items()} == {
+        "cell-da8c82e850a1922b": 0, "cell-81540a070d18c412": 0, "cell-9ea0264ada6c25bd": 0,
+    }
+    assert notebook["comments_dict"]["cell-28df1799f8f8b769"]["auto_comment"] == "No response."
+    assert notebook["content_hash"] is not None
+
+    nb = json.loads((output_dir / "simple.ipynb").read_text())
+    test_cell = next(c for c in nb["cells"] if c["metadata"].get("nbgrader", {}).get("grade_id")
+                     == "cell-da8c82e850a1922b")
+    assert test_cell["outputs"][0]["ename"] == "NotExecuted"
+
+
+def test_autograde_executes_changed_solutions(tmp_path):
+    execute_count, notebook, _ = _autograde_unchanged_solutions(tmp_path, change_solution=True)
+
+    assert execute_count == 1
+    assert notebook["grades_dict"]["cell-da8c82e850a1922b"]["auto_score"] == 1
+    assert notebook["comments_dict"]["cell-28df1799f8f8b769"]["auto_comment"] is None
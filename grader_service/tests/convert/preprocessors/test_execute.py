@@ -23,3 +23,55 @@ class TestExecute(BaseTestPreprocessor):
         nb, resources = pp.preprocess(nb, res)
         assert nb is not None
         assert resources is not None
+
+    def test_execute_with_kernel_pool(self, tmp_path):
+        from grader_service.convert.kernelpool import KernelPool
+        from nbformat.v4 import new_code_cell
+
+        pool = KernelPool.instance()
+        nb = self._read_nb(os.path.join("files", "simple.ipynb"))
+        nb.cells.append(new_code_cell("import os; print(os.getcwd())"))
+        pp = Execute(timeout=5, kernel_name='python3', use_kernel_pool=True, kernel_pool_key="test")
+
+        res = ResourcesDict(metadata={"path": str(tmp_path)})
+        try:
+            nb, resources = pp.preprocess(nb, res)
+            assert nb.cells[-1].outputs[0].text.strip() == str(tmp_path)
+
+            # the kernel is recycled and leased again for the next notebook
+            km = pool.acquire("python3", key="test")
+            assert km.has_kernel
+            pool.release(km, "python3", key="test")
+        finally:
+            pool.shutdown_all()
+            KernelPool.clear_instance()
+
+    def test_execute_records_grade_cell_timing(self):
+        from nbformat.v4 import new_code_cell, new_notebook
+        from .. import create_grade_cell
+
+        nb = new_notebook()
+        nb.cells.append(new_code_cell("x = 1"))
+        nb.cells.append(create_grade_cell("import time; time.sleep(0.2)", "code", "foo", 1))
+        pp = Execute(timeout=5, kernel_name='python3', record_kernel_memory=True)
+
+        nb, resources = pp.preprocess(nb, ResourcesDict(nbgrader={}))
+        assert list(resources["nbgrader"]["execution_times"]) == ["foo"]
+        assert resources["nbgrader"]["execution_times"]["foo"] >= 0.2
+        assert resources["nbgrader"]["kernel_memory"]["foo"] > 0
+        assert nb.cells[1].execution_count == 2
+
+    def test_execute_cell_timeouts(self):
+        from nbformat.v4 import new_notebook
+        from .. import create_grade_cell
+
+        nb = new_notebook()
+        nb.cells.append(create_grade_cell("import time; time.sleep(30)", "code", "slow", 1))
+        nb.cells.append(create_grade_cell("x = 1", "code", "other", 1))
+        pp = Execute(timeout=60, kernel_name='python3', cell_timeouts={"test/slow": 1, "other/slow": 60})
+
+        nb, resources = pp.preprocess(nb, ResourcesDict(unique_key="test", nbgrader={}))
+        timeout_output = [o for o in nb.cells[0].outputs if o.get("ename") == "CellTimeoutError"]
+        assert len(timeout_output) == 1
+        assert "1 seconds" in timeout_output[0].traceback[0]
+        assert resources["nbgrader"]["execution_times"]["slow"] < 30
@@ -55,6 +55,22 @@ class TestSaveAutoGrades(BaseTestPreprocessor):
         assert grade_cell.manual_score == None
         assert not grade_cell.needs_manual_grade
 
+    def test_grade_execution_time(self, preprocessors, gradebook, resources):
+        """Are the execution time and memory recorded by Execute saved?"""
+        cell = create_grade_cell("hello", "code", "foo", 1)
+        cell.metadata.nbgrader['checksum'] = compute_checksum(cell)
+        nb = new_notebook()
+        nb.cells.append(cell)
+        resources["nbgrader"]["execution_times"] = {"foo": 1.5}
+        resources["nbgrader"]["kernel_memory"] = {"foo": 1024}
+        preprocessors[0].preprocess(nb, resources)
+        preprocessors[1].preprocess(nb, resources)
+
+        gradebook = Gradebook(dest_json=resources["output_json_path"])
+        grade_cell = gradebook.find_grade("foo", "test")
+        assert grade_cell.execution_time == 1.5
+        assert grade_cell.kernel_memory == 1024
+
     def test_grade_incorrect_code(self, preprocessors, gradebook, resources):
         """Is a failing code cell correctly graded?"""
         cell = create_grade_cell("hello", "code", "foo", 1)
@@ -0,0 +1,168 @@
+import errno
+import os
+import shutil
+import stat
+from unittest.mock import patch
+
+import pytest
+from traitlets.config import Config
+
+from grader_service.convert.converters import GenerateAssignment
+from grader_service.convert.filecache import FileCache
+from grader_service.tests.convert.converters import _create_input_output_dirs
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FileCache(cache_dir=str(tmp_path / "cache"), min_file_size=4, link_mode="hardlink")
+
+
+def test_disabled_cache_copies(tmp_path):
+    src = tmp_path / "data.csv"
+    src.write_text("a,b\n1,2\n")
+    assert not FileCache().place(str(src), str(tmp_path / "copy.csv"))
+    assert (tmp_path / "copy.csv").read_text() == "a,b\n1,2\n"
+
+
+def test_place_links_deduplicated_files(tmp_path, cache):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    for d in ["a", "b"]:
+        (tmp_path / d / "data.csv").write_text("a,b\n1,2\n")
+
+    assert cache.place(str(tmp_path / "a" / "data.csv"), str(tmp_path / "out1.csv"))
+    assert cache.place(str(tmp_path / "b" / "data.csv"), str(tmp_path / "out2.csv"))
+
+    assert os.path.samefile(tmp_path / "out1.csv", tmp_path / "out2.csv")
+    assert not os.stat(tmp_path / "out1.csv").st_mode & stat.S_IWUSR
+    assert len(list((tmp_path / "cache" / "objects").glob("*/*"))) == 1
+
+
+def test_small_files_are_copied(tmp_path, cache):
+    src = tmp_path / "small.txt"
+    src.write_text("a")
+    assert not cache.place(str(src), str(tmp_path / "out.txt"))
+    assert not (tmp_path / "cache").exists()
+
+
+def test_place_replaces_links_without_writing_through(tmp_path, cache):
+    src = tmp_path / "data.csv"
+    src.write_text("old content")
+    cache.place(str(src), str(tmp_path / "out.csv"))
+    src.write_text("new content")
+    cache.place(str(src), str(tmp_path / "out.csv"))
+
+    assert (tmp_path / "out.csv").read_text() == "new content"
+    objects = sorted(p.read_text() for p in (tmp_path / "cache" / "objects").glob("*/*"))
+    assert objects == ["new content", "old content"]
+
+
+def test_content_ids_are_hashed_once(tmp_path, cache):
+    # the same file materialized again for another submission
+    for i in range(2):
+        (tmp_path / f"submission_{i}").mkdir()
+        (tmp_path / f"submission_{i}" / "data.csv").write_text("a,b\n1,2\n")
+    cache.content_ids = {str(tmp_path / f"submission_{i}" / "data.csv"): "blob" for i in range(2)}
+    with patch.object(FileCache, "file_digest", wraps=FileCache.file_digest) as file_digest:
+        cache.place(str(tmp_path / "submission_0" / "data.csv"), str(tmp_path / "out1.csv"))
+        cache.place(str(tmp_path / "submission_1" / "data.csv"), str(tmp_path / "out2.csv"))
+        assert file_digest.call_count == 1
+        # files without content id are always hashed
+        cache.content_ids = {}
+        cache.place(str(tmp_path / "submission_1" / "data.csv"), str(tmp_path / "out3.csv"))
+        assert file_digest.call_count == 2
+    assert os.path.samefile(tmp_path / "out1.csv", tmp_path / "out3.csv")
+
+
+def test_modified_shared_object_is_replaced(tmp_path, cache):
+    src = tmp_path / "data.csv"
+    src.write_text("a,b\n1,2\n")
+    out = tmp_path / "out1.csv"
+    cache.place(str(src), str(out))
+    # e.g. a grading process running as root
+    os.chmod(out, 0o644)
+    out.write_text("corrupted")
+
+    cache.place(str(src), str(tmp_path / "out2.csv"))
+    assert (tmp_path / "out2.csv").read_text() == "a,b\n1,2\n"
+    assert not os.path.samefile(out, tmp_path / "out2.csv")
+
+
+def test_hardlink_is_default(tmp_path):
+    assert FileCache().link_mode == "hardlink"
+
+
+def test_reflink_outputs_do_not_share_the_object(tmp_path):
+    cache = FileCache(cache_dir=str(tmp_path / "cache"), min_file_size=4, link_mode="reflink")
+    src = tmp_path / "data.csv"
+    src.write_text("a,b\n1,2\n")
+    with patch.object(FileCache, "_reflink", side_effect=shutil.copyfile), \
+            patch.dict(FileCache._reflink_support, clear=True):
+        assert not cache.place(str(src), str(tmp_path / "out.csv"))
+    assert os.stat(tmp_path / "out.csv").st_nlink == 1
+    assert (tmp_path / "out.csv").read_text() == "a,b\n1,2\n"
+
+
+def test_unsupported_reflink_falls_back_to_hardlink(tmp_path, caplog):
+    cache = FileCache(cache_dir=str(tmp_path / "cache"), min_file_size=4, link_mode="reflink")
+    src = tmp_path / "data.csv"
+    src.write_text("a,b\n1,2\n")
+    error = OSError(errno.EOPNOTSUPP, "Operation not supported")
+    with patch.object(FileCache, "_reflink", side_effect=error) as reflink, \
+            patch.dict(FileCache._reflink_support, clear=True):
+        assert cache.place(str(src), str(tmp_path / "out1.csv"))
+        assert cache.place(str(src), str(tmp_path / "out2.csv"))
+    # detected once, the data is not copied for every output
+    assert reflink.call_count == 1
+    assert os.path.samefile(tmp_path / "out1.csv", tmp_path / "out2.csv")
+    assert sum("Reflinks are not supported" in r.message for r in caplog.records) == 1
+
+
+def test_evict_least_recently_used(tmp_path, cache):
+    cache.max_size = 20
+    for i, content in enumerate(["0123456789", "abcdefghij", "ABCDEFGHIJ"]):
+        src = tmp_path / f"data{i}.txt"
+        src.write_text(content)
+        path = cache._store(str(src), cache.file_digest(str(src)))
+        os.utime(path, (i, i))
+
+    remaining = sorted(p.read_text() for p in (tmp_path / "cache" / "objects").glob("*/*"))
+    assert remaining == ["ABCDEFGHIJ", "abcdefghij"]
+
+
+def test_evict_prunes_index(tmp_path, cache):
+    cache.max_size = 10
+    for i, content in enumerate(["0123456789", "abcdefghij"]):
+        src = tmp_path / f"data{i}.txt"
+        src.write_text(content)
+        cache.content_ids = {str(src): f"blob{i}"}
+        cache.place(str(src), str(tmp_path / f"out{i}.txt"))
+        os.utime(cache.object_path(cache.file_digest(str(src))), (i, i))
+    cache.evict()
+
+    index = tmp_path / "cache" / "index"
+    assert [p.name for p in (index / "files").glob("*/*")] == ["blob1"]
+    assert len(list((index / "objects").glob("*/*"))) == 1
+
+
+def test_converter_links_extra_files(tmp_path):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb"])
+    (input_dir / "data.csv").write_text("a,b\n1,2\n" * 100)
+
+    c = Config()
+    c.FileCache.cache_dir = str(tmp_path / "cache")
+    c.FileCache.min_file_size = 100
+    c.FileCache.link_mode = "hardlink"
+    GenerateAssignment(
+        input_dir=str(input_dir),
+        output_dir=str(output_dir),
+        file_pattern="*.ipynb",
+        copy_files=True,
+        config=c
+    ).start()
+
+    data = output_dir / "data.csv"
+    assert data.read_text() == "a,b\n1,2\n" * 100
+    assert os.stat(data).st_nlink == 2
+    # the permissions of the shared file are not changed
+    assert not os.stat(data).st_mode & stat.S_IWUSR
@@ -0,0 +1,68 @@
+import pytest
+
+from grader_service.convert.kernelpool import KernelPool
+
+
+@pytest.fixture
+def pool():
+    pool = KernelPool(max_kernels_per_key=1, warmup_code="x = 1")
+    yield pool
+    pool.shutdown_all()
+
+
+def test_acquire_starts_kernel(pool):
+    km = pool.acquire("python3")
+    assert km.has_kernel
+    pool.release(km, "python3")
+
+
+def test_release_recycles_kernel(pool):
+    km = pool.acquire("python3", key="lecture")
+    pool.release(km, "python3", key="lecture")
+    assert pool.acquire("python3", key="lecture") is km
+    pool.release(km, "python3", key="lecture")
+
+
+def test_keys_are_separated(pool):
+    km = pool.acquire("python3", key="a")
+    pool.release(km, "python3", key="a")
+    other = pool.acquire("python3", key="b")
+    assert other is not km
+    pool.release(other, "python3", key="b")
+
+
+def test_release_over_capacity_shuts_down(pool):
+    km1 = pool.acquire("python3")
+    km2 = pool.acquire("python3")
+    pool.release(km1, "python3")
+    pool.release(km2, "python3")
+    assert pool.acquire("python3") is km1
+    pool.release(km1, "python3")
+
+
+def test_idle_eviction(pool):
+    km = pool.acquire("python3")
+    pool.release(km, "python3")
+    pool._executor.submit(lambda: None).result()
+    pool.idle_timeout = 0
+    pool.evict_idle()
+    new_km = pool.acquire("python3")
+    assert new_km is not km
+    pool.release(new_km, "python3")
+
+
+def test_dead_kernel_is_discarded(pool):
+    from jupyter_client.utils import run_sync
+    km = pool.acquire("python3")
+    pool.release(km, "python3")
+    pool._executor.submit(lambda: None).result()
+    run_sync(km.shutdown_kernel)(now=True)
+    new_km = pool.acquire("python3")
+    assert new_km is not km
+    assert run_sync(new_km.is_alive)()
+    pool.release(new_km, "python3")
+
+
+def test_supports_only_python_kernels(pool):
+    assert pool.supports("python3")
+    assert not pool.supports("does-not-exist")
@@ -21,6 +21,8 @@ from .db_util import insert_submission
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
 from grader_service.autograding.local_grader import LocalAutogradeExecutor
 from grader_service.autograding.local_feedback import GenerateFeedbackExecutor
+from grader_service.autograding.celery.tasks import _finish_job_task, _update_job
+from sqlalchemy.orm import sessionmaker
 
 # Imports are important otherwise they will not be found
 from .db_util import insert_assignments
@@ -59,6 +61,67 @@ async def test_auto_grading(
     task_mock.assert_called()
 
 
+async def test_auto_grading_duplicate(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_token,
+        default_user,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/grading/1/auto"
+
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name)
+
+    with patch.object(grader_service.autograding.celery.app.CeleryApp, 'instance', return_value=MagicMock()):
+        with patch.object(grader_service.autograding.celery.tasks.autograde_task, "delay", return_value=None) as task_mock:
+            for _ in range(3):
+                response = await http_server_client.fetch(
+                    url, method="GET", headers={"Authorization": f"Token {default_token}"}
+                )
+                assert response.code == 202
+
+    # the duplicates attach to the queued task
+    task_mock.assert_called_once()
+    assert response.reason == "Autograding submission process already in progress"
+
+
+async def test_auto_grading_bypass_cache(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_token,
+        default_user,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/grading/1/auto?bypass-cache=true"
+
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name)
+
+    with patch.object(grader_service.autograding.celery.app.CeleryApp, 'instance', return_value=MagicMock()):
+        with patch.object(grader_service.autograding.celery.tasks.autograde_task, "delay", return_value=None) as task_mock:
+            response = await http_server_client.fetch(
+                url, method="GET", headers={"Authorization": f"Token {default_token}"}
+            )
+
+    assert response.code == 202
+    task_mock.assert_called_with(l_id, a_id, 1, bypass_cache=True)
+
+
 async def test_auto_grading_wrong_assignment(
         app: GraderServer,
         service_base_url,
@@ -174,3 +237,135 @@ async def test_feedback_wrong_assignment(
         )
     e = exc_info.value
     assert e.code == 404
+
+
+async def test_bulk_auto_grading(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_token,
+        default_user,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name)
+    insert_submission(engine, a_id, default_user.name, with_properties=False)
+    insert_submission(engine, a_id, "user1")
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/grading/auto"
+    with patch.object(grader_service.autograding.celery.app.CeleryApp, 'instance', return_value=MagicMock()):
+        with patch.object(celery, "group") as group_mock:
+            response = await http_server_client.fetch(
+                url, method="POST", headers={"Authorization": f"Token {default_token}"},
+                body=json.dumps({"filter": "latest"})
+            )
+    assert response.code == 202
+    job = json.loads(response.body.decode())
+    assert job["total"] == 2
+    assert job["queued"] == 2
+    assert job["status"] == "queued"
+    chains = group_mock.call_args.args[0]
+    sub_ids = sorted(sig.args[2] for chain in chains for sig in chain.tasks)
+    assert sub_ids == [2, 3]
+    assert all(sig.kwargs["job_id"] == job["id"] for chain in chains for sig in chain.tasks)
+
+    session = sessionmaker(engine)()
+    _update_job(session, job["id"], running=1)
+    assert not _finish_job_task(session, job["id"], success=True)
+    _update_job(session, job["id"], running=1)
+
+    progress_url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/grading/jobs/{job['id']}"
+    response = await http_server_client.fetch(
+        progress_url, method="GET", headers={"Authorization": f"Token {default_token}"})
+    progress = json.loads(response.body.decode())
+    assert (progress["status"], progress["queued"], progress["running"], progress["succeeded"]) == \
+           ("running", 0, 1, 1)
+
+    assert _finish_job_task(session, job["id"], success=False)
+    response = await http_server_client.fetch(
+        progress_url, method="GET", headers={"Authorization": f"Token {default_token}"})
+    progress = json.loads(response.body.decode())
+    assert progress["status"] == "completed"
+    assert (progress["succeeded"], progress["failed"]) == (1, 1)
+
+
+async def test_bulk_auto_grading_explicit_ids(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_token,
+        default_user,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name)
+    insert_submission(engine, a_id, "user1")
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/grading/auto"
+    with patch.object(grader_service.autograding.celery.app.CeleryApp, 'instance', return_value=MagicMock()):
+        with patch.object(celery, "group") as group_mock:
+            response = await http_server_client.fetch(
+                url, method="POST", headers={"Authorization": f"Token {default_token}"},
+                body=json.dumps({"ids": [1], "sync_lti": True})
+            )
+            assert json.loads(response.body.decode())["total"] == 1
+            with pytest.raises(HTTPClientError) as exc_info:
+                await http_server_client.fetch(
+                    url, method="POST", headers={"Authorization": f"Token {default_token}"},
+                    body=json.dumps({"ids": [42]})
+                )
+            assert exc_info.value.code == 400
+            for body in ["{", "[1]", json.dumps({"ids": ["a"]}), json.dumps({"ids": 1}),
+                         json.dumps({"ids": [None]})]:
+                with pytest.raises(HTTPClientError) as exc_info:
+                    await http_server_client.fetch(
+                        url, method="POST", headers={"Authorization": f"Token {default_token}"},
+                        body=body
+                    )
+                assert exc_info.value.code == 400
+    assert group_mock.call_count == 1
+
+
+async def test_bulk_auto_grading_best_breaks_ties(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_token,
+        default_user,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name, score=2.0)
+    insert_submission(engine, a_id, default_user.name, with_properties=False, score=2.0)
+    insert_submission(engine, a_id, default_user.name, with_properties=False, score=1.0)
+    insert_submission(engine, a_id, "user1")
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/grading/auto"
+    with patch.object(grader_service.autograding.celery.app.CeleryApp, 'instance', return_value=MagicMock()):
+        with patch.object(celery, "group") as group_mock:
+            response = await http_server_client.fetch(
+                url, method="POST", headers={"Authorization": f"Token {default_token}"},
+                body=json.dumps({"filter": "best"})
+            )
+    assert json.loads(response.body.decode())["total"] == 2
+    chains = group_mock.call_args.args[0]
+    # the latest of the best submissions of each user
+    assert sorted(sig.args[2] for chain in chains for sig in chain.tasks) == [2, 4]
@@ -8,14 +8,19 @@ import subprocess
 from datetime import datetime
 from re import sub
 import secrets
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import isodate
 import pytest
 from grader_service.server import GraderServer
 import json
+from grader_service.autograding.admission import AdmissionController
+from grader_service.autograding.celery.app import CeleryApp
+from grader_service.autograding.dedup import AUTOGRADE, TaskDeduplicator
 from grader_service.orm.assignment import Assignment as AssignmentORM
+from grader_service.orm.submission import Submission as SubmissionORM
 from grader_service.api.models.submission import Submission
+from sqlalchemy.orm import sessionmaker
 from tornado.httpclient import HTTPClientError
 from datetime import timezone
 from .db_util import insert_submission, insert_take_part, _get_assignment
@@ -27,7 +32,11 @@ from ...api.models.assignment import Assignment
 from ...handlers.base_handler import GraderBaseHandler
 from ...handlers.submissions import SubmissionHandler
 from ...orm import Role
+from ...orm.submission_logs import SubmissionLogs
+from ...orm.submission_metrics import SubmissionMetrics
+from ...orm.submission_properties import SubmissionProperties
 from ...orm.takepart import Scope
+from ...orm.task_lock import TaskLock
 
 
 async def submission_test_setup(sql_alchemy_db, http_server_client, default_user, default_token,
@@ -1058,3 +1067,300 @@ async def test_max_submissions_assignment(
 
     e = exc_info.value
     assert e.code == 409
+
+
+async def test_submission_logs_tail(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_user,
+        default_token,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login,
+):
+    l_id = 3  # user has to be instructor
+    a_id = 3
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name)
+    session = sessionmaker(engine)()
+    session.add(SubmissionLogs(sub_id=1, logs="cdefgh", offset=2))
+    session.commit()
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/submissions/1/logs/tail"
+
+    async def tail(offset):
+        response = await http_server_client.fetch(
+            url + f"?offset={offset}", method="GET",
+            headers={"Authorization": f"Token {default_token}"})
+        assert response.code == 200
+        return json.loads(response.body.decode())
+
+    assert await tail(5) == {"logs": "fgh", "offset": 5, "next_offset": 8}
+    assert await tail(8) == {"logs": "", "offset": 8, "next_offset": 8}
+    # dropped or replaced logs are returned from the beginning of the stored logs
+    assert await tail(0) == {"logs": "cdefgh", "offset": 2, "next_offset": 8}
+    assert await tail(20) == {"logs": "cdefgh", "offset": 2, "next_offset": 8}
+
+    with pytest.raises(HTTPClientError) as exc_info:
+        await http_server_client.fetch(
+            url + "?offset=abc", method="GET",
+            headers={"Authorization": f"Token {default_token}"})
+    assert exc_info.value.code == 400
+
+
+async def test_submission_metrics(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_user,
+        default_token,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login,
+):
+    l_id = 3  # user has to be instructor
+    a_id = 3
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name)
+    insert_submission(engine, a_id, default_user.name, with_properties=False)
+    session = sessionmaker(engine)()
+    session.add(SubmissionMetrics(sub_id=1, pull_time=1.0, execute_time=10.0, total_time=12.0, peak_rss=100))
+    session.add(SubmissionMetrics(sub_id=2, pull_time=3.0, execute_time=20.0, total_time=24.0, peak_rss=300))
+    session.commit()
+
+    headers = {"Authorization": f"Token {default_token}"}
+    response = await http_server_client.fetch(
+        service_base_url + f"/lectures/{l_id}/assignments/{a_id}/submissions/1/metrics",
+        method="GET", headers=headers)
+    assert response.code == 200
+    metrics = json.loads(response.body.decode())
+    assert metrics["execute_time"] == 10.0
+    assert metrics["push_time"] is None
+
+    response = await http_server_client.fetch(
+        service_base_url + f"/lectures/{l_id}/assignments/{a_id}/metrics",
+        method="GET", headers=headers)
+    assert response.code == 200
+    aggregate = json.loads(response.body.decode())
+    assert aggregate["count"] == 2
+    assert aggregate["pull_time"] == {"mean": 2.0, "max": 3.0}
+    assert aggregate["peak_rss"]["max"] == 300
+    assert aggregate["cpu_time"] == {"mean": None, "max": None}
+
+    with pytest.raises(HTTPClientError) as exc_info:
+        await http_server_client.fetch(
+            service_base_url + f"/lectures/{l_id}/assignments/{a_id}/submissions/3/metrics",
+            method="GET", headers=headers)
+    assert exc_info.value.code == 404
+
+
+async def test_assignment_hot_cells(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_user,
+        default_token,
+        sql_alchemy_db,
+        default_roles,
+        default_user_login,
+):
+    l_id = 3  # user has to be instructor
+    a_id = 3
+    engine = sql_alchemy_db.engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name)
+    insert_submission(engine, a_id, default_user.name, with_properties=False)
+    insert_submission(engine, a_id, default_user.name, with_properties=False)
+
+    def gradebook(slow, fast):
+        grades = {"slow": {"execution_time": slow, "kernel_memory": 2048},
+                  "fast": {"execution_time": fast},
+                  "manual": {"execution_time": None}}
+        return json.dumps({"notebooks": {"nb": {"grades_dict": grades}}})
+
+    session = sessionmaker(engine)()
+    for sub_id, properties in ((1, gradebook(3.0, 1.0)), (2, gradebook(5.0, 0.5)), (3, gradebook(100.0, 100.0))):
+        session.merge(SubmissionProperties(sub_id=sub_id, properties=properties))
+    session.query(SubmissionORM).filter(SubmissionORM.id.in_([1, 2])).update(
+        {SubmissionORM.auto_status: "automatically_graded"}, synchronize_session=False)
+    session.commit()
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/metrics/cells"
+    response = await http_server_client.fetch(
+        url, method="GET", headers={"Authorization": f"Token {default_token}"})
+    assert response.code == 200
+    cells = json.loads(response.body.decode())
+    assert [c["grade_id"] for c in cells] == ["slow", "fast"]
+    assert cells[0]["count"] == 2
+    assert cells[0]["total_time"] == 8.0
+    assert cells[0]["mean_time"] == 4.0
+    assert cells[0]["max_time"] == 5.0
+    assert cells[0]["max_kernel_memory"] == 2048
+    assert cells[0]["share"] == 8.0 / 9.5
+    assert cells[1]["max_kernel_memory"] is None
+
+    response = await http_server_client.fetch(
+        url + "?limit=1", method="GET", headers={"Authorization": f"Token {default_token}"})
+    assert [c["grade_id"] for c in json.loads(response.body.decode())] == ["slow"]
+
+
+async def test_submission_admission_and_queue(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_user,
+        default_token,
+        sql_alchemy_db,
+        tmp_path,
+        default_roles,
+        default_user_login,
+):
+    l_id = 1  # user is student
+    a_id = 3
+
+    session = sql_alchemy_db.sessionmaker()
+    assignment_orm = _get_assignment("pytest", l_id, "2055-06-06 23:59:00.000", 20, "released")
+    assignment_orm.automatic_grading = "auto"
+    session.add(assignment_orm)
+    session.commit()
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/submissions/"
+    pre_submission = Submission(id=-1, commit_hash=secrets.token_hex(20))
+    admission = AdmissionController(user_rate_limit=2, supersede_pending=True,
+                                    expected_job_duration=30.0)
+
+    async def post():
+        return await http_server_client.fetch(
+            url, method="POST", headers={"Authorization": f"Token {default_token}"},
+            body=json.dumps(pre_submission.to_dict()),
+        )
+
+    with patch.object(subprocess, "run", return_value=None), \
+            patch.object(GraderBaseHandler, "construct_git_dir", return_value=str(tmp_path)), \
+            patch.object(AdmissionController, "instance", return_value=admission), \
+            patch.object(CeleryApp, "instance", return_value=MagicMock(submission_options={})), \
+            patch("grader_service.handlers.submissions.chain") as chain_mock:
+        assert (await post()).code == 202
+        assert (await post()).code == 202
+        assert chain_mock.call_count == 2
+
+        # the second submission supersedes the pending first one
+        session.expire_all()
+        assert session.query(SubmissionORM).get(1).auto_status == "not_graded"
+        assert session.query(SubmissionORM).get(2).auto_status == "pending"
+        # the grading tasks of the submissions are registered
+        assert {lock.sub_id for lock in session.query(TaskLock)} == {1, 2}
+
+        response = await http_server_client.fetch(
+            url + "2/queue", method="GET", headers={"Authorization": f"Token {default_token}"})
+        assert json.loads(response.body.decode()) == {"position": 0, "expected_wait": 30.0}
+        response = await http_server_client.fetch(
+            url + "1/queue", method="GET", headers={"Authorization": f"Token {default_token}"})
+        assert json.loads(response.body.decode()) == {"position": None, "expected_wait": None}
+
+        # the rate limit of the user is reached, the submission is recorded but its grading is delayed
+        assert (await post()).code == 202
+        assert chain_mock.call_count == 3
+        chain_mock.return_value.apply_async.assert_called_once_with(countdown=admission.throttle_delay)
+        session.expire_all()
+        assert session.query(SubmissionORM).get(3).auto_status == "pending"
+
+
+def test_queue_position_is_per_queue(sql_alchemy_db):
+    session = sql_alchemy_db.sessionmaker()
+    session.add(_get_assignment("other", 2, "2055-06-06 23:59:00.000", 20, "released"))
+    session.commit()
+    submissions = []
+    for assignment_id in (1, 3, 1):
+        submission = SubmissionORM(assignid=assignment_id, username="user1", date=datetime.utcnow(),
+                                   commit_hash=secrets.token_hex(20), auto_status="pending",
+                                   manual_status="not_graded", feedback_status="not_generated")
+        session.add(submission)
+        session.commit()
+        submissions.append(submission)
+
+    admission = AdmissionController(expected_job_duration=10.0)
+    celery = MagicMock()
+    # every lecture is graded on its own queue
+    celery.queue.side_effect = lambda task_name, lecture_id: f"lecture-{lecture_id}"
+    with patch.object(CeleryApp, "instance", return_value=celery):
+        assert admission.queue_position(session, submissions[2]) == (1, 20.0)
+        assert admission.queue_position(session, submissions[1]) == (0, 10.0)
+    celery.queue.side_effect = lambda task_name, lecture_id: None
+    with patch.object(CeleryApp, "instance", return_value=celery):
+        assert admission.queue_position(session, submissions[2]) == (2, 30.0)
+
+
+def test_supersede_keeps_running_jobs(sql_alchemy_db):
+    session = sql_alchemy_db.sessionmaker()
+    submissions = []
+    for _ in range(3):
+        submission = SubmissionORM(assignid=1, username="user1", date=datetime.utcnow(),
+                                   commit_hash=secrets.token_hex(20), auto_status="pending",
+                                   manual_status="not_graded", feedback_status="generating")
+        session.add(submission)
+        session.commit()
+        TaskDeduplicator.instance().register(session, AUTOGRADE, submission)
+        session.commit()
+        submissions.append(submission)
+    # the task of the first submission is already grading it
+    TaskDeduplicator.instance().start(session, AUTOGRADE, submissions[0].id)
+
+    admission = AdmissionController(supersede_pending=True)
+    assert admission.supersede(session, submissions[2]) == [submissions[1]]
+    session.commit()
+    assert submissions[0].auto_status == "pending"
+    assert submissions[0].feedback_status == "generating"
+    assert submissions[1].auto_status == "not_graded"
+    assert submissions[1].feedback_status == "not_generated"
+    assert submissions[2].auto_status == "pending"
+
+
+@pytest.mark.parametrize("fuse_feedback", [True, False])
+async def test_full_auto_submission_fuses_feedback(
+        app: GraderServer,
+        service_base_url,
+        http_server_client,
+        default_user,
+        default_token,
+        sql_alchemy_db,
+        tmp_path,
+        default_roles,
+        default_user_login,
+        fuse_feedback,
+):
+    l_id = 1  # user is student
+    a_id = 3
+
+    session = sql_alchemy_db.sessionmaker()
+    assignment_orm = _get_assignment("pytest", l_id, "2055-06-06 23:59:00.000", 20, "released")
+    assignment_orm.automatic_grading = "full_auto"
+    session.add(assignment_orm)
+    session.commit()
+
+    url = service_base_url + f"/lectures/{l_id}/assignments/{a_id}/submissions/"
+    pre_submission = Submission(id=-1, commit_hash=secrets.token_hex(20))
+    celery = MagicMock(submission_options={}, fuse_feedback=fuse_feedback)
+
+    with patch.object(subprocess, "run", return_value=None), \
+            patch.object(GraderBaseHandler, "construct_git_dir", return_value=str(tmp_path)), \
+            patch.object(CeleryApp, "instance", return_value=celery), \
+            patch("grader_service.handlers.submissions.autograde_task") as autograde_mock, \
+            patch("grader_service.handlers.submissions.generate_feedback_task") as feedback_mock, \
+            patch("grader_service.handlers.submissions.lti_sync_task"), \
+            patch("grader_service.handlers.submissions.chain") as chain_mock:
+        response = await http_server_client.fetch(
+            url, method="POST", headers={"Authorization": f"Token {default_token}"},
+            body=json.dumps(pre_submission.to_dict()),
+        )
+    assert response.code == 202
+    assert len(chain_mock.call_args.args) == (2 if fuse_feedback else 3)
+    if fuse_feedback:
+        assert autograde_mock.si.call_args.kwargs == {"generate_feedback": True}
+        feedback_mock.si.assert_not_called()
+    else:
+        assert autograde_mock.si.call_args.kwargs == {}
+        feedback_mock.si.assert_called_once()